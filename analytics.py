@@ -0,0 +1,118 @@
+# analytics.py
+# Crop profitability and monthly trend reports. Data is aggregated in SQL and
+# fetched as plain columns (no ORM objects); the per-crop joins, ratios and
+# rolling windows are then computed with NumPy array operations, so report
+# cost depends on the number of crops and months, not on row counts.
+from datetime import datetime
+
+import numpy as np
+
+from db_setup import db, Yield, Sale, FinancialRollup
+
+ROLLING_MONTHS = 3
+
+def fetch_columns(stmt, count):
+    """Executes stmt and returns its result as count column tuples."""
+    rows = db.session.execute(stmt).all()
+    if not rows:
+        return [()] * count
+    return list(zip(*rows))
+
+def align(keys, names, values):
+    """Scatters values keyed by names onto the sorted keys array (zeros elsewhere)."""
+    result = np.zeros(len(keys))
+    if len(names):
+        result[np.searchsorted(keys, np.array(names, dtype=object))] = np.array(values, dtype=float)
+    return result
+
+def crop_profitability(user_id):
+    """Per-crop revenue, cost, margin and sell-through for a user."""
+    stock_crops, in_stock = fetch_columns(
+        db.select(Yield.crop_name, db.func.sum(Yield.quantity))
+        .where(Yield.user_id == user_id).group_by(Yield.crop_name), 2)
+    sale_crops, sold, sales_value = fetch_columns(
+        db.select(Sale.crop_name, db.func.sum(Sale.quantity_sold), db.func.sum(Sale.price))
+        .where(Sale.user_id == user_id).group_by(Sale.crop_name), 3)
+    # Rollups keep per-crop totals, including months archived by a season close
+    money_crops, money_types, amounts = fetch_columns(
+        db.select(FinancialRollup.crop_name, FinancialRollup.type, db.func.sum(FinancialRollup.amount))
+        .where(FinancialRollup.user_id == user_id, FinancialRollup.crop_name != '')
+        .group_by(FinancialRollup.crop_name, FinancialRollup.type), 3)
+
+    crops = np.array(sorted(set(stock_crops) | set(sale_crops) | set(money_crops)), dtype=object)
+    if not len(crops):
+        return []
+
+    money_types = np.array(money_types, dtype=object)
+    money_crops = np.array(money_crops, dtype=object)
+    amounts = np.array(amounts, dtype=float)
+    is_revenue = money_types == 'Revenue'
+    revenue = align(crops, money_crops[is_revenue], amounts[is_revenue])
+    cost = align(crops, money_crops[~is_revenue], amounts[~is_revenue])
+    in_stock = align(crops, stock_crops, in_stock)
+    sold = align(crops, sale_crops, sold)
+    sales_value = align(crops, sale_crops, sales_value)
+
+    # Yield quantities are reduced as sales are recorded, so harvested = in stock + sold
+    harvested = in_stock + sold
+    margin = revenue - cost
+    margin_pct = np.divide(margin * 100, revenue, out=np.zeros_like(margin), where=revenue > 0)
+    sell_through = np.divide(sold, harvested, out=np.zeros_like(sold), where=harvested > 0)
+    avg_price = np.divide(sales_value, sold, out=np.zeros_like(sold), where=sold > 0)
+
+    return [{
+        'crop': crop,
+        'harvested': int(h), 'inStock': int(s), 'sold': int(q),
+        'revenue': int(r), 'cost': int(c), 'margin': int(m),
+        'marginPct': round(float(mp), 1), 'sellThrough': round(float(st), 3),
+        'avgPricePerUnit': round(float(ap), 2)
+    } for crop, h, s, q, r, c, m, mp, st, ap in zip(
+        crops.tolist(), harvested, in_stock, sold, revenue, cost, margin, margin_pct, sell_through, avg_price)]
+
+def monthly_trends(user_id, months=12):
+    """
+    Revenue, expenses, profit (with a trailing rolling mean) and yield for each
+    of the last months calendar months, including months without activity.
+    """
+    this_month = np.datetime64(datetime.utcnow().date(), 'M')
+    month_axis = np.arange(this_month - (months - 1), this_month + 1)
+    start_date = month_axis[0].astype('datetime64[D]').item()
+
+    periods, types, amounts = fetch_columns(
+        db.select(FinancialRollup.period_start, FinancialRollup.type, db.func.sum(FinancialRollup.amount))
+        .where(FinancialRollup.user_id == user_id, FinancialRollup.period_start >= start_date)
+        .group_by(FinancialRollup.period_start, FinancialRollup.type), 3)
+    yield_days, yield_quantities = fetch_columns(
+        db.select(Yield.date_recorded, db.func.sum(Yield.quantity))
+        .where(Yield.user_id == user_id, Yield.date_recorded >= start_date)
+        .group_by(Yield.date_recorded), 2)
+
+    def bucket(dates, values):
+        """Sums values into month_axis slots by the month of each date."""
+        totals = np.zeros(months)
+        if len(dates):
+            slots = (np.array(dates, dtype='datetime64[M]') - month_axis[0]).astype(int)
+            keep = (slots >= 0) & (slots < months)
+            np.add.at(totals, slots[keep], np.array(values, dtype=float)[keep])
+        return totals
+
+    types = np.array(types, dtype=object)
+    periods = np.array(periods, dtype='datetime64[D]')
+    amounts = np.array(amounts, dtype=float)
+    is_revenue = types == 'Revenue'
+    revenue = bucket(periods[is_revenue], amounts[is_revenue])
+    expenses = bucket(periods[~is_revenue], amounts[~is_revenue])
+    yields = bucket(yield_days, yield_quantities)
+    profit = revenue - expenses
+
+    # Trailing rolling mean over up to ROLLING_MONTHS months, via cumulative sums
+    cumulative = np.concatenate(([0.0], np.cumsum(profit)))
+    ends = np.arange(1, months + 1)
+    starts = np.maximum(0, ends - ROLLING_MONTHS)
+    rolling_profit = (cumulative[ends] - cumulative[starts]) / (ends - starts)
+
+    labels = [m.item().strftime('%b %Y') for m in month_axis]
+    return [{
+        'month': label, 'revenue': int(r), 'expenses': int(e), 'profit': int(p),
+        'rollingProfit': round(float(rp), 2), 'yield': int(y)
+    } for label, r, e, p, rp, y in zip(labels, revenue, expenses, profit, rolling_profit, yields)]
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, PieChart, Pie, Cell, BarChart, Bar, ResponsiveContainer } from 'recharts';
 
 // Helper function to format numbers as Indian Rupees
@@ -700,6 +700,64 @@ const Reports = ({ data }) => (
 );
 
 
+// Builds the report charts from the yields and financials lists
+const buildReports = (yieldsData, financialsData) => {
+  const calculatedYieldReports = yieldsData.map(y => ({ name: y.cropName, value: y.quantity }));
+
+  // Simplified profitability calculation for demo
+  const profitabilityMap = {};
+  financialsData.forEach(f => {
+    if (f.crop) {
+      if (!profitabilityMap[f.crop]) {
+        profitabilityMap[f.crop] = { profit: 0, loss: 0 };
+      }
+      if (f.type === 'Revenue') {
+        profitabilityMap[f.crop].profit += f.amount;
+      } else {
+        profitabilityMap[f.crop].loss += f.amount;
+      }
+    }
+  });
+  const calculatedProfitabilityReports = Object.keys(profitabilityMap).map(crop => ({
+    name: crop,
+    profit: profitabilityMap[crop].profit,
+    loss: profitabilityMap[crop].loss
+  }));
+
+  return { yields: calculatedYieldReports, profitability: calculatedProfitabilityReports };
+};
+
+// List sections kept in step by the change feed, and how new rows are placed
+const CHANGE_LISTS = {
+  yields: { newestFirst: true },
+  sales: { newestFirst: true },
+  financials: { newestFirst: true },
+  workers: { sortKey: 'name' },
+  inventory: { sortKey: 'itemName' },
+};
+
+// Applies change feed entries ({entity, op, id, row}) to the list sections
+const applyChanges = (prevData, changes) => {
+  const next = { ...prevData };
+  changes.forEach(({ entity, op, id, row }) => {
+    const placement = CHANGE_LISTS[entity];
+    if (!placement) {
+      return;
+    }
+    const rest = next[entity].filter(item => item.id !== id);
+    if (op === 'delete') {
+      next[entity] = rest;
+    } else if (rest.length < next[entity].length) {
+      next[entity] = next[entity].map(item => item.id === id ? row : item);
+    } else if (placement.newestFirst) {
+      next[entity] = [row, ...rest];
+    } else {
+      next[entity] = [...rest, row].sort((a, b) => String(a[placement.sortKey]).localeCompare(String(b[placement.sortKey])));
+    }
+  });
+  return { ...next, reports: buildReports(next.yields, next.financials) };
+};
+
 // Main App Component
 const App = () => {
   const [activePage, setActivePage] = useState('dashboard');
@@ -718,66 +776,75 @@ const App = () => {
   const [loading, setLoading] = useState(true);
   const [selectedWorkerId, setSelectedWorkerId] = useState(null);
 
+  // Section etags from the last bootstrap response, sent back so unchanged sections are skipped
+  const bootstrapEtags = useRef({});
+  // Change feed position the loaded data is current as of
+  const changesCursor = useRef(null);
+  // Until when reads must come from the primary database after our last save
+  const readPrimaryUntil = useRef(null);
+
+  const rememberWrite = (response) => {
+    readPrimaryUntil.current = response.headers.get('X-Read-Primary-Until') ?? readPrimaryUntil.current;
+  };
+
+  const readHeaders = (headers = {}) => (
+    readPrimaryUntil.current ? { ...headers, 'X-Read-Primary-Until': readPrimaryUntil.current } : headers
+  );
+
+  // Follows a list's X-Next-Cursor pages and returns the rows after the first page
+  const fetchRemainingPages = async (name, cursor) => {
+    const rows = [];
+    while (cursor) {
+      const res = await fetch(`http://localhost:5000/api/${name}?limit=500&cursor=${encodeURIComponent(cursor)}`, {
+        headers: readHeaders(),
+      });
+      rows.push(...(await res.json()));
+      cursor = res.headers.get('X-Next-Cursor');
+    }
+    return rows;
+  };
+
   const fetchData = async () => {
     setLoading(true);
     try {
-      const dashboardRes = await fetch('http://localhost:5000/api/dashboard');
-      const dashboardData = await dashboardRes.json();
-      
-      const yieldsRes = await fetch('http://localhost:5000/api/yields');
-      const yieldsData = await yieldsRes.json();
-      
-      const salesRes = await fetch('http://localhost:5000/api/sales');
-      const salesData = await salesRes.json();
-      
-      const workersRes = await fetch('http://localhost:5000/api/workers');
-      const workersData = await workersRes.json();
-
-      const financialsRes = await fetch('http://localhost:5000/api/financials');
-      const financialsData = await financialsRes.json();
+      // Taken before the snapshot so no change made while it loads is missed
+      const cursorRes = await fetch('http://localhost:5000/api/changes', { headers: readHeaders() });
+      changesCursor.current = (await cursorRes.json()).cursor;
+      const etagHeader = Object.entries(bootstrapEtags.current).map(([section, tag]) => `"${section}:${tag}"`).join(', ');
+      const snapshotRes = await fetch('http://localhost:5000/api/bootstrap', {
+        headers: readHeaders(etagHeader ? { 'If-None-Match': etagHeader } : {}),
+      });
+      if (snapshotRes.status === 304) {
+        return;
+      }
+      const snapshot = await snapshotRes.json();
+      bootstrapEtags.current = snapshot.etags;
+      const sections = snapshot.sections;
+      // Bootstrap sends the first page of each list; load the rest of the changed ones
+      for (const [name, cursor] of Object.entries(snapshot.nextCursors ?? {})) {
+        if (sections[name]) {
+          sections[name] = [...sections[name], ...(await fetchRemainingPages(name, cursor))];
+        }
+      }
 
-      const inventoryRes = await fetch('http://localhost:5000/api/inventory');
-      const inventoryData = await inventoryRes.json();
-      
-      const userIdRes = await fetch('http://localhost:5000/api/auth/user-id');
-      const userIdData = await userIdRes.json();
+      setData(prevData => {
+        const yieldsData = sections.yields ?? prevData.yields;
+        const financialsData = sections.financials ?? prevData.financials;
 
-      const calculatedYieldReports = yieldsData.map(y => ({ name: y.cropName, value: y.quantity }));
-      
-      // Simplified profitability calculation for demo
-      const profitabilityMap = {};
-      financialsData.forEach(f => {
-        if (f.crop) {
-          if (!profitabilityMap[f.crop]) {
-            profitabilityMap[f.crop] = { profit: 0, loss: 0 };
-          }
-          if (f.type === 'Revenue') {
-            profitabilityMap[f.crop].profit += f.amount;
-          } else {
-            profitabilityMap[f.crop].loss += f.amount;
-          }
-        }
+        return {
+          ...prevData,
+          user: sections.user ? { id: sections.user.userId } : prevData.user,
+          dashboard: sections.dashboard
+            ? { ...sections.dashboard, weather: { temp: '30°C', windSpeed: '10 km/h', humidity: '75%', condition: 'Sunny', forecast: '5 Day Forecast' } }
+            : prevData.dashboard,
+          yields: yieldsData,
+          sales: sections.sales ?? prevData.sales,
+          workers: sections.workers ?? prevData.workers,
+          financials: financialsData,
+          inventory: sections.inventory ?? prevData.inventory,
+          reports: buildReports(yieldsData, financialsData)
+        };
       });
-      const calculatedProfitabilityReports = Object.keys(profitabilityMap).map(crop => ({
-        name: crop,
-        profit: profitabilityMap[crop].profit,
-        loss: profitabilityMap[crop].loss
-      }));
-
-      setData(prevData => ({
-        ...prevData,
-        user: { id: userIdData.userId },
-        dashboard: { ...dashboardData, weather: { temp: '30°C', windSpeed: '10 km/h', humidity: '75%', condition: 'Sunny', forecast: '5 Day Forecast' } },
-        yields: yieldsData,
-        sales: salesData,
-        workers: workersData,
-        financials: financialsData,
-        inventory: inventoryData,
-        reports: {
-          yields: calculatedYieldReports,
-          profitability: calculatedProfitabilityReports,
-        }
-      }));
     } catch (error) {
       console.error("Failed to fetch data:", error);
       console.error("Please ensure your Python backend is running on http://localhost:5000 and the PostgreSQL database is configured correctly.");
@@ -786,9 +853,47 @@ const App = () => {
     }
   };
 
+  // Applies the changes since the last sync instead of reloading everything,
+  // then refreshes the dashboard totals. Falls back to a full reload when the
+  // cursor has expired or a season close archived rows.
+  const syncChanges = async () => {
+    if (!changesCursor.current) {
+      return fetchData();
+    }
+    try {
+      let hasMore = true;
+      let changed = false;
+      while (hasMore) {
+        const res = await fetch(`http://localhost:5000/api/changes?since=${encodeURIComponent(changesCursor.current)}`, {
+          headers: readHeaders(),
+        });
+        if (res.status === 410) {
+          return fetchData();
+        }
+        const page = await res.json();
+        if (page.changes.some(change => change.entity === 'seasons')) {
+          return fetchData();
+        }
+        changesCursor.current = page.cursor;
+        hasMore = page.hasMore;
+        if (page.changes.length > 0) {
+          changed = true;
+          setData(prevData => applyChanges(prevData, page.changes));
+        }
+      }
+      if (changed) {
+        const dashboardRes = await fetch('http://localhost:5000/api/dashboard', { headers: readHeaders() });
+        const dashboard = await dashboardRes.json();
+        setData(prevData => ({ ...prevData, dashboard: { ...dashboard, weather: prevData.dashboard.weather } }));
+      }
+    } catch (error) {
+      console.error("Failed to sync changes:", error);
+    }
+  };
+
   const fetchWorkerDetails = async (workerId) => {
     try {
-        const res = await fetch(`http://localhost:5000/api/workers/${workerId}`);
+        const res = await fetch(`http://localhost:5000/api/workers/${workerId}`, { headers: readHeaders() });
         const data = await res.json();
         const worker = data.worker;
         const attendance = data.attendance;
@@ -823,8 +928,9 @@ const App = () => {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(newYield),
       });
+      rememberWrite(response);
       if (response.ok) {
-        fetchData();
+        syncChanges();
       } else {
         console.error("Failed to add yield");
       }
@@ -840,8 +946,9 @@ const App = () => {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(newSale),
       });
+      rememberWrite(response);
       if (response.ok) {
-        fetchData();
+        syncChanges();
       } else {
         console.error("Failed to record sale");
       }
@@ -857,8 +964,9 @@ const App = () => {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(newWorker),
       });
+      rememberWrite(response);
       if (response.ok) {
-        fetchData();
+        syncChanges();
       } else {
         console.error("Failed to add worker");
       }
@@ -874,6 +982,7 @@ const App = () => {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ date, status, hours }),
         });
+        rememberWrite(response);
         if (response.ok) {
             fetchWorkerDetails(workerId);
         } else {
@@ -892,6 +1001,7 @@ const handleUpdateLoan = async (workerId, amount, description, type) => {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(payload),
         });
+        rememberWrite(response);
         if (response.ok) {
             fetchWorkerDetails(workerId);
         } else {
@@ -909,11 +1019,12 @@ const handleCalculatePay = async (workerId, deduction) => {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ deduction: parseInt(deduction) || 0 }),
         });
+        rememberWrite(response);
         const data = await response.json();
         if (response.ok) {
             console.log("Payroll processed:", data);
             fetchWorkerDetails(workerId);
-            fetchData();
+            syncChanges();
         } else {
             console.error("Failed to calculate pay", data);
         }
@@ -1,55 +1,364 @@
 # app.py
-from flask import Flask, jsonify, request
+from flask import Blueprint, Flask, Response, g, jsonify, request, stream_with_context
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
 from flask_cors import CORS
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+import base64
+import csv
+import hashlib
+import io
+import json
+import threading
+import time
+import click
 import uuid # For generating unique user IDs
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash
 import os
+import sys
 from dotenv import load_dotenv
 
-# Import the database object and models from the setup script
-from db_setup import db, User, Worker, Attendance, Yield, Sale, Financial, Inventory
+# The models are in db_setup/db_setup.py and imported as the top-level module
+# db_setup. Put its directory on the path, as gunicorn.conf.py does, so that
+# 'flask --app app ...' commands work without PYTHONPATH
+DB_SETUP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db_setup')
+if DB_SETUP_DIR not in sys.path:
+    sys.path.insert(0, DB_SETUP_DIR)
 
-# Load environment variables from the .env file
+# Load environment variables from the .env file before the modules below
+# read their settings at import time
 load_dotenv()
 
-# Initialize the Flask application
-app = Flask(__name__)
+# Import the database object and models from the setup script
+from db_setup import db, User, Worker, Attendance, AttendanceSummary, Yield, Sale, Financial, Inventory, FinancialRollup, PayrollRun, OutboxTask, SeasonClose, StockMovement, setup_database, upsert_insert
+from rollups import rollup_entries, rebuild_rollups, check_rollups
+from cache import TTLCache
+from pooling import engine_options, pool_status
+from replicas import bind_config, replica_router
+from instrumentation import init_instrumentation
+from outbox import outbox
+from passwords import HashingBusy, password_hasher, login_throttle
+from tokens import InvalidToken, TokenSigner
+from bulk import ENTITIES, FORMATS, ImportFailed, import_records, export_records
+from archive import close_season, closed_before
+from partitions import partition_tables
+from stock import MOVEMENT_REASONS, STOCK_KINDS, StockRejected, apply_movement, apply_movements, check_stock, log_movement, stock_at, take_snapshots
+from changes import TRACKED_MODELS, decode_change_cursor, init_change_tracking, latest_change_id, latest_cursor, prune_changes, read_changes, record_changes, wait_for_commit
+
+# Routes and CLI commands; registered on the application by create_app()
+api = Blueprint('api', __name__, cli_group=None)
+
+# Process-local caches: resolved user ids, and read-mostly responses (workers,
+# inventory, analytics). Read cache keys include the user's read_version(), so
+# a write committed by any worker process makes every process miss; the
+# handler that wrote also drops its own entries right away.
+user_cache = TTLCache(maxsize=int(os.getenv('USER_CACHE_SIZE', 1024)), ttl=int(os.getenv('USER_CACHE_TTL', 300)))
+read_cache = TTLCache(maxsize=int(os.getenv('READ_CACHE_SIZE', 2048)), ttl=int(os.getenv('READ_CACHE_TTL', 60)))
+
+def invalidate_reads(user_id, *sections):
+    """Drops cached list responses for a user after a write to those sections."""
+    for section in sections:
+        read_cache.invalidate_prefix((user_id, section))
+
+def read_version(user_id):
+    """The user's latest change feed id, looked up once per request."""
+    if 'read_version' not in g:
+        g.read_version = latest_change_id(user_id)
+    return g.read_version
+
+def runtime_gauges():
+    """Cache and connection pool gauges published on /metrics."""
+    gauges = {}
+    for name, cache in (('user', user_cache), ('read', read_cache)):
+        stats = cache.stats()
+        gauges[f'farmsync_{name}_cache_hits'] = (f'{name} cache hits', stats['hits'])
+        gauges[f'farmsync_{name}_cache_misses'] = (f'{name} cache misses', stats['misses'])
+        gauges[f'farmsync_{name}_cache_size'] = (f'{name} cache entries', stats['size'])
+    outbox_stats = outbox.stats()
+    gauges['farmsync_outbox_backlog'] = ('Outbox tasks waiting to be applied', outbox_stats['backlog'])
+    gauges['farmsync_outbox_failed'] = ('Outbox tasks that exhausted their retries', outbox_stats['failed'])
+    pool = pool_status(db.engine)
+    gauges['farmsync_db_pool_checkouts'] = ('Connection pool checkouts', pool['checkouts'])
+    gauges['farmsync_db_pool_timeouts'] = ('Connection pool checkout timeouts', pool['timeouts'])
+    gauges['farmsync_db_pool_wait_seconds'] = ('Total time spent waiting for a connection', pool['waitSecondsTotal'])
+    if 'checkedOut' in pool:
+        gauges['farmsync_db_pool_checked_out'] = ('Connections currently checked out', pool['checkedOut'])
+    return gauges
+
+
+# =========================================================================
+# List Pagination Helpers
+# List endpoints return a JSON array, one page at a time: DEFAULT_PAGE_SIZE
+# rows, or ?limit= up to MAX_PAGE_SIZE. Pages use keyset pagination over the
+# endpoint's sort key with id as the tiebreaker; the cursor for the next page
+# is returned in the X-Next-Cursor header and passed back as ?cursor=. Passing
+# ?fields=a,b selects and serializes only those columns. Passing
+# ?stream=ndjson or ?stream=json streams rows from a server-side cursor as
+# they are read instead of building the whole response in memory.
+# =========================================================================
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 1000
+STREAM_FORMATS = ('ndjson', 'json')
+
+# JSON key -> column for each list endpoint, in response order
+YIELD_FIELDS = {
+    'id': Yield.id,
+    'cropName': Yield.crop_name,
+    'quantity': Yield.quantity,
+    'unit': Yield.unit
+}
+SALE_FIELDS = {
+    'id': Sale.id,
+    'cropName': Sale.crop_name,
+    'quantity': Sale.quantity_sold,
+    'price': Sale.price,
+    'seller': Sale.seller_name,
+    'date': Sale.date_of_sale
+}
+WORKER_FIELDS = {
+    'id': Worker.id,
+    'name': Worker.name,
+    'role': Worker.role,
+    'payRate': Worker.pay_rate,
+    'payType': Worker.pay_type,
+    'loans': Worker.loans,
+    'active': Worker.is_active
+}
+FINANCIAL_FIELDS = {
+    'id': Financial.id,
+    'type': Financial.type,
+    'description': Financial.description,
+    'amount': Financial.amount,
+    'date': Financial.transaction_date,
+    'crop': Financial.crop_name
+}
+INVENTORY_FIELDS = {
+    'id': Inventory.id,
+    'itemName': Inventory.item_name,
+    'itemType': Inventory.item_type,
+    'quantity': Inventory.quantity,
+    'unit': Inventory.unit
+}
+ATTENDANCE_FIELDS = {
+    'id': Attendance.id,
+    'workerId': Attendance.worker_id,
+    'date': Attendance.attendance_date,
+    'status': Attendance.status,
+    'hours': Attendance.hours
+}
 
-# Enable CORS (Cross-Origin Resource Sharing) to allow requests from your React frontend
-CORS(app)
+def json_value(value):
+    """Converts a column value into something jsonify can serialize."""
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
 
-# Database configuration
-# Now reading the database URL from the environment variable
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def encode_cursor(sort_value, row_id):
+    """Encodes the sort key and id of the last row on a page into an opaque cursor."""
+    payload = json.dumps([json_value(sort_value), row_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
 
-# Make sure to bind the db object to this app instance
-db.init_app(app)
+def decode_cursor(cursor, sort_column):
+    """Decodes a cursor produced by encode_cursor back into (sort_value, id)."""
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if isinstance(sort_column.type, db.Date):
+            sort_value = date.fromisoformat(sort_value)
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def requested_fields(field_map, args):
+    """Returns the JSON keys selected by ?fields=, or every key when it is absent."""
+    fields = args.get('fields')
+    if not fields:
+        return list(field_map)
+    keys = [key.strip() for key in fields.split(',') if key.strip()]
+    unknown = [key for key in keys if key not in field_map]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return keys
+
+def list_query(model, user_id, columns, sort_column, descending, args):
+    """
+    Builds the per-user list query for the given columns, ordered by sort_column
+    then id. The sort key and id are always selected last so a cursor can be
+    built from any row. Applies ?cursor= when present, and for date-sorted
+    lists ?from= and ?to= (inclusive YYYY-MM-DD bounds, which also limit a
+    partitioned table to the partitions covering that range).
+    """
+    query = db.session.query(*columns, sort_column, model.id).filter(model.user_id == user_id)
+    if isinstance(sort_column.type, db.Date):
+        for name, compare in (('from', sort_column.__ge__), ('to', sort_column.__le__)):
+            if args.get(name):
+                try:
+                    query = query.filter(compare(datetime.strptime(args[name], '%Y-%m-%d').date()))
+                except ValueError:
+                    raise ValueError(f"'{name}' must be a YYYY-MM-DD date")
+    cursor = args.get('cursor')
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor, sort_column)
+        if descending:
+            query = query.filter(db.or_(sort_column < sort_value,
+                                        db.and_(sort_column == sort_value, model.id < last_id)))
+        else:
+            query = query.filter(db.or_(sort_column > sort_value,
+                                        db.and_(sort_column == sort_value, model.id > last_id)))
+    if descending:
+        return query.order_by(sort_column.desc(), model.id.desc())
+    return query.order_by(sort_column, model.id)
+
+def list_page(model, user_id, field_map, sort_column, descending, args):
+    """
+    Runs a list endpoint's query for the given query args and returns
+    (items, next_cursor). Pages hold ?limit= rows (DEFAULT_PAGE_SIZE when
+    absent, at most MAX_PAGE_SIZE); use ?stream= for every row at once.
+    """
+    keys = requested_fields(field_map, args)
+    limit = max(1, min(args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    query = list_query(model, user_id, [field_map[key] for key in keys], sort_column, descending, args)
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][-2], rows[-1][-1])
+    return [{key: json_value(row[i]) for i, key in enumerate(keys)} for row in rows], next_cursor
+
+def stream_rows(query, keys, fmt):
+    """
+    Yields a list query's rows as NDJSON lines or as the pieces of a JSON array,
+    one server-side cursor batch at a time.
+    """
+    result = db.session.execute(query.statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+    if fmt == 'json':
+        yield '['
+    first = True
+    for partition in result.partitions():
+        lines = [json.dumps({key: json_value(row[i]) for i, key in enumerate(keys)}) for row in partition]
+        if fmt == 'ndjson':
+            yield '\n'.join(lines) + '\n'
+        else:
+            yield ('' if first else ',') + ','.join(lines)
+        first = False
+    if fmt == 'json':
+        yield ']'
+
+def stream_response(model, user_id, field_map, sort_column, descending, fmt):
+    """Streams every row of a list endpoint after ?cursor= (up to ?limit= if given)."""
+    keys = requested_fields(field_map, request.args)
+    query = list_query(model, user_id, [field_map[key] for key in keys], sort_column, descending, request.args)
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        query = query.limit(max(1, limit))
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(stream_with_context(stream_rows(query, keys, fmt)), mimetype=mimetype)
+
+def cached_list_page(model, user_id, field_map, sort_column, descending, cache_section, args):
+    """list_page(), served from the read cache when cache_section is given."""
+    if not cache_section:
+        return list_page(model, user_id, field_map, sort_column, descending, args)
+    cache_key = (user_id, cache_section, read_version(user_id), tuple(sorted(args.items(multi=True))))
+    page = read_cache.get(cache_key)
+    if page is None:
+        page = list_page(model, user_id, field_map, sort_column, descending, args)
+        read_cache.set(cache_key, page)
+    return page
+
+def list_response(model, user_id, field_map, sort_column, descending=False, cache_section=None):
+    """
+    Returns the JSON response for a list endpoint. When cache_section is given
+    the page is cached per user and query string until the section is invalidated.
+    """
+    stream = request.args.get('stream')
+    if stream:
+        if stream not in STREAM_FORMATS:
+            return jsonify({'error': f"stream must be one of: {', '.join(STREAM_FORMATS)}"}), 400
+        try:
+            return stream_response(model, user_id, field_map, sort_column, descending, stream)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    try:
+        items, next_cursor = cached_list_page(model, user_id, field_map, sort_column, descending,
+                                              cache_section, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
 
 # =========================================================================
 # API Endpoints
 # =========================================================================
 
-# User Authentication (for demonstration, a simple unique user ID is used)
+# User Authentication
+# Requests carry an 'Authorization: Bearer <token>' header issued by
+# /api/auth/login. The token is verified without a database query and its user
+# id scopes every read and write. Requests without a token act as the demo user
+# unless AUTH_REQUIRED is set.
+token_signer = TokenSigner(os.getenv('SECRET_KEY'), ttl=int(os.getenv('TOKEN_TTL', 43200)))
+AUTH_REQUIRED = os.getenv('AUTH_REQUIRED', 'false').lower() in ('1', 'true', 'yes', 'on')
+# Public endpoints also serve anonymous requests and ignore invalid tokens
+PUBLIC_ENDPOINTS = {'api.register_user', 'api.login_user', 'api.get_current_user_id', 'metrics', 'static'}
+DEMO_USER_ID = 'user_1a2b3c4d'
+
+@api.before_app_request
+def authenticate():
+    g.user_id = None
+    if request.method == 'OPTIONS':
+        return None
+    public = request.endpoint in PUBLIC_ENDPOINTS
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() == 'bearer' and token:
+        try:
+            g.user_id = token_signer.verify(token.strip())
+        except InvalidToken as e:
+            if not public:
+                return jsonify({'message': str(e)}), 401
+    elif AUTH_REQUIRED and not public:
+        return jsonify({'message': 'Authentication required'}), 401
+    return None
+
 def get_user_id():
-    """Helper function to get user ID for demo purposes."""
-    # In a real app, this would come from a secure session or token
-    # For now, we'll use a hardcoded user ID
-    user = User.query.filter_by(unique_user_id='user_1a2b3c4d').first()
+    """Returns the authenticated user's id, or the demo user's for anonymous requests."""
+    if g.get('user_id') is not None:
+        return g.user_id
+    user_id = user_cache.get(DEMO_USER_ID)
+    if user_id is not None:
+        return user_id
+    # The replica may not have the demo user yet, and it is created on the
+    # primary, so look it up there too
+    g.read_replica = False
+    user = User.query.filter_by(unique_user_id=DEMO_USER_ID).first()
     if not user:
         # Create a dummy user if one doesn't exist
         user = User(
-            unique_user_id='user_1a2b3c4d',
+            unique_user_id=DEMO_USER_ID,
             email='demo@farmsync.com',
             password_hash=generate_password_hash('password'),
             name='Demo User'
         )
         db.session.add(user)
         db.session.commit()
+    user_cache.set(DEMO_USER_ID, user.id)
     return user.id
 
-@app.route('/api/auth/register', methods=['POST'])
+def get_unique_user_id():
+    """Returns the public id of the token's user, or the demo user's for anonymous requests."""
+    if g.get('user_id') is None:
+        return DEMO_USER_ID
+    cache_key = ('unique_user_id', g.user_id)
+    unique_user_id = user_cache.get(cache_key)
+    if unique_user_id is None:
+        unique_user_id = db.session.query(User.unique_user_id).filter_by(id=g.user_id).scalar()
+        user_cache.set(cache_key, unique_user_id)
+    return unique_user_id
+
+@api.route('/api/auth/register', methods=['POST'])
 def register_user():
     data = request.json
     email = data.get('email')
@@ -59,7 +368,10 @@ def register_user():
     if User.query.filter_by(email=email).first():
         return jsonify({'message': 'Email already exists'}), 409
 
-    hashed_password = generate_password_hash(password)
+    try:
+        hashed_password = password_hasher.hash(password)
+    except HashingBusy as e:
+        return jsonify({'message': str(e)}), 503
     new_user = User(
         unique_user_id=str(uuid.uuid4()),
         email=email,
@@ -70,64 +382,182 @@ def register_user():
     db.session.commit()
     return jsonify({'message': 'User registered successfully'}), 201
 
-@app.route('/api/auth/login', methods=['POST'])
+@api.route('/api/auth/login', methods=['POST'])
 def login_user():
     data = request.json
     email = data.get('email')
     password = data.get('password')
+
+    # Locked-out emails are refused before any database or hashing work
+    retry_after = login_throttle.retry_after(email)
+    if retry_after:
+        response = jsonify({'message': 'Too many failed attempts, try again later'})
+        response.headers['Retry-After'] = str(int(retry_after) + 1)
+        return response, 429
+
     user = User.query.filter_by(email=email).first()
+    try:
+        if user:
+            valid = password_hasher.verify(user.password_hash, password)
+        else:
+            valid = password_hasher.verify_unknown(password)
+        if valid and password_hasher.needs_rehash(user.password_hash):
+            # Upgrade hashes written with older cost parameters
+            user.password_hash = password_hasher.hash(password)
+            db.session.commit()
+    except HashingBusy as e:
+        return jsonify({'message': str(e)}), 503
 
-    if user and check_password_hash(user.password_hash, password):
-        # In a real application, you would create and return a JWT token here.
-        # For this demo, we'll just return the user ID.
-        return jsonify({'message': 'Login successful', 'userId': user.unique_user_id}), 200
+    if valid:
+        login_throttle.success(email)
+        token, expires_at = token_signer.issue(user.id)
+        return jsonify({
+            'message': 'Login successful',
+            'userId': user.unique_user_id,
+            'token': token,
+            'expiresAt': expires_at
+        }), 200
+    login_throttle.failure(email)
     return jsonify({'message': 'Invalid credentials'}), 401
 
-@app.route('/api/auth/user-id', methods=['GET'])
+@api.route('/api/auth/user-id', methods=['GET'])
 def get_current_user_id():
-    # Helper endpoint for the frontend to get a persistent user ID for demo purposes
-    return jsonify({'userId': 'user_1a2b3c4d'}), 200
+    # The token's user, or the demo user for anonymous requests
+    return jsonify({'userId': get_unique_user_id()}), 200
+
+@api.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    # Hit/miss counters for this worker process's caches
+    return jsonify({'users': user_cache.stats(), 'reads': read_cache.stats()}), 200
+
+@api.route('/api/pool/stats', methods=['GET'])
+def get_pool_stats():
+    # Connection pool occupancy and checkout wait times for this worker process
+    status = pool_status(db.engine)
+    if replica_router.enabled:
+        status['replica'] = {**pool_status(db.engines['replica']), **replica_router.status()}
+    return jsonify(status), 200
 
 # Dashboard Endpoints
-@app.route('/api/dashboard', methods=['GET'])
+TREND_MONTHS = 12
+
+@api.route('/api/dashboard', methods=['GET'])
 def get_dashboard_data():
     user_id = get_user_id()
-    
-    # Financial Summary
-    revenue_sum = db.session.query(db.func.sum(Financial.amount)).filter_by(user_id=user_id, type='Revenue').scalar() or 0
-    expenses_sum = db.session.query(db.func.sum(Financial.amount)).filter_by(user_id=user_id, type='Expense').scalar() or 0
+    return jsonify(dashboard_summary(user_id))
+
+def dashboard_summary(user_id):
+    """Builds the dashboard payload for a user."""
+    # Financial Summary (served from the monthly rollup table)
+    totals = dict(db.session.query(FinancialRollup.type, db.func.sum(FinancialRollup.amount))
+                  .filter_by(user_id=user_id).group_by(FinancialRollup.type).all())
+    revenue_sum = int(totals.get('Revenue') or 0)
+    expenses_sum = int(totals.get('Expense') or 0)
 
     # Yield & Workforce Metrics
     total_yield = db.session.query(db.func.sum(Yield.quantity)).filter_by(user_id=user_id).scalar() or 0
     active_workers = Worker.query.filter_by(user_id=user_id, is_active=True).count()
-    
-    # Financial Trends (simplified for demo)
-    financial_trends = [
-        {'month': 'Jan', 'revenue': 50000, 'expenses': 20000},
-        {'month': 'Feb', 'revenue': 60000, 'expenses': 25000},
-        {'month': 'Mar', 'revenue': 75000, 'expenses': 30000},
-    ]
 
-    return jsonify({
+    # Financial Trends for the most recent months with activity
+    monthly = db.session.query(
+        FinancialRollup.period_start, FinancialRollup.type, db.func.sum(FinancialRollup.amount)
+    ).filter_by(user_id=user_id).group_by(FinancialRollup.period_start, FinancialRollup.type) \
+     .order_by(FinancialRollup.period_start.desc()).limit(TREND_MONTHS * 2).all()
+    trends_by_month = {}
+    for period_start, entry_type, amount in monthly:
+        month = trends_by_month.setdefault(period_start, {'month': period_start.strftime('%b %Y'), 'revenue': 0, 'expenses': 0})
+        month['revenue' if entry_type == 'Revenue' else 'expenses'] += int(amount or 0)
+    financial_trends = [trends_by_month[p] for p in sorted(trends_by_month)][-TREND_MONTHS:]
+
+    return {
         'financialSummary': {'totalRevenue': revenue_sum, 'totalExpenses': expenses_sum},
-        'metrics': {'totalYield': total_yield, 'activeWorkers': active_workers},
+        'metrics': {'totalYield': int(total_yield), 'activeWorkers': active_workers},
         'financialTrends': financial_trends
+    }
+
+# Analytics Endpoint
+MAX_ANALYTICS_MONTHS = 120
+
+@api.route('/api/analytics', methods=['GET'])
+def get_analytics():
+    """Crop profitability and monthly trends, cached per user until the next write."""
+    user_id = get_user_id()
+    months = max(1, min(request.args.get('months', 12, type=int), MAX_ANALYTICS_MONTHS))
+    cache_key = (user_id, 'analytics', read_version(user_id), months)
+    report = read_cache.get(cache_key)
+    if report is None:
+        # Imported on first use: NumPy dominates import time and only this endpoint needs it
+        from analytics import crop_profitability, monthly_trends
+        report = {'crops': crop_profitability(user_id), 'trends': monthly_trends(user_id, months)}
+        read_cache.set(cache_key, report)
+    return jsonify(report)
+
+# Bootstrap Endpoint
+# Section name -> (model, fields, sort column, descending, cache section)
+BOOTSTRAP_LISTS = {
+    'yields': (Yield, YIELD_FIELDS, Yield.date_recorded, True, None),
+    'sales': (Sale, SALE_FIELDS, Sale.date_of_sale, True, None),
+    'workers': (Worker, WORKER_FIELDS, Worker.name, False, 'workers'),
+    'financials': (Financial, FINANCIAL_FIELDS, Financial.transaction_date, True, None),
+    'inventory': (Inventory, INVENTORY_FIELDS, Inventory.item_name, False, 'inventory')
+}
+
+def section_etag(payload):
+    """Returns a short content hash for a bootstrap section."""
+    serialized = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(serialized.encode()).hexdigest()[:16]
+
+def known_section_etags():
+    """Parses If-None-Match entries of the form "section:tag" into a dict."""
+    known = {}
+    for entry in request.headers.get('If-None-Match', '').split(','):
+        entry = entry.strip().removeprefix('W/').strip('"')
+        if ':' in entry:
+            section, tag = entry.split(':', 1)
+            known[section] = tag
+    return known
+
+@api.route('/api/bootstrap', methods=['GET'])
+def get_bootstrap():
+    """
+    Returns everything the frontend loads on start in one response, resolving
+    the user once. Clients echo the returned etags back in If-None-Match as
+    "section:tag" entries; sections that have not changed are listed in
+    notModified instead of being sent again, and if none changed the
+    response is a 304. Lists hold their first page; nextCursors gives the
+    ?cursor= for the rest of each list that has more.
+    """
+    user_id = get_user_id()
+    sections = {
+        'user': {'userId': get_unique_user_id()},
+        'dashboard': dashboard_summary(user_id)
+    }
+    next_cursors = {}
+    for name, (model, fields, sort_column, descending, cache_section) in BOOTSTRAP_LISTS.items():
+        sections[name], next_cursor = cached_list_page(model, user_id, fields, sort_column, descending,
+                                                       cache_section, MultiDict())
+        if next_cursor:
+            next_cursors[name] = next_cursor
+
+    etags = {name: section_etag(payload) for name, payload in sections.items()}
+    known = known_section_etags()
+    not_modified = [name for name, tag in etags.items() if known.get(name) == tag]
+    if len(not_modified) == len(sections):
+        return '', 304
+    return jsonify({
+        'etags': etags,
+        'notModified': not_modified,
+        'sections': {name: payload for name, payload in sections.items() if name not in not_modified},
+        'nextCursors': next_cursors
     })
 
 # Yield & Sales Endpoints
-@app.route('/api/yields', methods=['GET'])
+@api.route('/api/yields', methods=['GET'])
 def get_yields():
     user_id = get_user_id()
-    yields = Yield.query.filter_by(user_id=user_id).order_by(Yield.date_recorded.desc()).all()
-    result = [{
-        'id': y.id,
-        'cropName': y.crop_name,
-        'quantity': y.quantity,
-        'unit': y.unit
-    } for y in yields]
-    return jsonify(result)
-
-@app.route('/api/yields', methods=['POST'])
+    return list_response(Yield, user_id, YIELD_FIELDS, Yield.date_recorded, descending=True)
+
+@api.route('/api/yields', methods=['POST'])
 def add_yield():
     user_id = get_user_id()
     data = request.json
@@ -140,88 +570,114 @@ def add_yield():
             date_recorded=datetime.utcnow().date()
         )
         db.session.add(new_yield)
+        db.session.flush()
+        log_movement(user_id, 'yield', new_yield.id, new_yield.quantity, 'harvest')
         db.session.commit()
+        invalidate_reads(user_id, 'analytics')
         return jsonify({'message': 'Yield added successfully!', 'id': new_yield.id}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
-@app.route('/api/sales', methods=['GET'])
+@api.route('/api/sales', methods=['GET'])
 def get_sales():
     user_id = get_user_id()
-    sales = Sale.query.filter_by(user_id=user_id).order_by(Sale.date_of_sale.desc()).all()
-    result = [{
-        'id': s.id,
-        'cropName': s.crop_name,
-        'quantity': s.quantity_sold,
-        'price': s.price,
-        'seller': s.seller_name,
-        'date': s.date_of_sale.isoformat()
-    } for s in sales]
-    return jsonify(result)
-
-@app.route('/api/sales', methods=['POST'])
+    return list_response(Sale, user_id, SALE_FIELDS, Sale.date_of_sale, descending=True)
+
+class SaleRejected(Exception):
+    """Raised when a sale line cannot be fulfilled; carries the HTTP status to return."""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def deduct_yield(user_id, yield_id, quantity):
+    """
+    Atomically deducts quantity from one of the user's yields, records the
+    movement in the stock ledger and returns the crop name. The conditional
+    UPDATE only matches while enough stock is left, so concurrent sales can
+    neither lose updates nor oversell.
+    """
+    if quantity <= 0:
+        raise SaleRejected('Quantity must be positive')
+    stmt = db.update(Yield).where(
+        Yield.id == yield_id, Yield.user_id == user_id, Yield.quantity >= quantity
+    ).values(quantity=Yield.quantity - quantity)
+    if db.session.get_bind().dialect.update_returning:
+        crop_name = db.session.execute(stmt.returning(Yield.crop_name)).scalar()
+    else:
+        crop_name = None
+        if db.session.execute(stmt).rowcount == 1:
+            crop_name = db.session.query(Yield.crop_name).filter_by(id=yield_id).scalar()
+    if crop_name is not None:
+        log_movement(user_id, 'yield', yield_id, -quantity, 'sale')
+        record_changes(user_id, 'yields', [yield_id])
+        return crop_name
+
+    available = db.session.query(Yield.quantity).filter_by(id=yield_id, user_id=user_id).scalar()
+    if available is None:
+        raise SaleRejected('Invalid crop ID')
+    raise SaleRejected(f'Insufficient quantity for crop {yield_id}: {available} available, {quantity} requested', 409)
+
+@api.route('/api/sales', methods=['POST'])
 def record_sale():
+    """
+    Records a sale of one crop ({cropId, quantity, price, seller}) or a
+    multi-line order ({seller, lines: [{cropId, quantity, price}, ...]}).
+    All lines are deducted and recorded in one transaction, or none are.
+    """
     user_id = get_user_id()
     data = request.json
     try:
-        # Check if yield_id exists
-        existing_yield = Yield.query.filter_by(id=data['cropId'], user_id=user_id).first()
-        if not existing_yield:
-            return jsonify({'message': 'Invalid crop ID'}), 400
+        lines = data.get('lines') or [{'cropId': data['cropId'], 'quantity': data['quantity'], 'price': data['price']}]
+        lines = [(int(line['cropId']), int(line['quantity']), int(line['price'])) for line in lines]
+        # Deduct in a fixed order so concurrent multi-line orders cannot deadlock
+        lines.sort()
+        today = datetime.utcnow().date()
 
-        quantity_sold = int(data['quantity'])
-        price = int(data['price'])
-        
-        # Record the sale
-        new_sale = Sale(
-            user_id=user_id,
-            yield_id=existing_yield.id,
-            crop_name=existing_yield.crop_name,
-            quantity_sold=quantity_sold,
-            price=price,
-            seller_name=data['seller'],
-            date_of_sale=datetime.utcnow().date()
-        )
-        db.session.add(new_sale)
+        revenues = []
+        for crop_id, quantity_sold, price in lines:
+            crop_name = deduct_yield(user_id, crop_id, quantity_sold)
 
-        # Update the yield quantity (simple deduction)
-        existing_yield.quantity -= quantity_sold
+            # Record the sale
+            db.session.add(Sale(
+                user_id=user_id,
+                yield_id=crop_id,
+                crop_name=crop_name,
+                quantity_sold=quantity_sold,
+                price=price,
+                seller_name=data['seller'],
+                date_of_sale=today
+            ))
 
-        # Record the revenue in financials
-        new_revenue = Financial(
-            user_id=user_id,
-            type='Revenue',
-            description=f"Sale of {existing_yield.crop_name}",
-            amount=price,
-            transaction_date=datetime.utcnow().date(),
-            crop_name=existing_yield.crop_name
-        )
-        db.session.add(new_revenue)
+            # Record the revenue in financials
+            revenues.append(Financial(
+                user_id=user_id,
+                type='Revenue',
+                description=f"Sale of {crop_name}",
+                amount=price,
+                transaction_date=today,
+                crop_name=crop_name
+            ))
+        db.session.add_all(revenues)
+        rollup_entries(revenues)
 
         db.session.commit()
-        return jsonify({'message': 'Sale recorded successfully!'}), 201
+        invalidate_reads(user_id, 'analytics')
+        return jsonify({'message': 'Sale recorded successfully!', 'lines': len(lines)}), 201
+    except SaleRejected as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), e.status
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
 # Worker Management Endpoints
-@app.route('/api/workers', methods=['GET'])
+@api.route('/api/workers', methods=['GET'])
 def get_workers():
     user_id = get_user_id()
-    workers = Worker.query.filter_by(user_id=user_id).order_by(Worker.name).all()
-    result = [{
-        'id': w.id,
-        'name': w.name,
-        'role': w.role,
-        'payRate': w.pay_rate,
-        'payType': w.pay_type,
-        'loans': w.loans,
-        'active': w.is_active
-    } for w in workers]
-    return jsonify(result)
-
-@app.route('/api/workers', methods=['POST'])
+    return list_response(Worker, user_id, WORKER_FIELDS, Worker.name, cache_section='workers')
+
+@api.route('/api/workers', methods=['POST'])
 def add_worker():
     user_id = get_user_id()
     data = request.json
@@ -235,26 +691,69 @@ def add_worker():
         )
         db.session.add(new_worker)
         db.session.commit()
+        invalidate_reads(user_id, 'workers')
         return jsonify({'message': 'Worker added successfully!', 'id': new_worker.id}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
-@app.route('/api/workers/<int:worker_id>', methods=['GET'])
+ATTENDANCE_WINDOW_DAYS = 62
+
+def date_arg(name, default=None):
+    """Parses a YYYY-MM-DD query string argument, raising ValueError if malformed."""
+    value = request.args.get(name)
+    if not value:
+        return default
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+@api.route('/api/workers/<int:worker_id>', methods=['GET'])
 def get_worker_details(worker_id):
+    """
+    A worker with their attendance between ?from= and ?to=, loans and payroll.
+    Days before the last season close (archivedBefore) are no longer kept;
+    archivedAttendance gives their monthly totals instead.
+    """
     user_id = get_user_id()
-    worker = Worker.query.filter_by(id=worker_id, user_id=user_id).first()
-    if not worker:
+    try:
+        end_date = date_arg('to', datetime.utcnow().date())
+        start_date = date_arg('from', end_date - timedelta(days=ATTENDANCE_WINDOW_DAYS))
+    except ValueError:
+        return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+
+    # Worker and its loan/payroll ledger in one query (one row per ledger entry)
+    rows = db.session.query(
+        Worker, Financial.category, Financial.transaction_date, Financial.amount, Financial.description
+    ).outerjoin(Financial, Financial.worker_id == Worker.id) \
+     .filter(Worker.id == worker_id, Worker.user_id == user_id) \
+     .order_by(Financial.transaction_date, Financial.id).all()
+    if not rows:
         return jsonify({'message': 'Worker not found'}), 404
+    worker = rows[0][0]
 
-    # Fetch attendance and loan history
-    attendance_data = Attendance.query.filter_by(worker_id=worker_id).order_by(Attendance.attendance_date).all()
-    loan_transactions = Financial.query.filter_by(user_id=user_id, description=f"Loan to {worker.name}").all()
-    payroll_transactions = Financial.query.filter_by(user_id=user_id, description=f"Worker salary - {worker.name}").all()
+    # Attendance within the requested window only
+    attendance_data = db.session.query(Attendance.attendance_date, Attendance.status, Attendance.hours).filter(
+        Attendance.worker_id == worker_id,
+        Attendance.attendance_date.between(start_date, end_date)
+    ).order_by(Attendance.attendance_date).all()
+
+    # Days before the last season close were archived; report their monthly totals instead
+    archived_before = closed_before(user_id)
+    archived = []
+    if archived_before and start_date < archived_before:
+        archived = AttendanceSummary.query.filter(
+            AttendanceSummary.worker_id == worker_id,
+            AttendanceSummary.period_start.between(start_date.replace(day=1), end_date)
+        ).order_by(AttendanceSummary.period_start).all()
 
     # Format data for frontend
     attendance = {a.attendance_date.isoformat(): {'status': a.status, 'hours': a.hours} for a in attendance_data}
-    loans = [{'date': l.transaction_date.isoformat(), 'amount': l.amount, 'description': l.description} for l in loan_transactions]
+    loans = []
+    payroll = []
+    for _, category, transaction_date, amount, description in rows:
+        if category == 'Loan':
+            loans.append({'date': transaction_date.isoformat(), 'amount': amount, 'description': description})
+        elif category == 'Payroll':
+            payroll.append({'date': transaction_date.isoformat(), 'amount': amount, 'description': description})
 
     worker_data = {
         'id': worker.id,
@@ -265,10 +764,25 @@ def get_worker_details(worker_id):
         'loans': worker.loans,
         'active': worker.is_active
     }
-    return jsonify({'worker': worker_data, 'attendance': attendance, 'loans': loans})
+    return jsonify({
+        'worker': worker_data,
+        'attendance': attendance,
+        'archivedBefore': archived_before.isoformat() if archived_before else None,
+        'archivedAttendance': [{
+            'month': summary.period_start.strftime('%Y-%m'),
+            'daysPresent': summary.days_present,
+            'daysAbsent': summary.days_absent,
+            'hours': summary.hours
+        } for summary in archived],
+        'loans': loans,
+        'payroll': payroll
+    })
 
-@app.route('/api/workers/<int:worker_id>/attendance', methods=['POST'])
+@api.route('/api/workers/<int:worker_id>/attendance', methods=['POST'])
 def mark_attendance(worker_id):
+    user_id = get_user_id()
+    if not db.session.query(Worker.id).filter_by(id=worker_id, user_id=user_id).first():
+        return jsonify({'error': 'Worker not found'}), 404
     data = request.json
     attendance_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
     attendance = Attendance.query.filter_by(worker_id=worker_id, attendance_date=attendance_date).first()
@@ -288,7 +802,119 @@ def mark_attendance(worker_id):
     db.session.commit()
     return jsonify({'message': 'Attendance updated successfully!'})
 
-@app.route('/api/workers/<int:worker_id>/loan', methods=['POST'])
+MAX_BULK_ROWS = 5000
+BULK_CHUNK_SIZE = 1000
+ATTENDANCE_STATUSES = ('Present', 'Absent')
+
+def bulk_request_rows():
+    """
+    Returns the rows of a bulk request as dicts. Accepts a JSON list (or
+    {'records': [...]}), a multipart 'file' upload of CSV, or a text/csv body.
+    """
+    upload = request.files.get('file')
+    if upload:
+        text = upload.read().decode('utf-8-sig')
+    elif request.mimetype == 'text/csv':
+        text = request.get_data(as_text=True)
+    else:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('records')
+        if not isinstance(data, list):
+            raise ValueError('Expected a JSON list of records or a CSV upload')
+        return data
+    return list(csv.DictReader(io.StringIO(text)))
+
+@api.route('/api/attendance/bulk', methods=['POST'])
+def bulk_mark_attendance():
+    """
+    Marks attendance for many (workerId, date, status, hours) rows in one
+    transaction using a native upsert on _worker_date_uc. Invalid rows are
+    reported per row and skipped; when a worker/date repeats, the last row wins
+    and the earlier ones are reported as superseded.
+    """
+    user_id = get_user_id()
+    try:
+        rows = bulk_request_rows()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if len(rows) > MAX_BULK_ROWS:
+        return jsonify({'error': f'At most {MAX_BULK_ROWS} rows per request'}), 413
+
+    results = []
+    parsed = {}
+    latest = {} # (worker_id, date) -> result of the row that will be written
+    for index, row in enumerate(rows):
+        try:
+            worker_id = int(row.get('workerId', row.get('worker_id')))
+            attendance_date = datetime.strptime(row['date'], '%Y-%m-%d').date()
+            status = row['status']
+            if status not in ATTENDANCE_STATUSES:
+                raise ValueError(f"Invalid status '{status}'")
+            hours = int(row.get('hours') or 0)
+        except KeyError as e:
+            results.append({'row': index, 'status': 'error', 'error': f'Missing field {e}'})
+            continue
+        except (AttributeError, TypeError, ValueError) as e:
+            results.append({'row': index, 'status': 'error', 'error': str(e)})
+            continue
+        result = {'row': index, 'status': 'ok', 'workerId': worker_id, 'date': attendance_date.isoformat()}
+        results.append(result)
+        previous = latest.get((worker_id, attendance_date))
+        if previous:
+            previous.update(status='superseded', supersededBy=index)
+        latest[(worker_id, attendance_date)] = result
+        parsed[(worker_id, attendance_date)] = {
+            'worker_id': worker_id, 'attendance_date': attendance_date, 'status': status, 'hours': hours
+        }
+
+    # Only the user's own workers may be marked
+    worker_ids = {worker_id for worker_id, _ in parsed}
+    owned = {w_id for (w_id,) in db.session.query(Worker.id).filter(
+        Worker.user_id == user_id, Worker.id.in_(worker_ids))} if worker_ids else set()
+    for result in results:
+        if result['status'] == 'ok' and result['workerId'] not in owned:
+            result.update(status='error', error='Worker not found')
+    values = [v for key, v in parsed.items() if key[0] in owned]
+
+    try:
+        for start in range(0, len(values), BULK_CHUNK_SIZE):
+            chunk = values[start:start + BULK_CHUNK_SIZE]
+            stmt = upsert_insert(Attendance)
+            if stmt is None:
+                for v in chunk:
+                    attendance = Attendance.query.filter_by(
+                        worker_id=v['worker_id'], attendance_date=v['attendance_date']).first()
+                    if attendance:
+                        attendance.status = v['status']
+                        attendance.hours = v['hours']
+                    else:
+                        db.session.add(Attendance(**v))
+                continue
+            stmt = stmt.values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['worker_id', 'attendance_date'],
+                set_={'status': stmt.excluded.status, 'hours': stmt.excluded.hours,
+                      'updated_at': stmt.excluded.updated_at}
+            )
+            attendance_ids = db.session.execute(stmt.returning(Attendance.id)).scalars().all()
+            record_changes(user_id, 'attendance', attendance_ids)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+    failed = sum(1 for result in results if result['status'] == 'error')
+    superseded = sum(1 for result in results if result['status'] == 'superseded')
+    return jsonify({
+        'message': 'Attendance updated successfully!',
+        'applied': len(results) - failed - superseded,
+        'failed': failed,
+        'superseded': superseded,
+        'results': results
+    })
+
+@api.route('/api/workers/<int:worker_id>/loan', methods=['POST'])
 def add_loan(worker_id):
     user_id = get_user_id()
     data = request.json
@@ -307,13 +933,46 @@ def add_loan(worker_id):
         description=f"Loan to {worker.name} - {description}",
         amount=amount,
         transaction_date=datetime.utcnow().date(),
-        crop_name=None
+        crop_name=None,
+        worker_id=worker.id,
+        category='Loan'
     )
     db.session.add(new_financial)
+    rollup_entries([new_financial])
     db.session.commit()
+    invalidate_reads(user_id, 'workers', 'analytics')
     return jsonify({'message': 'Loan recorded successfully!'})
 
-@app.route('/api/workers/<int:worker_id>/payroll', methods=['POST'])
+# Per-worker payroll pays the attendance of this many days before its date
+WORKER_PAYROLL_DAYS = 7
+
+def lock_payroll(user_id):
+    """Locks the user's row so concurrent payroll requests for the user run one at a time."""
+    db.session.query(User.id).filter_by(id=user_id).with_for_update().scalar()
+
+def payroll_overlap(user_id, period_start, period_end, worker_id=None):
+    """
+    Describes an earlier payroll that already paid attendance between
+    period_start and period_end (for one worker if given), or returns None.
+    """
+    run = PayrollRun.query.filter(
+        PayrollRun.user_id == user_id, PayrollRun.period_start <= period_end, PayrollRun.period_end >= period_start
+    ).first()
+    if run:
+        return f'Payroll run {run.id} already paid {run.period_start.isoformat()} to {run.period_end.isoformat()}'
+    query = Financial.query.filter(
+        Financial.user_id == user_id, Financial.category == 'Payroll', Financial.payroll_run_id.is_(None),
+        Financial.transaction_date.between(period_start, period_end + timedelta(days=WORKER_PAYROLL_DAYS))
+    )
+    if worker_id is not None:
+        query = query.filter(Financial.worker_id == worker_id)
+    entry = query.first()
+    if entry:
+        return (f'Worker {entry.worker_id} was paid on {entry.transaction_date.isoformat()} '
+                f'for the {WORKER_PAYROLL_DAYS} days before')
+    return None
+
+@api.route('/api/workers/<int:worker_id>/payroll', methods=['POST'])
 def calculate_payroll(worker_id):
     user_id = get_user_id()
     data = request.json
@@ -323,8 +982,14 @@ def calculate_payroll(worker_id):
         
     deduction = int(data.get('deduction', 0))
     
-    # Calculate total pay for the last 7 days
-    start_date = datetime.utcnow().date() - datetime.timedelta(days=7)
+    # Calculate total pay for the last 7 days, unless part of them is already paid
+    today = datetime.utcnow().date()
+    start_date = today - timedelta(days=WORKER_PAYROLL_DAYS)
+    lock_payroll(user_id)
+    overlap = payroll_overlap(user_id, start_date, today, worker_id)
+    if overlap:
+        db.session.rollback()
+        return jsonify({'error': overlap}), 409
     attendance_records = Attendance.query.filter(
         Attendance.worker_id == worker_id,
         Attendance.attendance_date >= start_date
@@ -350,30 +1015,134 @@ def calculate_payroll(worker_id):
         description=f"Worker salary - {worker.name}",
         amount=net_pay,
         transaction_date=datetime.utcnow().date(),
-        crop_name=None
+        crop_name=None,
+        worker_id=worker.id,
+        category='Payroll'
     )
     db.session.add(new_financial)
+    rollup_entries([new_financial])
     db.session.commit()
+    invalidate_reads(user_id, 'workers', 'analytics')
     
     return jsonify({'message': 'Payroll processed', 'totalPay': total_pay, 'deduction': deduction, 'netPay': net_pay})
 
 
+def payroll_run_response(run, status_code, **extra):
+    """Serializes a payroll run together with the Financial entries it wrote."""
+    entries = db.session.query(Financial.worker_id, Financial.amount).filter_by(payroll_run_id=run.id).all()
+    return jsonify({
+        'runId': run.id,
+        'from': run.period_start.isoformat(),
+        'to': run.period_end.isoformat(),
+        'workerCount': run.worker_count,
+        'totalPay': run.total_pay,
+        'totalDeductions': run.total_deductions,
+        'netPay': run.net_pay,
+        'entries': [{'workerId': worker_id, 'netPay': amount} for worker_id, amount in entries],
+        **extra
+    }), status_code
+
+@api.route('/api/payroll/runs', methods=['POST'])
+def run_payroll():
+    """
+    Pays every active worker for the period from..to (inclusive) in one
+    transaction. Present days and hours are aggregated per worker in a single
+    grouped query. Optional 'deductions' maps worker id to a loan deduction,
+    capped at the worker's loan balance and gross pay. Each period is paid at
+    most once per user; repeating a request returns the original run, and a
+    period overlapping an earlier run or per-worker payroll is refused with 409.
+    """
+    user_id = get_user_id()
+    data = request.json or {}
+    try:
+        period_start = datetime.strptime(data['from'], '%Y-%m-%d').date()
+        period_end = datetime.strptime(data['to'], '%Y-%m-%d').date()
+        deductions = {int(k): int(v) for k, v in (data.get('deductions') or {}).items()}
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return jsonify({'error': "'from' and 'to' must be YYYY-MM-DD dates and 'deductions' a map of worker id to amount"}), 400
+    if period_end < period_start:
+        return jsonify({'error': "'to' must not be before 'from'"}), 400
+
+    archived_until = closed_before(user_id)
+    if archived_until and period_start < archived_until:
+        return jsonify({'error': f'Attendance before {archived_until.isoformat()} has been archived by a season close'}), 409
+
+    try:
+        lock_payroll(user_id)
+        existing = PayrollRun.query.filter_by(user_id=user_id, period_start=period_start, period_end=period_end).first()
+        if existing:
+            return payroll_run_response(existing, 200, alreadyProcessed=True)
+        overlap = payroll_overlap(user_id, period_start, period_end)
+        if overlap:
+            db.session.rollback()
+            return jsonify({'error': overlap}), 409
+        # Claim the period first; a concurrent retry fails on _payroll_period_uc
+        run = PayrollRun(user_id=user_id, period_start=period_start, period_end=period_end)
+        db.session.add(run)
+        db.session.flush()
+
+        workers = {w.id: w for w in Worker.query.filter_by(user_id=user_id, is_active=True)}
+        totals = db.session.query(
+            Attendance.worker_id,
+            db.func.sum(db.case((Attendance.status == 'Present', 1), else_=0)),
+            db.func.sum(Attendance.hours)
+        ).join(Worker, Worker.id == Attendance.worker_id).filter(
+            Worker.user_id == user_id,
+            Worker.is_active == True,
+            Attendance.attendance_date.between(period_start, period_end)
+        ).group_by(Attendance.worker_id).all()
+
+        today = datetime.utcnow().date()
+        entries = []
+        for worker_id, present_days, total_hours in totals:
+            worker = workers[worker_id]
+            if worker.pay_type == 'Daily':
+                total_pay = int(present_days or 0) * worker.pay_rate
+            else: # Hourly
+                total_pay = int(total_hours or 0) * worker.pay_rate
+            if total_pay <= 0:
+                continue
+            deduction = max(0, min(deductions.get(worker_id, 0), worker.loans, total_pay))
+            worker.loans -= deduction
+            entries.append(Financial(
+                user_id=user_id,
+                type='Expense',
+                description=f"Worker salary - {worker.name}",
+                amount=total_pay - deduction,
+                transaction_date=today,
+                crop_name=None,
+                worker_id=worker_id,
+                category='Payroll',
+                payroll_run_id=run.id
+            ))
+            run.total_pay += total_pay
+            run.total_deductions += deduction
+
+        run.worker_count = len(entries)
+        run.net_pay = run.total_pay - run.total_deductions
+        db.session.add_all(entries)
+        rollup_entries(entries)
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        existing = PayrollRun.query.filter_by(user_id=user_id, period_start=period_start, period_end=period_end).first()
+        if existing is None:
+            return jsonify({'error': str(e)}), 400
+        return payroll_run_response(existing, 200, alreadyProcessed=True)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+    invalidate_reads(user_id, 'workers', 'analytics')
+    return payroll_run_response(run, 201, alreadyProcessed=False)
+
 # Financial Endpoints
-@app.route('/api/financials', methods=['GET'])
+@api.route('/api/financials', methods=['GET'])
 def get_financials():
     user_id = get_user_id()
-    financials = Financial.query.filter_by(user_id=user_id).order_by(Financial.transaction_date.desc()).all()
-    result = [{
-        'id': f.id,
-        'type': f.type,
-        'description': f.description,
-        'amount': f.amount,
-        'date': f.transaction_date.isoformat(),
-        'crop': f.crop_name
-    } for f in financials]
-    return jsonify(result)
-
-@app.route('/api/financials/revenue', methods=['POST'])
+    return list_response(Financial, user_id, FINANCIAL_FIELDS, Financial.transaction_date, descending=True)
+
+@api.route('/api/financials/revenue', methods=['POST'])
 def add_revenue():
     user_id = get_user_id()
     data = request.json
@@ -387,13 +1156,15 @@ def add_revenue():
             crop_name=data.get('cropName')
         )
         db.session.add(new_financial)
+        rollup_entries([new_financial])
         db.session.commit()
+        invalidate_reads(user_id, 'analytics')
         return jsonify({'message': 'Revenue recorded successfully!'}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
-@app.route('/api/financials/expense', methods=['POST'])
+@api.route('/api/financials/expense', methods=['POST'])
 def add_expense():
     user_id = get_user_id()
     data = request.json
@@ -407,27 +1178,21 @@ def add_expense():
             crop_name=data.get('cropName')
         )
         db.session.add(new_financial)
+        rollup_entries([new_financial])
         db.session.commit()
+        invalidate_reads(user_id, 'analytics')
         return jsonify({'message': 'Expense recorded successfully!'}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
 # Inventory Endpoints
-@app.route('/api/inventory', methods=['GET'])
+@api.route('/api/inventory', methods=['GET'])
 def get_inventory():
     user_id = get_user_id()
-    inventory = Inventory.query.filter_by(user_id=user_id).order_by(Inventory.item_name).all()
-    result = [{
-        'id': i.id,
-        'itemName': i.item_name,
-        'itemType': i.item_type,
-        'quantity': i.quantity,
-        'unit': i.unit
-    } for i in inventory]
-    return jsonify(result)
-
-@app.route('/api/inventory', methods=['POST'])
+    return list_response(Inventory, user_id, INVENTORY_FIELDS, Inventory.item_name, cache_section='inventory')
+
+@api.route('/api/inventory', methods=['POST'])
 def add_inventory_item():
     user_id = get_user_id()
     data = request.json
@@ -440,15 +1205,497 @@ def add_inventory_item():
             unit=data['unit']
         )
         db.session.add(new_inventory)
+        db.session.flush()
+        log_movement(user_id, 'inventory', new_inventory.id, new_inventory.quantity, 'opening')
         db.session.commit()
+        invalidate_reads(user_id, 'inventory')
         return jsonify({'message': 'Inventory item added successfully!', 'id': new_inventory.id}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
+# Stock Ledger Endpoints
+STOCK_INVALIDATES = {'inventory': 'inventory', 'yield': 'analytics'}
+
+def stock_time_arg(name):
+    """Parses a YYYY-MM-DD (end of that day) or ISO datetime query argument."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    if len(value) == 10:
+        return datetime.strptime(value, '%Y-%m-%d') + timedelta(days=1, microseconds=-1)
+    return datetime.fromisoformat(value)
+
+def stock_item_names(user_id):
+    """(kind, item_id) -> name for the user's inventory items and yields."""
+    names = {('inventory', i): n for i, n in db.session.query(Inventory.id, Inventory.item_name)
+             .filter_by(user_id=user_id)}
+    names.update({('yield', i): n for i, n in db.session.query(Yield.id, Yield.crop_name)
+                  .filter_by(user_id=user_id)})
+    return names
+
+@api.route('/api/stock', methods=['GET'])
+def get_stock():
+    """
+    Current stock per item, read from the maintained balances, or with ?at=
+    the stock at that date or time, rebuilt from snapshots and the ledger.
+    """
+    user_id = get_user_id()
+    try:
+        at = stock_time_arg('at')
+    except ValueError:
+        return jsonify({'error': "'at' must be a YYYY-MM-DD date or ISO datetime"}), 400
+    if at is None:
+        balances = {('inventory', i): q for i, q in db.session.query(Inventory.id, Inventory.quantity)
+                    .filter_by(user_id=user_id)}
+        balances.update({('yield', i): q for i, q in db.session.query(Yield.id, Yield.quantity)
+                         .filter_by(user_id=user_id)})
+    else:
+        balances = stock_at(user_id, at)
+    names = stock_item_names(user_id)
+    return jsonify([
+        {'kind': kind, 'itemId': item_id, 'name': names.get((kind, item_id)), 'quantity': quantity}
+        for (kind, item_id), quantity in sorted(balances.items())
+    ])
+
+@api.route('/api/stock/movements', methods=['GET'])
+def get_stock_movements():
+    """A user's ledger, newest first; filter with ?kind=&itemId= and page with ?before=<movement id>."""
+    user_id = get_user_id()
+    query = StockMovement.query.filter_by(user_id=user_id)
+    kind = request.args.get('kind')
+    if kind:
+        query = query.filter_by(item_kind=kind)
+    item_id = request.args.get('itemId', type=int)
+    if item_id is not None:
+        query = query.filter_by(item_id=item_id)
+    before = request.args.get('before', type=int)
+    if before is not None:
+        query = query.filter(StockMovement.id < before)
+    limit = max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    return jsonify([{
+        'id': m.id,
+        'kind': m.item_kind,
+        'itemId': m.item_id,
+        'change': m.change,
+        'reason': m.reason,
+        'note': m.note,
+        'occurredAt': m.occurred_at.isoformat()
+    } for m in query.order_by(StockMovement.id.desc()).limit(limit)])
+
+@api.route('/api/stock/movements', methods=['POST'])
+def record_stock_movements():
+    """
+    Records stock movements: one {kind, itemId, change, reason, note} object,
+    or many as a JSON list, {'records': [...]} or CSV. 'change' is signed
+    (negative to consume). Each item's movements are applied together and
+    rejected together if they would leave its stock negative.
+    """
+    user_id = get_user_id()
+    data = request.get_json(silent=True)
+    if isinstance(data, dict) and 'records' not in data:
+        rows = [data]
+    else:
+        try:
+            rows = bulk_request_rows()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    if len(rows) > MAX_BULK_ROWS:
+        return jsonify({'error': f'At most {MAX_BULK_ROWS} rows per request'}), 413
+
+    results = []
+    movements = []
+    for index, row in enumerate(rows):
+        try:
+            kind = row['kind']
+            if kind not in STOCK_KINDS:
+                raise ValueError(f"kind must be one of: {', '.join(STOCK_KINDS)}")
+            reason = row.get('reason') or ('restock' if int(row['change']) > 0 else 'consume')
+            if reason not in MOVEMENT_REASONS:
+                raise ValueError(f"reason must be one of: {', '.join(MOVEMENT_REASONS)}")
+            movement = {'kind': kind, 'item_id': int(row.get('itemId', row.get('item_id'))),
+                        'change': int(row['change']), 'reason': reason, 'note': row.get('note') or None}
+        except KeyError as e:
+            results.append({'row': index, 'status': 'error', 'error': f'Missing field {e}'})
+            continue
+        except (AttributeError, TypeError, ValueError) as e:
+            results.append({'row': index, 'status': 'error', 'error': str(e)})
+            continue
+        results.append({'row': index, 'status': 'ok', 'kind': kind, 'itemId': movement['item_id']})
+        movements.append(movement)
+
+    try:
+        if len(rows) == 1 and movements:
+            m = movements[0]
+            outcome = {(m['kind'], m['item_id']): apply_movement(
+                user_id, m['kind'], m['item_id'], m['change'], m['reason'], m['note'])}
+        else:
+            outcome = apply_movements(user_id, movements)
+        db.session.commit()
+    except StockRejected as e:
+        db.session.rollback()
+        return jsonify({'error': e.message}), e.status
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    invalidate_reads(user_id, *{STOCK_INVALIDATES[m['kind']] for m in movements})
+
+    for result in results:
+        if result['status'] != 'ok':
+            continue
+        balance = outcome[(result['kind'], result['itemId'])]
+        if isinstance(balance, StockRejected):
+            result.update(status='error', error=balance.message)
+        else:
+            result['balance'] = balance
+    failed = sum(1 for result in results if result['status'] == 'error')
+    status = 201 if failed < len(results) else 400
+    return jsonify({'recorded': len(results) - failed, 'failed': failed, 'results': results}), status
+
+# Bulk Import/Export Endpoints
+BULK_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+BULK_INVALIDATES = {'inventory': ('inventory',), 'yields': ('analytics',),
+                    'sales': ('analytics',), 'financials': ('analytics',)}
+
+def bulk_format():
+    """Returns the bulk file format from ?format= or the request's content type."""
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'ndjson' if request.mimetype in ('application/x-ndjson', 'application/jsonl') else 'csv'
+    return fmt if fmt in FORMATS else None
+
+@api.route('/api/import/<entity>', methods=['POST'])
+def import_entity(entity):
+    """
+    Streams a CSV or NDJSON request body into the given table. Rows are
+    committed in chunks; if the import stops partway, the 400 response says
+    how many rows were imported and the last row committed, so the client
+    can resend the rest.
+    """
+    user_id = get_user_id()
+    fmt = bulk_format()
+    if entity not in ENTITIES or not fmt:
+        return jsonify({'error': f"Unsupported import '{entity}' ({', '.join(FORMATS)} of {', '.join(ENTITIES)})"}), 400
+    try:
+        result = import_records(entity, request.stream, fmt, user_id)
+    except ImportFailed as e:
+        return jsonify({'error': e.message, 'imported': e.imported, 'committedThroughRow': e.committed_through,
+                        'failed': e.failed, 'errors': e.errors}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    finally:
+        if entity in BULK_INVALIDATES:
+            invalidate_reads(user_id, *BULK_INVALIDATES[entity])
+    return jsonify({'message': 'Import finished', **result}), 201 if result['imported'] else 200
+
+@api.route('/api/export/<entity>', methods=['GET'])
+def export_entity(entity):
+    """Streams the user's rows of the given table as CSV or NDJSON."""
+    user_id = get_user_id()
+    fmt = request.args.get('format', 'csv')
+    if entity not in ENTITIES or fmt not in FORMATS:
+        return jsonify({'error': f"Unsupported export '{entity}' ({', '.join(FORMATS)} of {', '.join(ENTITIES)})"}), 400
+    return Response(
+        stream_with_context(export_records(entity, fmt, user_id)),
+        mimetype=BULK_MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename={entity}.{fmt}'}
+    )
+
+# Season Close Endpoints
+# Seasons are closed with the close-season command rather than over HTTP, so
+# the archive is written where an operator can confirm it is kept.
+def season_close_json(season_close):
+    return {
+        'closedBefore': season_close.closed_before.isoformat(),
+        'attendanceRows': season_close.attendance_rows,
+        'financialRows': season_close.financial_rows,
+        'createdAt': season_close.created_at.isoformat()
+    }
+
+@api.route('/api/seasons', methods=['GET'])
+def get_season_closes():
+    user_id = get_user_id()
+    closes = SeasonClose.query.filter_by(user_id=user_id).order_by(SeasonClose.closed_before.desc()).all()
+    return jsonify([season_close_json(c) for c in closes])
+
+# Change Feed Endpoints
+CHANGES_PAGE_SIZE = 500
+CHANGES_MAX_WAIT = 25 # seconds a long-poll may wait for changes
+CHANGES_POLL_SECONDS = 2 # re-check interval while waiting, for commits made by other processes
+CHANGES_STREAM_SECONDS = int(os.getenv('CHANGES_STREAM_SECONDS', 300))
+CHANGES_HEARTBEAT_SECONDS = 15
+CHANGES_RETENTION_DAYS = int(os.getenv('CHANGES_RETENTION_DAYS', 30))
+# Long-polls and event streams each hold a request thread for their whole
+# duration, so only this many run at once per process; keep it below
+# GUNICORN_THREADS. Past the cap, long-polls answer at once and streams get 503.
+# A stream whose client went away frees its slot when a heartbeat fails to send.
+CHANGES_MAX_WAITERS = int(os.getenv('CHANGES_MAX_WAITERS', 2))
+change_waiters = threading.BoundedSemaphore(CHANGES_MAX_WAITERS)
+# entity -> fields sent for its changed rows
+CHANGE_FIELDS = {
+    'yields': YIELD_FIELDS,
+    'sales': SALE_FIELDS,
+    'workers': WORKER_FIELDS,
+    'attendance': ATTENDANCE_FIELDS,
+    'financials': FINANCIAL_FIELDS,
+    'inventory': INVENTORY_FIELDS
+}
+
+def change_rows(user_id, changes):
+    """
+    Coalesces changes to the last one per row, in feed order, and attaches the
+    row's current fields. Upserted rows that no longer exist (deleted or
+    archived since) are reported as deletes. 'rollups' refresh entries,
+    written when queued rollups are applied, carry no row.
+    """
+    latest = {}
+    for change in changes:
+        key = (change.entity, change.row_id)
+        latest.pop(key, None)
+        latest[key] = change.op
+
+    rows = {}
+    for entity, fields in CHANGE_FIELDS.items():
+        ids = [row_id for (e, row_id), op in latest.items() if e == entity and op == 'upsert']
+        if not ids:
+            continue
+        model = TRACKED_MODELS[entity]
+        query = db.session.query(*fields.values()).filter(model.id.in_(ids))
+        if model is Attendance:
+            query = query.filter(Attendance.worker_id.in_(db.session.query(Worker.id).filter(Worker.user_id == user_id)))
+        else:
+            query = query.filter(model.user_id == user_id)
+        for row in query:
+            rows[(entity, row.id)] = {key: json_value(row[i]) for i, key in enumerate(fields)}
+    season_ids = [row_id for (e, row_id), op in latest.items() if e == 'seasons']
+    if season_ids:
+        for season_close in SeasonClose.query.filter(SeasonClose.id.in_(season_ids), SeasonClose.user_id == user_id):
+            rows[('seasons', season_close.id)] = season_close_json(season_close)
+
+    items = []
+    for (entity, row_id), op in latest.items():
+        row = rows.get((entity, row_id))
+        if op != 'delete' and row is None and entity in CHANGE_FIELDS:
+            op = 'delete'
+        item = {'entity': entity, 'op': op, 'id': row_id}
+        if row is not None:
+            item['row'] = row
+        items.append(item)
+    return items
+
+def change_stream(user_id, position, limit):
+    """
+    Yields server-sent events: a 'changes' event per batch (its id is the
+    cursor to resume from), and comment heartbeats while idle. The stream ends
+    after CHANGES_STREAM_SECONDS and EventSource clients reconnect with
+    Last-Event-ID, so a connection never holds a worker indefinitely.
+    """
+    yield 'retry: 1000\n\n'
+    now = time.monotonic()
+    end, last_sent = now + CHANGES_STREAM_SECONDS, now
+    while time.monotonic() < end:
+        changes, cursor, has_more = read_changes(user_id, position, limit)
+        # End the read transaction so the connection returns to the pool and the next read sees new commits
+        payload = change_rows(user_id, changes) if changes else None
+        db.session.rollback()
+        if payload:
+            yield f"id: {cursor}\nevent: changes\ndata: {json.dumps({'cursor': cursor, 'changes': payload, 'hasMore': has_more})}\n\n"
+            position = decode_change_cursor(cursor)[:2]
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= CHANGES_HEARTBEAT_SECONDS:
+            yield ': heartbeat\n\n'
+            last_sent = time.monotonic()
+        if not has_more:
+            wait_for_commit(min(CHANGES_POLL_SECONDS, max(0, end - time.monotonic())))
+
+@api.route('/api/changes', methods=['GET'])
+def get_changes():
+    """
+    Returns the user's inserted, updated and deleted rows after ?since= (a
+    cursor from a previous response, or from Last-Event-ID), oldest first and
+    at most one entry per row, as {cursor, changes: [{entity, op, id, row}],
+    hasMore}. Without since, returns only the current cursor, to be taken
+    together with a full load. ?wait=<seconds> long-polls until a change
+    arrives; Accept: text/event-stream streams changes as server-sent events.
+    Both are limited to CHANGES_MAX_WAITERS per process: past that a
+    long-poll returns at once and a stream gets 503 with Retry-After.
+    A 410 means the cursor is older than the retention window: reload fully.
+    """
+    user_id = get_user_id()
+    since = request.args.get('since') or request.headers.get('Last-Event-ID')
+    if not since:
+        return jsonify({'cursor': latest_cursor(user_id), 'changes': [], 'hasMore': False})
+    try:
+        tx_id, change_id, issued = decode_change_cursor(since)
+        limit = max(1, min(int(request.args.get('limit', CHANGES_PAGE_SIZE)), CHANGES_PAGE_SIZE))
+        wait = max(0.0, min(float(request.args.get('wait', 0)), CHANGES_MAX_WAIT))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if issued < datetime.utcnow() - timedelta(days=CHANGES_RETENTION_DAYS):
+        return jsonify({'error': 'Cursor has expired; reload all data'}), 410
+
+    if request.accept_mimetypes.best == 'text/event-stream':
+        if not change_waiters.acquire(blocking=False):
+            return jsonify({'error': 'Too many open change streams; retry or poll'}), 503, {'Retry-After': '5'}
+        response = Response(stream_with_context(change_stream(user_id, (tx_id, change_id), limit)),
+                            mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        response.call_on_close(change_waiters.release)
+        return response
+
+    # Without a free waiter slot, answer as a plain poll
+    waiting = wait > 0 and change_waiters.acquire(blocking=False)
+    deadline = time.monotonic() + (wait if waiting else 0)
+    try:
+        while True:
+            changes, cursor, has_more = read_changes(user_id, (tx_id, change_id), limit)
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0:
+                break
+            db.session.rollback()
+            wait_for_commit(min(CHANGES_POLL_SECONDS, remaining))
+    finally:
+        if waiting:
+            change_waiters.release()
+    return jsonify({'cursor': cursor, 'changes': change_rows(user_id, changes), 'hasMore': has_more})
+
+# =========================================================================
+# Maintenance Commands
+# Run with: flask --app app <command>
+# =========================================================================
+
+@api.cli.command('init-db')
+def init_db_command():
+    """Creates missing tables, columns and indexes and runs the data backfills. Safe to re-run."""
+    setup_database()
+
+@api.cli.command('rebuild-rollups')
+@click.option('--user-id', type=int, default=None, help='Only rebuild rollups for this internal user id.')
+def rebuild_rollups_command(user_id):
+    """Rebuilds the financial rollup table from the raw financials table."""
+    count = rebuild_rollups(user_id)
+    db.session.commit()
+    click.echo(f"Rebuilt {count} rollup rows.")
+
+@api.cli.command('check-rollups')
+@click.option('--user-id', type=int, default=None, help='Only check rollups for this internal user id.')
+def check_rollups_command(user_id):
+    """Compares the financial rollup table against raw sums."""
+    mismatches = check_rollups(user_id)
+    for mismatch in mismatches:
+        click.echo(mismatch)
+    if mismatches:
+        raise SystemExit(f"{len(mismatches)} rollup rows out of date. Run rebuild-rollups to fix.")
+    click.echo("Rollups match the financials table.")
+
+@api.cli.command('outbox-drain')
+def outbox_drain_command():
+    """Applies every ready outbox task in this process, e.g. after a crash."""
+    outbox.drain()
+    pending = OutboxTask.query.filter_by(status='pending').count()
+    failed = OutboxTask.query.filter_by(status='failed').count()
+    click.echo(f"Outbox drained. {pending} tasks waiting for retry, {failed} failed.")
+
+@api.cli.command('partition-tables')
+@click.option('--years-ahead', type=int, default=1, show_default=True, help='Create yearly partitions this far ahead.')
+def partition_tables_command(years_ahead):
+    """Partitions attendance and financials by year (PostgreSQL), or adds upcoming partitions."""
+    actions = partition_tables(years_ahead)
+    if actions is None:
+        raise SystemExit("Partitioning requires PostgreSQL.")
+    for action in actions:
+        click.echo(action)
+    click.echo("Partitions are up to date.")
+
+@api.cli.command('close-season')
+@click.option('--user-id', type=int, required=True, help='Internal user id whose season to close.')
+@click.option('--before', type=click.DateTime(formats=['%Y-%m-%d']), required=True,
+              help='Archive entries dated before the month containing this date.')
+def close_season_command(user_id, before):
+    """
+    Archives a user's attendance and financial entries into summaries and a
+    cold archive file under ARCHIVE_DIR, which holds the only copy of the
+    archived rows. Run from a host where ARCHIVE_DIR is durable storage.
+    """
+    if before.date() > datetime.utcnow().date():
+        raise click.BadParameter('must not be in the future', param_hint="'--before'")
+    season_close = close_season(user_id, before.date())
+    click.echo(f"Archived {season_close.attendance_rows} attendance and {season_close.financial_rows} "
+               f"financial rows before {season_close.closed_before} to {season_close.archive_path}.")
+
+@api.cli.command('prune-changes')
+@click.option('--days', type=int, default=CHANGES_RETENTION_DAYS, show_default=True, help='Keep changes this many days.')
+def prune_changes_command(days):
+    """Deletes change feed entries older than the retention window. Run daily."""
+    count = prune_changes(days)
+    db.session.commit()
+    click.echo(f"Pruned {count} change feed entries.")
+
+@api.cli.command('snapshot-stock')
+def snapshot_stock_command():
+    """Snapshots every item's stock balance, bounding point-in-time ledger replays. Run periodically."""
+    count = take_snapshots()
+    db.session.commit()
+    click.echo(f"Wrote {count} stock snapshot rows.")
+
+@api.cli.command('check-stock')
+@click.option('--user-id', type=int, default=None, help='Only check stock for this internal user id.')
+def check_stock_command(user_id):
+    """Compares inventory and yield balances against the stock ledger."""
+    mismatches = check_stock(user_id)
+    for mismatch in mismatches:
+        click.echo(mismatch)
+    if mismatches:
+        raise SystemExit(f"{len(mismatches)} items out of step with the stock ledger.")
+    click.echo("Stock balances match the ledger.")
+
+# =========================================================================
+# Application factory
+# =========================================================================
+
+def create_app(config=None):
+    """
+    Builds the Flask application from the environment. config, if given,
+    overrides individual settings (e.g. SQLALCHEMY_DATABASE_URI in tests).
+    Used by `flask --app app`, `gunicorn 'app:create_app()'` and python app.py.
+    """
+    app = Flask(__name__)
+
+    # Enable CORS (Cross-Origin Resource Sharing) to allow requests from your React frontend
+    CORS(app, expose_headers=['X-Next-Cursor', 'X-Read-Source', 'X-Read-Primary-Until'])
+
+    # Database configuration, read from the environment
+    database_url = os.getenv('DATABASE_URL')
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_url)
+    # Optional read replica for GET requests (see replicas.py)
+    app.config['SQLALCHEMY_BINDS'] = bind_config(os.getenv('REPLICA_DATABASE_URL'),
+                                                 engine_options(os.getenv('REPLICA_DATABASE_URL')))
+    app.config.update(config or {})
+
+    db.init_app(app)
+    # Record inserts, updates and deletes for the change feed (/api/changes)
+    init_change_tracking()
+
+    # Optional write-behind queue for secondary effects such as rollup maintenance
+    outbox.init_app(app)
+
+    app.register_blueprint(api)
+    # Registered after authenticate so read-your-writes stickiness can key on the user
+    replica_router.init_app(app, db)
+
+    # Opt-in request metrics, SQL instrumentation and profiling on /metrics
+    if os.getenv('METRICS_ENABLED', 'false').lower() in ('1', 'true', 'yes', 'on'):
+        init_instrumentation(app, runtime_gauges)
+
+    if token_signer.ephemeral:
+        app.logger.warning('SECRET_KEY is not set; session tokens will not outlive this process')
+    return app
+
 # =========================================================================
 # Main application entry point
 # =========================================================================
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    create_app().run(debug=True, port=5000)
@@ -0,0 +1,144 @@
+# archive.py
+# Season close: moves a user's attendance and financial rows from before a
+# month boundary out of the live tables. The rows are written to a gzipped
+# NDJSON file under ARCHIVE_DIR (default 'archive/'), folded into monthly
+# attendance_summaries and financial_archive_summaries rows, and deleted.
+# The file is the only copy of the archived rows: it is fsynced and read back
+# before anything is deleted, and ARCHIVE_DIR must be durable storage.
+# Seasons are closed with the close-season command only.
+# The financial rollups are left as they are, so the dashboard totals and
+# trends still include archived months.
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+
+from db_setup import db, Worker, Attendance, Financial, AttendanceSummary, FinancialArchiveSummary, SeasonClose, upsert_insert
+from changes import record_changes
+
+ARCHIVE_BATCH_SIZE = 1000
+
+def closed_before(user_id):
+    """The first open date for a user, or None if no season has been closed."""
+    return db.session.query(db.func.max(SeasonClose.closed_before)).filter_by(user_id=user_id).scalar()
+
+def add_to_summary(model, key_columns, values, totals):
+    """Adds totals to the summary row identified by values, creating it if needed."""
+    stmt = upsert_insert(model)
+    if stmt is None:
+        row = model.query.filter_by(**values).with_for_update().first()
+        if row:
+            for column, amount in totals.items():
+                setattr(row, column, getattr(row, column) + amount)
+        else:
+            db.session.add(model(**values, **totals))
+        return
+    stmt = stmt.values(**values, **totals)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column: getattr(model, column) + getattr(stmt.excluded, column) for column in totals}
+    )
+    db.session.execute(stmt)
+
+def archive_rows(archive, table, query, fold):
+    """Streams query's rows into the archive file, passing each to fold. Returns (rows, highest id)."""
+    columns = [c.name for c in query.column_descriptions[0]['entity'].__table__.columns]
+    count, max_id = 0, None
+    for row in query.yield_per(ARCHIVE_BATCH_SIZE):
+        record = {column: getattr(row, column) for column in columns}
+        archive.write(json.dumps({'table': table, **record}, default=str) + '\n')
+        fold(row)
+        count += 1
+        max_id = row.id if max_id is None else max(max_id, row.id)
+    return count, max_id
+
+def sync_path(path):
+    """fsyncs a file, or a directory so that a rename in it is durable."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def count_archived(path):
+    """Reads an archive file back and returns its record count per table."""
+    counts = defaultdict(int)
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            counts[json.loads(line)['table']] += 1
+    return counts
+
+def close_season(user_id, before, archive_dir=None):
+    """
+    Archives a user's attendance and financial rows dated before the month
+    containing 'before' and returns the SeasonClose record. Rows added while
+    the close runs are left in place for the next close. Commits.
+    """
+    before = before.replace(day=1)
+    archive_dir = archive_dir or os.getenv('ARCHIVE_DIR', 'archive')
+    user_dir = os.path.join(archive_dir, str(user_id))
+    os.makedirs(user_dir, exist_ok=True)
+    path = os.path.join(user_dir, f"before-{before.isoformat()}-{datetime.utcnow():%Y%m%d%H%M%S}.ndjson.gz")
+
+    worker_ids = db.session.query(Worker.id).filter(Worker.user_id == user_id)
+    attendance_query = Attendance.query.filter(
+        Attendance.worker_id.in_(worker_ids), Attendance.attendance_date < before
+    ).order_by(Attendance.attendance_date, Attendance.id)
+    financial_query = Financial.query.filter(
+        Financial.user_id == user_id, Financial.transaction_date < before
+    ).order_by(Financial.transaction_date, Financial.id)
+
+    # Fold rows into monthly summaries while writing them to the cold archive
+    attendance_totals = defaultdict(lambda: {'days_present': 0, 'days_absent': 0, 'hours': 0})
+    financial_totals = defaultdict(lambda: {'amount': 0, 'entry_count': 0})
+
+    def fold_attendance(row):
+        total = attendance_totals[(row.worker_id, row.attendance_date.replace(day=1))]
+        total['days_present' if row.status == 'Present' else 'days_absent'] += 1
+        total['hours'] += row.hours or 0
+
+    def fold_financial(row):
+        total = financial_totals[(row.transaction_date.replace(day=1), row.type, row.crop_name or '')]
+        total['amount'] += row.amount
+        total['entry_count'] += 1
+
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as archive:
+        attendance_rows, attendance_max_id = archive_rows(archive, 'attendance', attendance_query, fold_attendance)
+        financial_rows, financial_max_id = archive_rows(archive, 'financials', financial_query, fold_financial)
+    sync_path(path + '.tmp')
+    os.replace(path + '.tmp', path)
+    if os.name == 'posix':
+        sync_path(user_dir)
+
+    # The file is the only copy of the rows, so nothing is deleted until it
+    # reads back complete
+    archived = count_archived(path)
+    if archived['attendance'] != attendance_rows or archived['financials'] != financial_rows:
+        raise RuntimeError(f"Archive {path} is incomplete; no rows were deleted")
+
+    try:
+        for (worker_id, period_start), totals in attendance_totals.items():
+            add_to_summary(AttendanceSummary, ['worker_id', 'period_start'],
+                           {'worker_id': worker_id, 'period_start': period_start}, totals)
+        for (period_start, entry_type, crop_name), totals in financial_totals.items():
+            add_to_summary(FinancialArchiveSummary, ['user_id', 'period_start', 'type', 'crop_name'],
+                           {'user_id': user_id, 'period_start': period_start, 'type': entry_type,
+                            'crop_name': crop_name}, totals)
+        if attendance_rows:
+            attendance_query.order_by(None).filter(Attendance.id <= attendance_max_id) \
+                .delete(synchronize_session=False)
+        if financial_rows:
+            financial_query.order_by(None).filter(Financial.id <= financial_max_id) \
+                .delete(synchronize_session=False)
+        season_close = SeasonClose(user_id=user_id, closed_before=before, attendance_rows=attendance_rows,
+                                   financial_rows=financial_rows, archive_path=path)
+        db.session.add(season_close)
+        db.session.flush()
+        # Clients drop their copies of the archived rows when the close reaches them
+        record_changes(user_id, 'seasons', [season_close.id], op='close')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return season_close
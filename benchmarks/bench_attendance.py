@@ -0,0 +1,62 @@
+# bench_attendance.py
+# Compares marking a crew's attendance one request per worker against a
+# single /api/attendance/bulk request, using a throwaway SQLite database
+# unless DATABASE_URL is set.
+#
+# Usage (from the repository root):
+#   PYTHONPATH=.:db_setup python benchmarks/bench_attendance.py --workers 200 --days 5
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-row vs bulk attendance benchmark')
+    parser.add_argument('--workers', type=int, default=200)
+    parser.add_argument('--days', type=int, default=5)
+    args = parser.parse_args()
+
+    if not os.getenv('DATABASE_URL'):
+        db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app, db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+
+    worker_ids = []
+    for i in range(args.workers):
+        res = client.post('/api/workers', json={'name': f'Worker {i}', 'role': 'Picker', 'payRate': 500, 'payType': 'Daily'})
+        worker_ids.append(res.json['id'])
+
+    start_day = date(2000, 1, 1)
+    per_row_days = [start_day + timedelta(days=d) for d in range(args.days)]
+    bulk_days = [start_day + timedelta(days=args.days + d) for d in range(args.days)]
+
+    started = time.perf_counter()
+    for day in per_row_days:
+        for worker_id in worker_ids:
+            client.post(f'/api/workers/{worker_id}/attendance',
+                        json={'date': day.isoformat(), 'status': 'Present', 'hours': 8})
+    per_row = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for day in bulk_days:
+        records = [{'workerId': w, 'date': day.isoformat(), 'status': 'Present', 'hours': 8} for w in worker_ids]
+        res = client.post('/api/attendance/bulk', json=records)
+        if res.status_code != 200 or res.json['failed']:
+            sys.exit(f'Bulk request failed: {res.json}')
+    bulk = time.perf_counter() - started
+
+    rows = args.workers * args.days
+    print(f"{rows} attendance rows per mode ({args.workers} workers x {args.days} days)")
+    print(f"per-row endpoint: {per_row:.3f}s ({rows / per_row:.0f} rows/s)")
+    print(f"bulk endpoint:    {bulk:.3f}s ({rows / bulk:.0f} rows/s)")
+    print(f"speedup:          {per_row / bulk:.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# bench_startup.py
+# Measures cold start: the time to import app.py, build the application with
+# create_app(), and serve the first and second requests, each in a fresh
+# Python process (as a new gunicorn worker would), and reports the median
+# over --runs processes. Uses a throwaway SQLite database unless
+# DATABASE_URL is set.
+#
+# Usage (from the repository root):
+#   PYTHONPATH=.:db_setup python benchmarks/bench_startup.py --runs 10 --out startup.json
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from run_benchmarks import git_commit
+
+# Runs in each child process and prints its timings as JSON
+CHILD = '''
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+client = application.test_client()
+client.get(PATH)
+first = time.perf_counter()
+client.get(PATH)
+second = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (first - created) * 1000,
+    'second_request_ms': (second - first) * 1000,
+    'total_ms': (first - started) * 1000,
+}))
+'''
+
+def run_child(path, env):
+    output = subprocess.run([sys.executable, '-c', CHILD.replace('PATH', repr(path))],
+                            capture_output=True, text=True, env=env, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start benchmark')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/api/dashboard', help='Endpoint to request')
+    parser.add_argument('--out', help='Write results JSON to this file')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if not env.get('DATABASE_URL'):
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    # Create the schema once so the children time startup, not DDL
+    subprocess.run([sys.executable, '-c', 'import app\nfrom db_setup import db\n'
+                    'with app.create_app().app_context(): db.create_all()'], env=env, check=True)
+
+    runs = [run_child(args.path, env) for _ in range(args.runs)]
+    results = {key: round(statistics.median(run[key] for run in runs), 2) for key in runs[0]}
+    for key, value in results.items():
+        print(f"{key:<20}{value:>10.2f}")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'commit': git_commit(), 'path': args.path, 'runs': args.runs,
+                       'median': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
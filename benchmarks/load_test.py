@@ -0,0 +1,95 @@
+# load_test.py
+# Drives a running server with concurrent HTTP clients and reports requests/sec
+# and latency percentiles per endpoint. Run it once against the development
+# server and once against gunicorn to compare the two serving modes:
+#
+#   python app.py                                   # terminal 1 (dev server)
+#   python benchmarks/load_test.py --url http://localhost:5000
+#
+#   gunicorn -c gunicorn.conf.py 'app:create_app()' # terminal 1 (production)
+#   python benchmarks/load_test.py --url http://localhost:5000
+import argparse
+import json
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_ENDPOINTS = [
+    '/api/dashboard',
+    '/api/yields',
+    '/api/sales',
+    '/api/workers',
+    '/api/financials?limit=100',
+    '/api/inventory',
+]
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_endpoint(base_url, path, concurrency, duration):
+    """Hammers one endpoint for duration seconds and returns its latency summary."""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(base_url + path, timeout=30) as response:
+                    response.read()
+                    ok = response.status < 400
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'endpoint': path,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / wall, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP load test for the FarmSync API')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per endpoint')
+    parser.add_argument('--endpoint', action='append', help='Endpoint path to test (repeatable)')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'endpoint':<32}{'reqs':>8}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for path in args.endpoint or DEFAULT_ENDPOINTS:
+        result = run_endpoint(args.url.rstrip('/'), path, args.concurrency, args.duration)
+        results.append(result)
+        print(f"{path:<32}{result['requests']:>8}{result['errors']:>8}{result['rps']:>10}"
+              f"{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'url': args.url, 'concurrency': args.concurrency, 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
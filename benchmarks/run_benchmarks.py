@@ -0,0 +1,219 @@
+# run_benchmarks.py
+# Seeds a synthetic farm (see synthetic.py) and drives every read endpoint,
+# then the main write paths (sales, bulk attendance, payroll runs and
+# imports), through the Flask test client, reporting throughput, latency percentiles,
+# SQL statements per request and peak Python memory per endpoint. Results
+# are written as JSON tagged with the current git commit so runs can be
+# compared across commits with --compare. The read cache is cleared before
+# every timed request, so each endpoint's figures measure its queries;
+# endpoints the cache serves are also reported warm, as "<path> (cached)".
+#
+# Usage (from the repository root):
+#   PYTHONPATH=.:db_setup python benchmarks/run_benchmarks.py --years 2 --out bench.json
+#   PYTHONPATH=.:db_setup python benchmarks/run_benchmarks.py --years 2 --compare bench.json
+# A throwaway SQLite database is used unless DATABASE_URL is set; point it at
+# an empty local PostgreSQL database to benchmark PostgreSQL.
+import argparse
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+from synthetic import add_arguments, seed
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def endpoints(first_worker_id):
+    return [
+        '/api/dashboard',
+        '/api/bootstrap',
+        '/api/analytics?months=24',
+        '/api/yields',
+        '/api/sales',
+        '/api/workers',
+        '/api/financials',
+        '/api/financials?limit=100',
+        '/api/financials?stream=ndjson',
+        '/api/inventory',
+        f'/api/workers/{first_worker_id}',
+    ]
+
+def write_cases(worker_ids, yield_id, start):
+    """
+    Write benchmarks: name -> (path, make_request), where make_request returns
+    the client.post() arguments for the next request. Every request writes
+    new rows: attendance and imports on dates from start onwards, after the
+    seeded history, and payroll runs for successive weeks before start.
+    """
+    days = itertools.count()
+    weeks = itertools.count()
+    imports = itertools.count()
+
+    def bulk_attendance():
+        day = (start + timedelta(days=next(days))).isoformat()
+        return {'json': [{'workerId': worker_id, 'date': day, 'status': 'Present', 'hours': 8}
+                         for worker_id in worker_ids]}
+
+    def payroll_run():
+        # Week by week back through the seeded attendance, so each run pays real days
+        period_end = start - timedelta(days=1 + 7 * next(weeks))
+        return {'json': {'from': (period_end - timedelta(days=6)).isoformat(), 'to': period_end.isoformat()}}
+
+    def financials_import():
+        batch = next(imports)
+        rows = ''.join(f'Expense,Bench {batch}-{i},{100 + i},{start.isoformat()}\n' for i in range(500))
+        return {'data': 'type,description,amount,transaction_date\n' + rows, 'content_type': 'text/csv'}
+
+    return {
+        'POST /api/sales': ('/api/sales', lambda: {
+            'json': {'cropId': yield_id, 'quantity': 1, 'price': 100, 'seller': 'Bench'}}),
+        'POST /api/attendance/bulk': ('/api/attendance/bulk', bulk_attendance),
+        'POST /api/payroll/runs': ('/api/payroll/runs', payroll_run),
+        'POST /api/import/financials': ('/api/import/financials', financials_import),
+    }
+
+def bench_endpoint(client, path, iterations, statement_counter, before_request=None, make_request=None):
+    """
+    Requests path iterations times and summarizes latency, SQL count and
+    memory. before_request, if given, runs untimed before each request.
+    With make_request, each request is a POST of its arguments instead of a GET.
+    """
+    def send(arguments):
+        return client.post(path, **arguments) if make_request else client.get(path)
+
+    send(make_request() if make_request else None)  # warm up
+    latencies = []
+    statements = []
+    wall = 0.0
+    tracemalloc.start()
+    for _ in range(iterations):
+        if before_request:
+            before_request()
+        arguments = make_request() if make_request else None
+        statement_counter[0] = 0
+        request_started = time.perf_counter()
+        response = send(arguments)
+        response.get_data()
+        latencies.append(time.perf_counter() - request_started)
+        wall += latencies[-1]
+        statements.append(statement_counter[0])
+        if response.status_code >= 400:
+            raise SystemExit(f'{path} returned {response.status_code}')
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'requests': iterations,
+        'rps': round(iterations / wall, 1),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'sql_statements': max(statements),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'response_bytes': len(response.get_data())
+    }
+
+def print_result(name, result):
+    print(f"{name:<36}{result['rps']:>9}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+          f"{result['p99_ms']:>10}{result['sql_statements']:>6}{result['peak_memory_kb']:>10}")
+
+def print_comparison(results, baseline):
+    print(f"\nvs {baseline.get('commit')} ({baseline.get('timestamp')})")
+    print(f"{'endpoint':<36}{'p50 ms':>10}{'before':>10}{'change':>9}{'sql':>6}{'before':>8}")
+    for path, result in results.items():
+        before = baseline['results'].get(path)
+        if not before:
+            continue
+        change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+        print(f"{path:<36}{result['p50_ms']:>10}{before['p50_ms']:>10}{change:>8.1f}%"
+              f"{result['sql_statements']:>6}{before['sql_statements']:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the FarmSync API on a synthetic farm')
+    add_arguments(parser)
+    parser.add_argument('--iterations', type=int, default=50, help='Requests per endpoint')
+    parser.add_argument('--out', help='Write results JSON to this file')
+    parser.add_argument('--compare', help='Compare against a previous results JSON file')
+    args = parser.parse_args()
+
+    if not os.getenv('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+    from sqlalchemy import event
+    from app import create_app, db, read_cache
+    app = create_app()
+    from db_setup import Worker, Yield
+
+    statement_counter = [0]
+
+    def count_statement(*_):
+        statement_counter[0] += 1
+
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        counts = seed(db, args.users, args.workers, args.years, args.yields_per_month,
+                      args.sales_per_month, args.expenses_per_month, args.seed)
+        print(f"Seeded in {time.perf_counter() - started:.1f}s: "
+              + ', '.join(f'{count} {table}' for table, count in counts.items()), file=sys.stderr)
+        first_worker_id = db.session.query(db.func.min(Worker.id)).scalar()
+        # Write benchmarks act as the demo user, the first seeded user
+        demo_user_id = db.session.query(Worker.user_id).filter_by(id=first_worker_id).scalar()
+        worker_ids = [w_id for (w_id,) in db.session.query(Worker.id).filter_by(user_id=demo_user_id)]
+        yield_id = db.session.query(Yield.id).filter_by(user_id=demo_user_id) \
+            .order_by(Yield.quantity.desc()).limit(1).scalar()
+        database = db.engine.dialect.name
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+
+    client = app.test_client()
+    results = {}
+    print(f"{'endpoint':<36}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'sql':>6}{'peak KB':>10}")
+    for path in endpoints(first_worker_id):
+        runs = {path: bench_endpoint(client, path, args.iterations, statement_counter, read_cache.clear)}
+        # A warm request that hits the read cache is benchmarked separately
+        hits = read_cache.stats()['hits']
+        client.get(path)
+        if read_cache.stats()['hits'] > hits:
+            runs[f'{path} (cached)'] = bench_endpoint(client, path, args.iterations, statement_counter)
+        for name, result in runs.items():
+            results[name] = result
+            print_result(name, result)
+    # Writes run last so every read is measured on the seeded data alone
+    for name, (path, make_request) in write_cases(worker_ids, yield_id, date.today() + timedelta(days=1)).items():
+        results[name] = bench_endpoint(client, path, args.iterations, statement_counter, make_request=make_request)
+        print_result(name, results[name])
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+        'database': database,
+        'config': {key: value for key, value in vars(args).items() if key not in ('out', 'compare')},
+        'rows': counts,
+        'results': results
+    }
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+
+if __name__ == '__main__':
+    main()
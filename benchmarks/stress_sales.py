@@ -0,0 +1,72 @@
+# stress_sales.py
+# Concurrency check for sale recording: many threads sell from the same yield
+# at once, then the script verifies that no update was lost and nothing was
+# oversold (final stock == initial stock - units in accepted sales, and >= 0).
+# Use PostgreSQL for a realistic run; SQLite serializes writers.
+#
+# Usage (from the repository root):
+#   PYTHONPATH=.:db_setup python benchmarks/stress_sales.py --threads 32 --sales 2000 --stock 1500
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent sale recording stress test')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--sales', type=int, default=1000, help='Total sale requests across all threads')
+    parser.add_argument('--stock', type=int, default=800, help='Starting yield quantity')
+    parser.add_argument('--quantity', type=int, default=1, help='Units per sale')
+    args = parser.parse_args()
+
+    if not os.getenv('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'stress.db')}"
+
+    from app import create_app, db
+    app = create_app()
+    from db_setup import Yield, Sale
+
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    yield_id = client.post('/api/yields', json={'name': 'Stress Crop', 'quantity': args.stock, 'unit': 'kg'}).json['id']
+
+    statuses = Counter()
+    lock = threading.Lock()
+    per_thread = args.sales // args.threads
+
+    def seller():
+        thread_client = app.test_client()
+        for _ in range(per_thread):
+            response = thread_client.post('/api/sales', json={
+                'cropId': yield_id, 'quantity': args.quantity, 'price': 10, 'seller': 'stress'
+            })
+            with lock:
+                statuses[response.status_code] += 1
+
+    threads = [threading.Thread(target=seller) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        final_stock = db.session.get(Yield, yield_id).quantity
+        sold = db.session.query(db.func.coalesce(db.func.sum(Sale.quantity_sold), 0)).filter_by(yield_id=yield_id).scalar()
+
+    total = sum(statuses.values())
+    print(f"{total} sale requests from {args.threads} threads in {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+    print(f"responses: {dict(statuses)}")
+    print(f"stock: initial={args.stock} sold={sold} final={final_stock}")
+    accepted_units = statuses[201] * args.quantity
+    if final_stock != args.stock - sold or sold != accepted_units or final_stock < 0:
+        sys.exit('FAIL: lost update or oversell detected')
+    print('OK: no lost updates, no oversell')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+# synthetic.py
+# Seeds the models from db_setup.py with a synthetic farm: users, workers,
+# years of daily attendance, yields, sales, financial entries and inventory.
+# The first user is the demo user the API serves, the rest add realistic
+# multi-tenant volume. Rows are written with bulk inserts, yields and
+# inventory get their stock ledger rows, and the financial rollups are
+# rebuilt at the end.
+#
+# Usage (from the repository root), against DATABASE_URL:
+#   PYTHONPATH=.:db_setup python benchmarks/synthetic.py --users 3 --workers 50 --years 2
+import argparse
+import random
+from datetime import date, datetime, timedelta
+
+CROPS = ['Rice', 'Wheat', 'Maize', 'Sugarcane', 'Cotton', 'Tomato', 'Onion', 'Potato']
+ROLES = ['Picker', 'Tractor Driver', 'Supervisor', 'Irrigation', 'Sprayer']
+INVENTORY_ITEMS = [('Urea', 'Fertilizer', 'kg'), ('DAP', 'Fertilizer', 'kg'), ('Paddy Seed', 'Seed', 'kg'),
+                   ('Diesel', 'Fuel', 'L'), ('Pesticide', 'Chemical', 'L'), ('Sacks', 'Packaging', 'pcs')]
+INSERT_CHUNK = 5000
+
+def add_arguments(parser):
+    parser.add_argument('--users', type=int, default=2, help='Users (farms); the first is the demo user')
+    parser.add_argument('--workers', type=int, default=30, help='Workers per user')
+    parser.add_argument('--years', type=float, default=1, help='Years of daily history')
+    parser.add_argument('--yields-per-month', type=int, default=10)
+    parser.add_argument('--sales-per-month', type=int, default=20)
+    parser.add_argument('--expenses-per-month', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=42, help='Random seed, for reproducible data')
+
+def bulk_insert(db, model, rows):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.session.execute(db.insert(model), rows[start:start + INSERT_CHUNK])
+
+def seed(db, users=2, workers=30, years=1, yields_per_month=10, sales_per_month=20,
+         expenses_per_month=40, seed=42, end_date=None):
+    """Seeds a synthetic farm into the bound database and returns row counts per table."""
+    from werkzeug.security import generate_password_hash
+    from db_setup import User, Worker, Attendance, Yield, Sale, Financial, Inventory, StockMovement
+    from rollups import rebuild_rollups
+
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    days = int(365 * years)
+    start_date = end_date - timedelta(days=days - 1)
+    months = max(1, round(days / 30))
+    counts = dict.fromkeys(['users', 'workers', 'attendance', 'yields', 'sales', 'financials', 'inventory'], 0)
+    password_hash = generate_password_hash('password')
+
+    def random_day():
+        return start_date + timedelta(days=rng.randrange(days))
+
+    for u in range(users):
+        unique_user_id = 'user_1a2b3c4d' if u == 0 else f'user_synthetic_{u}'
+        user = User.query.filter_by(unique_user_id=unique_user_id).first()
+        if not user:
+            user = User(unique_user_id=unique_user_id, email=f'{unique_user_id}@farmsync.com',
+                        password_hash=password_hash, name=f'Farm {u}')
+            db.session.add(user)
+            db.session.flush()
+            counts['users'] += 1
+
+        worker_rows = [{
+            'user_id': user.id, 'name': f'Worker {u}-{w}', 'role': rng.choice(ROLES),
+            'pay_rate': rng.choice([400, 500, 600]) if w % 3 else rng.choice([60, 75, 90]),
+            'pay_type': 'Daily' if w % 3 else 'Hourly', 'loans': 0, 'is_active': rng.random() > 0.1
+        } for w in range(workers)]
+        bulk_insert(db, Worker, worker_rows)
+        worker_ids = [w_id for (w_id,) in db.session.query(Worker.id).filter_by(user_id=user.id)]
+
+        attendance_rows = []
+        for worker_id in worker_ids:
+            for d in range(days):
+                present = rng.random() < 0.85
+                attendance_rows.append({
+                    'worker_id': worker_id, 'attendance_date': start_date + timedelta(days=d),
+                    'status': 'Present' if present else 'Absent', 'hours': rng.randint(6, 10) if present else 0
+                })
+        bulk_insert(db, Attendance, attendance_rows)
+
+        yield_rows = [{
+            'user_id': user.id, 'crop_name': rng.choice(CROPS), 'quantity': rng.randint(100, 5000),
+            'unit': 'kg', 'date_recorded': random_day()
+        } for _ in range(yields_per_month * months)]
+        last_yield_id = db.session.query(db.func.max(Yield.id)).scalar() or 0
+        bulk_insert(db, Yield, yield_rows)
+        yields = db.session.query(Yield.id, Yield.crop_name).filter_by(user_id=user.id).all()
+
+        sale_rows = []
+        financial_rows = []
+        for _ in range(sales_per_month * months):
+            yield_id, crop_name = rng.choice(yields)
+            sold_on = random_day()
+            price = rng.randint(1000, 50000)
+            sale_rows.append({
+                'user_id': user.id, 'yield_id': yield_id, 'crop_name': crop_name,
+                'quantity_sold': rng.randint(10, 500), 'price': price,
+                'seller_name': f'Buyer {rng.randint(1, 40)}', 'date_of_sale': sold_on
+            })
+            financial_rows.append({
+                'user_id': user.id, 'type': 'Revenue', 'description': f'Sale of {crop_name}',
+                'amount': price, 'transaction_date': sold_on, 'crop_name': crop_name
+            })
+        for _ in range(expenses_per_month * months):
+            financial_rows.append({
+                'user_id': user.id, 'type': 'Expense', 'description': 'Farm expense',
+                'amount': rng.randint(100, 20000), 'transaction_date': random_day(),
+                'crop_name': rng.choice(CROPS + [None, None])
+            })
+        bulk_insert(db, Sale, sale_rows)
+        bulk_insert(db, Financial, financial_rows)
+
+        inventory_rows = [{
+            'user_id': user.id, 'item_name': name, 'item_type': item_type,
+            'quantity': rng.randint(10, 1000), 'unit': unit
+        } for name, item_type, unit in INVENTORY_ITEMS]
+        last_inventory_id = db.session.query(db.func.max(Inventory.id)).scalar() or 0
+        bulk_insert(db, Inventory, inventory_rows)
+
+        # Stock ledger: each yield enters stock on the day it was recorded and
+        # inventory at the start of the history, so ?at= replays real dates
+        movement_rows = [{
+            'user_id': user.id, 'item_kind': 'yield', 'item_id': yield_id, 'change': quantity,
+            'reason': 'harvest', 'occurred_at': datetime.combine(recorded, datetime.min.time())
+        } for yield_id, quantity, recorded in db.session.query(Yield.id, Yield.quantity, Yield.date_recorded)
+            .filter(Yield.user_id == user.id, Yield.id > last_yield_id).order_by(Yield.date_recorded, Yield.id)]
+        movement_rows += [{
+            'user_id': user.id, 'item_kind': 'inventory', 'item_id': item_id, 'change': quantity,
+            'reason': 'opening', 'occurred_at': datetime.combine(start_date, datetime.min.time())
+        } for item_id, quantity in db.session.query(Inventory.id, Inventory.quantity)
+            .filter(Inventory.user_id == user.id, Inventory.id > last_inventory_id)]
+        bulk_insert(db, StockMovement, movement_rows)
+
+        counts['workers'] += len(worker_rows)
+        counts['attendance'] += len(attendance_rows)
+        counts['yields'] += len(yield_rows)
+        counts['sales'] += len(sale_rows)
+        counts['financials'] += len(financial_rows)
+        counts['inventory'] += len(inventory_rows)
+
+    rebuild_rollups()
+    db.session.commit()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed a synthetic farm into DATABASE_URL')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    from app import create_app, db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        counts = seed(db, args.users, args.workers, args.years, args.yields_per_month,
+                      args.sales_per_month, args.expenses_per_month, args.seed)
+    print(', '.join(f'{count} {table}' for table, count in counts.items()))
+
+if __name__ == '__main__':
+    main()
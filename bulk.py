@@ -0,0 +1,225 @@
+# bulk.py
+# Streaming CSV/NDJSON import and export for yields, sales, financials and
+# inventory. Imports parse the request body incrementally and write validated
+# rows in chunked transactions (COPY on PostgreSQL, multi-row INSERT
+# elsewhere). Exports page through a server-side cursor, so memory stays flat
+# regardless of table size. Files use the database column names, so an export
+# can be re-imported as is.
+import csv
+import io
+import json
+from datetime import datetime
+
+from db_setup import db, Yield, Sale, Financial, Inventory
+from rollups import queue_rollup_rows
+from stock import STOCK_KINDS, log_opening_movements
+from changes import record_new_rows
+
+IMPORT_CHUNK_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+FORMATS = ('csv', 'ndjson')
+
+def parse_date(value):
+    if hasattr(value, 'year'):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def parse_financial_type(value):
+    if value not in ('Revenue', 'Expense'):
+        raise ValueError(f"type must be 'Revenue' or 'Expense', not '{value}'")
+    return value
+
+# entity -> (model, {column: (parser, required)}), in file column order
+ENTITIES = {
+    'yields': (Yield, {
+        'crop_name': (str, True),
+        'quantity': (int, True),
+        'unit': (str, True),
+        'date_recorded': (parse_date, True)
+    }),
+    'sales': (Sale, {
+        'crop_name': (str, True),
+        'quantity_sold': (int, True),
+        'price': (int, True),
+        'seller_name': (str, True),
+        'date_of_sale': (parse_date, True)
+    }),
+    'financials': (Financial, {
+        'type': (parse_financial_type, True),
+        'description': (str, True),
+        'amount': (int, True),
+        'transaction_date': (parse_date, True),
+        'crop_name': (str, False)
+    }),
+    'inventory': (Inventory, {
+        'item_name': (str, True),
+        'item_type': (str, True),
+        'quantity': (int, True),
+        'unit': (str, True)
+    }),
+}
+
+def read_records(stream, fmt):
+    """
+    Yields one record per row from a binary stream, reading incrementally:
+    a dict for CSV, or the raw line for NDJSON so a bad line can be reported
+    without ending the stream.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        yield from csv.DictReader(text)
+        return
+    for line in text:
+        if line.strip():
+            yield line
+
+def validate(record, spec, user_id):
+    """Converts a raw record into a dict of column values, raising ValueError on bad input."""
+    if not isinstance(record, dict):
+        raise ValueError('Record must be an object')
+    row = {'user_id': user_id}
+    for column, (parser, required) in spec.items():
+        value = record.get(column)
+        if value is None or value == '':
+            if required:
+                raise ValueError(f"Missing field '{column}'")
+            row[column] = None
+            continue
+        try:
+            row[column] = parser(value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid {column}: {e}")
+    return row
+
+def copy_rows(model, rows):
+    """Writes rows with PostgreSQL COPY through the session's connection."""
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if row[c] is None else row[c] for c in columns])
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {model.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+def insert_chunk(model, rows):
+    """
+    Inserts and commits one chunk of validated rows, keeping rollups in step
+    for financials, recording opening stock movements for yields and inventory,
+    and recording the new rows in the change feed.
+    """
+    connection = db.session.connection()
+    stocked = model in STOCK_KINDS.values()
+    user_id = rows[0]['user_id']
+    last_id = db.session.query(db.func.max(model.id)).filter(model.user_id == user_id).scalar() or 0
+    if connection.dialect.driver == 'psycopg2':
+        copy_rows(model, rows)
+    else:
+        db.session.execute(db.insert(model), rows)
+    if model is Financial:
+        queue_rollup_rows(rows)
+    if stocked:
+        log_opening_movements(model, user_id, last_id)
+    record_new_rows(model, user_id, last_id)
+    db.session.commit()
+
+class ImportFailed(Exception):
+    """
+    An import that stopped after committing some chunks. committed_through is
+    the last input row (1-based, after any CSV header) whose chunk was
+    committed; a client resumes from the row after it.
+    """
+
+    def __init__(self, message, imported, committed_through, failed, errors):
+        super().__init__(message)
+        self.message = message
+        self.imported = imported
+        self.committed_through = committed_through
+        self.failed = failed
+        self.errors = errors
+
+def import_records(entity, stream, fmt, user_id):
+    """
+    Imports records for entity from stream. Valid rows are committed every
+    IMPORT_CHUNK_SIZE rows; invalid rows are skipped and reported by line.
+    Raises ImportFailed, after rolling back the current chunk, if a chunk
+    cannot be written or the stream breaks.
+    """
+    model, spec = ENTITIES[entity]
+    imported = 0
+    committed_through = 0
+    failed = 0
+    errors = []
+    chunk = []
+    records = read_records(stream, fmt)
+    index = 0
+    try:
+        while True:
+            index += 1
+            try:
+                record = next(records)
+            except StopIteration:
+                break
+            except csv.Error as e:
+                # The CSV reader cannot resume after a malformed row
+                failed += 1
+                errors.append({'row': index, 'error': str(e)})
+                break
+            try:
+                if isinstance(record, str):
+                    record = json.loads(record)
+                chunk.append(validate(record, spec, user_id))
+            except ValueError as e:
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'row': index, 'error': str(e)})
+                continue
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                insert_chunk(model, chunk)
+                imported += len(chunk)
+                committed_through = index
+                chunk = []
+        if chunk:
+            insert_chunk(model, chunk)
+            imported += len(chunk)
+    except Exception as e:
+        db.session.rollback()
+        raise ImportFailed(str(e), imported, committed_through, failed, errors) from e
+    return {'imported': imported, 'failed': failed, 'errors': errors}
+
+def export_records(entity, fmt, user_id):
+    """Yields an export of the user's rows for entity as CSV or NDJSON text chunks."""
+    model, spec = ENTITIES[entity]
+    names = ['id'] + list(spec)
+    stmt = db.select(*[getattr(model, name) for name in names]) \
+        .where(model.user_id == user_id).order_by(model.id) \
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    result = db.session.execute(stmt)
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        for partition in result.partitions():
+            for row in partition:
+                writer.writerow(['' if value is None else value for value in row])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+        return
+
+    for partition in result.partitions():
+        yield ''.join(
+            json.dumps({name: value.isoformat() if hasattr(value, 'isoformat') else value
+                        for name, value in zip(names, row)}) + '\n'
+            for row in partition
+        )
@@ -0,0 +1,56 @@
+# cache.py
+# A small process-local cache with TTL expiry and LRU eviction. Each worker
+# process has its own copy, so entries are invalidated explicitly by the
+# handlers that change the underlying rows and otherwise expire after ttl.
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire ttl seconds after being set."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_prefix(self, prefix):
+        """Drops every tuple key that starts with the given tuple prefix."""
+        with self._lock:
+            for key in [k for k in self._data if k[:len(prefix)] == prefix]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._data), 'maxsize': self.maxsize, 'ttl': self.ttl,
+                    'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,174 @@
+# changes.py
+# Change tracking for the change feed (/api/changes). Every insert, update or
+# delete of a synced row appends a Change row in the same transaction:
+# ORM writes are captured by an after_flush listener, and writes made with
+# Core statements (conditional UPDATEs, upserts, bulk imports) call
+# record_changes() or record_new_rows() themselves.
+#
+# Feed order is (tx_id, id). On PostgreSQL tx_id is the writing transaction's
+# id and the feed only returns changes from transactions older than every
+# transaction still running, so a change can never become visible behind a
+# cursor that has already passed it. Elsewhere writers are serialized and
+# tx_id is 0.
+import base64
+import json
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event
+
+from db_setup import db, Worker, Attendance, Yield, Sale, Financial, Inventory, Change
+
+# entity name -> model for rows tracked automatically
+TRACKED_MODELS = {
+    'yields': Yield,
+    'sales': Sale,
+    'workers': Worker,
+    'attendance': Attendance,
+    'financials': Financial,
+    'inventory': Inventory,
+}
+ENTITY_NAMES = {model: name for name, model in TRACKED_MODELS.items()}
+
+# Set whenever a transaction that recorded changes commits in this process,
+# waking long-poll and event-stream readers early
+changes_committed = threading.Condition()
+
+def is_postgresql(bind):
+    return bind.dialect.name == 'postgresql'
+
+def insert_changes(connection, rows):
+    """Inserts change rows through connection, stamping the transaction id on PostgreSQL."""
+    stmt = db.insert(Change)
+    if is_postgresql(connection):
+        stmt = stmt.values(tx_id=db.func.txid_current())
+    connection.execute(stmt, rows)
+
+def record_changes(user_id, entity, row_ids, op='upsert'):
+    """Records changes to rows the caller wrote with Core statements. Does not commit."""
+    now = datetime.utcnow()
+    rows = [{'user_id': user_id, 'entity': entity, 'row_id': row_id, 'op': op, 'changed_at': now}
+            for row_id in sorted(set(row_ids))]
+    if rows:
+        insert_changes(db.session.connection(), rows)
+        db.session.info['changes_recorded'] = True
+
+def record_new_rows(model, user_id, after_id):
+    """Records inserts of the user's rows of model with id > after_id, e.g. after a bulk COPY."""
+    select = db.select(model.user_id, db.literal(ENTITY_NAMES[model]), model.id, db.literal('upsert'),
+                       db.literal(datetime.utcnow())) \
+        .where(model.user_id == user_id, model.id > after_id)
+    columns = ['user_id', 'entity', 'row_id', 'op', 'changed_at']
+    if is_postgresql(db.session.get_bind()):
+        select = select.add_columns(db.func.txid_current())
+        columns.append('tx_id')
+    db.session.execute(db.insert(Change).from_select(columns, select))
+    db.session.info['changes_recorded'] = True
+
+def track_flush(session, flush_context):
+    """after_flush listener: records the tracked ORM objects this flush inserted, updated or deleted."""
+    changed = defaultdict(set) # (entity, op) -> objects
+    for op, objects in (('upsert', session.new), ('upsert', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            entity = ENTITY_NAMES.get(type(obj))
+            if entity and (op != 'upsert' or obj in session.new or session.is_modified(obj)):
+                changed[(entity, op)].add(obj)
+    if not changed:
+        return
+
+    connection = session.connection()
+    # Attendance rows belong to a user through their worker
+    worker_ids = {obj.worker_id for (entity, _), objects in changed.items() if entity == 'attendance'
+                  for obj in objects}
+    worker_users = {worker_id: user_id for worker_id, user_id in connection.execute(
+        db.select(Worker.id, Worker.user_id).where(Worker.id.in_(worker_ids)))} if worker_ids else {}
+
+    now = datetime.utcnow()
+    insert_changes(connection, [
+        {'user_id': worker_users.get(obj.worker_id) if entity == 'attendance' else obj.user_id,
+         'entity': entity, 'row_id': obj.id, 'op': op, 'changed_at': now}
+        for (entity, op), objects in changed.items() for obj in objects
+    ])
+    session.info['changes_recorded'] = True
+
+def notify_commit(session):
+    if session.info.pop('changes_recorded', False):
+        with changes_committed:
+            changes_committed.notify_all()
+
+def clear_recorded(session):
+    session.info.pop('changes_recorded', None)
+
+def init_change_tracking():
+    if not event.contains(db.session, 'after_flush', track_flush):
+        event.listen(db.session, 'after_flush', track_flush)
+        event.listen(db.session, 'after_commit', notify_commit)
+        event.listen(db.session, 'after_rollback', clear_recorded)
+
+# Cursors are opaque to clients: the (tx_id, id) position of the last change
+# read plus the age of the changes after it, used to detect cursors whose
+# changes may already have been pruned
+def encode_change_cursor(tx_id, change_id, issued=None):
+    issued = issued.replace(tzinfo=timezone.utc).timestamp() if issued else time.time()
+    payload = json.dumps([tx_id, change_id, int(issued)])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_change_cursor(cursor):
+    """Returns (tx_id, id, issued_at) for a cursor, raising ValueError if malformed."""
+    try:
+        tx_id, change_id, issued = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        issued = datetime.fromtimestamp(int(issued), timezone.utc).replace(tzinfo=None)
+        return int(tx_id), int(change_id), issued
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def visible_changes(user_id):
+    """The user's changes that are safe to hand out, in feed order."""
+    query = Change.query.filter(Change.user_id == user_id)
+    if is_postgresql(db.session.get_bind()):
+        xmin = db.session.execute(db.text('SELECT txid_snapshot_xmin(txid_current_snapshot())')).scalar()
+        query = query.filter(Change.tx_id < xmin)
+    return query
+
+def latest_change_id(user_id):
+    """
+    The id of the user's newest change, or 0. Cheap (one index seek) and
+    increases with every committed write, so it keys cached reads. On
+    PostgreSQL a transaction that commits after a later-numbered one does not
+    raise it; such a write shows up at the user's next write or the cache TTL.
+    """
+    return db.session.query(db.func.max(Change.id)).filter(Change.user_id == user_id).scalar() or 0
+
+def latest_cursor(user_id):
+    """A cursor positioned after every change currently visible to the user."""
+    last = visible_changes(user_id).order_by(Change.tx_id.desc(), Change.id.desc()).first()
+    return encode_change_cursor(last.tx_id, last.id) if last else encode_change_cursor(0, 0)
+
+def read_changes(user_id, since, limit):
+    """
+    Returns (changes, cursor, has_more): up to limit changes after the position
+    (tx_id, id) in feed order, and the cursor to continue from.
+    """
+    tx_id, change_id = since
+    rows = visible_changes(user_id).filter(db.or_(
+        Change.tx_id > tx_id, db.and_(Change.tx_id == tx_id, Change.id > change_id)
+    )).order_by(Change.tx_id, Change.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    if not rows:
+        return [], encode_change_cursor(tx_id, change_id), False
+    rows, following = rows[:limit], rows[limit] if has_more else None
+    # With more to read, the cursor is only as fresh as the next change
+    cursor = encode_change_cursor(rows[-1].tx_id, rows[-1].id, following.changed_at if following else None)
+    return rows, cursor, has_more
+
+def wait_for_commit(timeout):
+    """Blocks until a transaction in this process records changes, or timeout seconds pass."""
+    with changes_committed:
+        changes_committed.wait(timeout)
+
+def prune_changes(days):
+    """Deletes changes older than days. Clients with older cursors get 410 and must resync. Does not commit."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    return Change.query.filter(Change.changed_at < cutoff).delete(synchronize_session=False)
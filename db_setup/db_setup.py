@@ -1,24 +1,30 @@
 # db_setup.py
+# Models and schema maintenance. The db object is not bound to an application
+# here; app.create_app() calls db.init_app(). Create or upgrade the schema with
+# `flask --app app init-db`, or by running this file directly.
 import os
-from flask import Flask
+import sys
+from flask import g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy.schema import CreateColumn
 from datetime import datetime
-import uuid # For generating unique user IDs
-from werkzeug.security import generate_password_hash, check_password_hash
-from dotenv import load_dotenv
 
-# Load environment variables from the .env file
-load_dotenv()
-
-# A separate Flask app instance just for the database setup script
-app = Flask(__name__)
+class RoutingSession(Session):
+    """
+    Session that reads through the optional 'replica' bind while the current
+    request is marked read_replica (see replicas.py). Flushes and explicit
+    INSERT/UPDATE/DELETE statements always go to the primary.
+    """
 
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and has_request_context() and g.get('read_replica')
+                and not getattr(clause, 'is_dml', False) and 'replica' in self._db.engines):
+            return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
 
 # Initialize the database object
-db = SQLAlchemy(app)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # =========================================================================
 # Database Models
@@ -47,6 +53,7 @@ class Worker(db.Model):
     pay_type = db.Column(db.String(20), nullable=False) # 'Daily' or 'Hourly'
     loans = db.Column(db.Integer, default=0, nullable=False)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f"<Worker {self.name}>"
@@ -58,7 +65,10 @@ class Attendance(db.Model):
     attendance_date = db.Column(db.Date, nullable=False)
     status = db.Column(db.String(20), nullable=False) # 'Present', 'Absent'
     hours = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # The unique constraint doubles as the (worker_id, attendance_date) index used
+    # by the worker detail view and payroll date-range scans.
     __table_args__ = (db.UniqueConstraint('worker_id', 'attendance_date', name='_worker_date_uc'),)
 
     def __repr__(self):
@@ -72,6 +82,7 @@ class Yield(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     unit = db.Column(db.String(20), nullable=False)
     date_recorded = db.Column(db.Date, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f"<Yield {self.crop_name}>"
@@ -86,6 +97,7 @@ class Sale(db.Model):
     price = db.Column(db.Integer, nullable=False)
     seller_name = db.Column(db.String(100), nullable=False)
     date_of_sale = db.Column(db.Date, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f"<Sale {self.seller_name}>"
@@ -99,6 +111,11 @@ class Financial(db.Model):
     amount = db.Column(db.Integer, nullable=False)
     transaction_date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     crop_name = db.Column(db.String(100), nullable=True)
+    # Set for entries tied to a worker; category is 'Loan' or 'Payroll'
+    worker_id = db.Column(db.Integer, db.ForeignKey('workers.id'), nullable=True)
+    category = db.Column(db.String(20), nullable=True)
+    payroll_run_id = db.Column(db.Integer, db.ForeignKey('payroll_runs.id'), nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f"<Financial {self.description}>"
@@ -111,28 +128,310 @@ class Inventory(db.Model):
     item_type = db.Column(db.String(50), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     unit = db.Column(db.String(20), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f"<Inventory {self.item_name}>"
 
+class StockMovement(db.Model):
+    """
+    Append-only ledger of stock changes for inventory items and yields. The
+    item's quantity column is the maintained balance and is updated in the
+    same transaction as each movement.
+    """
+    __tablename__ = 'stock_movements'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    item_kind = db.Column(db.String(20), nullable=False) # 'inventory' or 'yield'
+    item_id = db.Column(db.Integer, nullable=False)
+    change = db.Column(db.Integer, nullable=False) # Signed quantity
+    reason = db.Column(db.String(20), nullable=False) # e.g. 'opening', 'consume', 'restock', 'sale'
+    note = db.Column(db.String(200), nullable=True)
+    occurred_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<StockMovement {self.item_kind} {self.item_id} {self.change:+d}>"
+
+class StockSnapshot(db.Model):
+    """An item's balance after every movement up to movement_id, taken by snapshot-stock."""
+    __tablename__ = 'stock_snapshots'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    item_kind = db.Column(db.String(20), nullable=False)
+    item_id = db.Column(db.Integer, nullable=False)
+    balance = db.Column(db.Integer, nullable=False)
+    movement_id = db.Column(db.Integer, nullable=False) # Last ledger id included
+    taken_at = db.Column(db.DateTime, nullable=False) # occurred_at of that movement
+
+    def __repr__(self):
+        return f"<StockSnapshot {self.item_kind} {self.item_id} @{self.movement_id}>"
+
+class PayrollRun(db.Model):
+    """One farm-wide payroll run per user and pay period; guards against paying a period twice."""
+    __tablename__ = 'payroll_runs'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    period_start = db.Column(db.Date, nullable=False)
+    period_end = db.Column(db.Date, nullable=False)
+    worker_count = db.Column(db.Integer, nullable=False, default=0)
+    total_pay = db.Column(db.BigInteger, nullable=False, default=0)
+    total_deductions = db.Column(db.BigInteger, nullable=False, default=0)
+    net_pay = db.Column(db.BigInteger, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'period_start', 'period_end', name='_payroll_period_uc'),)
+
+    def __repr__(self):
+        return f"<PayrollRun {self.user_id} {self.period_start}..{self.period_end}>"
+
+class FinancialRollup(db.Model):
+    """Per-user monthly totals of financial entries, by type and crop."""
+    __tablename__ = 'financial_rollups'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    period_start = db.Column(db.Date, nullable=False) # First day of the month
+    type = db.Column(db.String(20), nullable=False) # 'Revenue' or 'Expense'
+    crop_name = db.Column(db.String(100), nullable=False, default='') # '' when not crop-specific
+    amount = db.Column(db.BigInteger, nullable=False, default=0)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'period_start', 'type', 'crop_name', name='_rollup_period_uc'),)
+
+    def __repr__(self):
+        return f"<FinancialRollup {self.user_id} {self.period_start} {self.type}>"
+
+class FinancialArchiveSummary(db.Model):
+    """Monthly totals of financial entries moved to the cold archive by a season close."""
+    __tablename__ = 'financial_archive_summaries'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    period_start = db.Column(db.Date, nullable=False) # First day of the month
+    type = db.Column(db.String(20), nullable=False)
+    crop_name = db.Column(db.String(100), nullable=False, default='')
+    amount = db.Column(db.BigInteger, nullable=False, default=0)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'period_start', 'type', 'crop_name', name='_financial_archive_period_uc'),)
+
+    def __repr__(self):
+        return f"<FinancialArchiveSummary {self.user_id} {self.period_start} {self.type}>"
+
+class AttendanceSummary(db.Model):
+    """Monthly attendance totals per worker for periods moved to the cold archive."""
+    __tablename__ = 'attendance_summaries'
+    id = db.Column(db.Integer, primary_key=True)
+    worker_id = db.Column(db.Integer, db.ForeignKey('workers.id'), nullable=False)
+    period_start = db.Column(db.Date, nullable=False) # First day of the month
+    days_present = db.Column(db.Integer, nullable=False, default=0)
+    days_absent = db.Column(db.Integer, nullable=False, default=0)
+    hours = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint('worker_id', 'period_start', name='_attendance_summary_period_uc'),)
+
+    def __repr__(self):
+        return f"<AttendanceSummary {self.worker_id} {self.period_start}>"
+
+class SeasonClose(db.Model):
+    """A season close: everything a user recorded before closed_before was archived."""
+    __tablename__ = 'season_closes'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    closed_before = db.Column(db.Date, nullable=False) # First day of the first open month
+    attendance_rows = db.Column(db.Integer, nullable=False, default=0)
+    financial_rows = db.Column(db.Integer, nullable=False, default=0)
+    archive_path = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SeasonClose {self.user_id} before {self.closed_before}>"
+
+class Change(db.Model):
+    """
+    One insert, update or delete of a row a client syncs, read by the change
+    feed. tx_id is the writing transaction's id on PostgreSQL (0 elsewhere), so
+    the feed can order changes by commit safety rather than by id alone.
+    """
+    __tablename__ = 'changes'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    entity = db.Column(db.String(20), nullable=False) # e.g. 'yields', 'attendance'
+    row_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False) # 'upsert', 'delete' or 'close' (season close)
+    tx_id = db.Column(db.BigInteger, nullable=False, default=0)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<Change {self.entity} {self.row_id} {self.op}>"
+
+class OutboxTask(db.Model):
+    """A secondary effect (such as rollup maintenance) queued in the same transaction as its write."""
+    __tablename__ = 'outbox_tasks'
+    id = db.Column(db.Integer, primary_key=True)
+    task_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False) # JSON
+    status = db.Column(db.String(20), nullable=False, default='pending') # 'pending' or 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<OutboxTask {self.id} {self.task_type}>"
+
+# =========================================================================
+# Indexes
+# Every list endpoint filters by user_id and orders by a date or name column,
+# so each table gets a composite index matching that access path. id is the
+# trailing column so ties are resolved from the index as well.
+# =========================================================================
+
+db.Index('ix_workers_user_name', Worker.user_id, Worker.name, Worker.id)
+db.Index('ix_workers_user_active', Worker.user_id, Worker.is_active)
+db.Index('ix_yields_user_date', Yield.user_id, Yield.date_recorded.desc(), Yield.id.desc())
+db.Index('ix_sales_user_date', Sale.user_id, Sale.date_of_sale.desc(), Sale.id.desc())
+db.Index('ix_sales_yield_id', Sale.yield_id)
+db.Index('ix_financials_user_date', Financial.user_id, Financial.transaction_date.desc(), Financial.id.desc())
+# Covering index for the dashboard revenue/expense sums (INCLUDE is PostgreSQL only)
+db.Index('ix_financials_user_type', Financial.user_id, Financial.type, postgresql_include=['amount'])
+# Worker ledger (loans and payroll) for the worker detail view
+db.Index('ix_financials_worker_date', Financial.worker_id, Financial.transaction_date)
+db.Index('ix_inventory_user_name', Inventory.user_id, Inventory.item_name, Inventory.id)
+db.Index('ix_outbox_tasks_status_available', OutboxTask.status, OutboxTask.available_at, OutboxTask.id)
+db.Index('ix_season_closes_user', SeasonClose.user_id, SeasonClose.closed_before)
+# Item history and point-in-time replay
+db.Index('ix_stock_movements_item', StockMovement.item_kind, StockMovement.item_id, StockMovement.id)
+db.Index('ix_stock_movements_user_id', StockMovement.user_id, StockMovement.id)
+db.Index('ix_stock_snapshots_user_taken', StockSnapshot.user_id, StockSnapshot.taken_at)
+# Change feed reads and retention pruning
+db.Index('ix_changes_user_tx', Change.user_id, Change.tx_id, Change.id)
+db.Index('ix_changes_changed_at', Change.changed_at)
+# Newest change per user, which versions the read cache
+db.Index('ix_changes_user_id', Change.user_id, Change.id)
+
+def upsert_insert(model):
+    """
+    Returns an INSERT construct for model that supports on_conflict_do_update,
+    or None when the bound database has no native upsert.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(model)
+
 # =========================================================================
 # Main application entry point for setup
 # =========================================================================
 
+def add_missing_columns():
+    """
+    Adds nullable model columns that are missing from existing tables.
+    db.create_all() never alters a table, so columns added to a model after
+    its table was created are migrated here. Safe to run repeatedly.
+    """
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns and column.nullable:
+                    column_spec = CreateColumn(column).compile(dialect=db.engine.dialect)
+                    conn.execute(db.text(f"ALTER TABLE {table.name} ADD COLUMN {column_spec}"))
+
+def backfill_worker_ledger():
+    """
+    Links loan and payroll entries written before Financial.worker_id existed
+    to their worker, using the descriptions add_loan and calculate_payroll write.
+    """
+    for worker in Worker.query.all():
+        unlinked = Financial.query.filter_by(user_id=worker.user_id, worker_id=None)
+        unlinked.filter(db.or_(
+            Financial.description == f"Loan to {worker.name}",
+            Financial.description.like(f"Loan to {worker.name} - %")
+        )).update({'worker_id': worker.id, 'category': 'Loan'}, synchronize_session=False)
+        unlinked.filter_by(description=f"Worker salary - {worker.name}") \
+            .update({'worker_id': worker.id, 'category': 'Payroll'}, synchronize_session=False)
+    db.session.commit()
+
+def backfill_stock_ledger():
+    """
+    Records an 'opening' movement for every inventory item and yield that has
+    none yet, so the ledger accounts for stock recorded before it existed.
+    """
+    now = datetime.utcnow()
+    for kind, model in (('inventory', Inventory), ('yield', Yield)):
+        has_movement = db.select(StockMovement.id).where(
+            StockMovement.item_kind == kind, StockMovement.item_id == model.id).exists()
+        db.session.execute(db.insert(StockMovement).from_select(
+            ['user_id', 'item_kind', 'item_id', 'change', 'reason', 'occurred_at'],
+            db.select(model.user_id, db.literal(kind), model.id, model.quantity,
+                      db.literal('opening'), db.literal(now)).where(~has_movement)
+        ))
+    db.session.commit()
+
+def backfill_financial_rollups():
+    """
+    Builds the dashboard rollups when financial_rollups is empty but financials
+    are not, e.g. for a database created before the rollup table existed.
+    """
+    if db.session.query(FinancialRollup.id).first() or not db.session.query(Financial.id).first():
+        return
+    from rollups import rebuild_rollups # imported here: rollups imports this module
+    rebuild_rollups()
+    db.session.commit()
+
+def create_missing_indexes():
+    """
+    Creates any model index that is missing from an existing database.
+    db.create_all() skips tables that already exist, so databases created
+    before an index was declared are migrated here. Safe to run repeatedly.
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
 def setup_database():
     """
-    Creates all database tables defined in the SQLAlchemy models.
-    """
-    with app.app_context():
-        try:
-            print("Attempting to create all database tables...")
-            db.create_all()
-            print("Database tables created successfully! 🎉")
-        except Exception as e:
-            print(f"Error creating database tables: {e}")
-            print("Please ensure your PostgreSQL user has the necessary privileges.")
-            print("You can grant permissions with the following SQL command:")
-            print("GRANT ALL PRIVILEGES ON SCHEMA public TO farmappapi;")
-            
+    Creates all database tables defined in the SQLAlchemy models, then applies
+    the column, index and backfill migrations. Needs an application context.
+    """
+    try:
+        print("Attempting to create all database tables...")
+        # The primary only: a read replica gets its schema through replication
+        # (and an app without a replica has no engine for that bind)
+        db.create_all(bind_key=None)
+        add_missing_columns()
+        create_missing_indexes()
+        backfill_worker_ledger()
+        backfill_stock_ledger()
+        backfill_financial_rollups()
+        print("Database tables created successfully! 🎉")
+    except Exception as e:
+        print(f"Error creating database tables: {e}")
+        print("Please ensure your PostgreSQL user has the necessary privileges.")
+        print("You can grant permissions with the following SQL command:")
+        print("GRANT ALL PRIVILEGES ON SCHEMA public TO farmappapi;")
+        raise SystemExit(1)
+
 if __name__ == "__main__":
-    setup_database()
+    # Standalone use: a minimal application just to provide the database configuration
+    from flask import Flask
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    # The rollup backfill imports modules from the repository root, which
+    # import this file as db_setup
+    sys.modules.setdefault('db_setup', sys.modules[__name__])
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    setup_app = Flask(__name__)
+    setup_app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
+    setup_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(setup_app)
+    with setup_app.app_context():
+        setup_database()
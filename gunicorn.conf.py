@@ -0,0 +1,21 @@
+# gunicorn.conf.py
+# Production server settings. Start from the repository root with:
+#   gunicorn -c gunicorn.conf.py 'app:create_app()'
+# Each worker process holds its own SQLAlchemy pool, so the database sees up
+# to WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+import multiprocessing
+import os
+
+# app.py imports the models as a top-level module
+pythonpath = 'db_setup'
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 200))
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
@@ -0,0 +1,195 @@
+# instrumentation.py
+# Opt-in request instrumentation, enabled with METRICS_ENABLED=true.
+# For every request it records the route latency, the number of SQL
+# statements and the time spent in the database (via SQLAlchemy engine
+# events), flags likely N+1 patterns (the same statement run many times in
+# one request), and exposes everything in Prometheus text format on /metrics.
+# A fraction of requests can be profiled with cProfile (PROFILE_SAMPLE_RATE),
+# and when PROFILE_TOKEN is set a request sending "X-Profile: <token>" is
+# profiled on demand. One request per process is profiled at a time, and only
+# the newest PROFILE_KEEP (50) dumps are kept in PROFILE_DIR. Metrics are per
+# worker process.
+import cProfile
+import hmac
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', 10))
+
+class Histogram:
+    """Cumulative-bucket histogram in the shape Prometheus expects."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+class RequestMetrics:
+    """Per-route request metrics for this process."""
+
+    def __init__(self):
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.sql_count = defaultdict(lambda: Histogram(SQL_COUNT_BUCKETS))
+        self.db_seconds = defaultdict(float)
+        self.n_plus_one = defaultdict(int)
+        self.responses = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, route, method, status, elapsed, statements, db_seconds, repeated):
+        key = (route, method)
+        with self._lock:
+            self.latency[key].observe(elapsed)
+            self.sql_count[key].observe(statements)
+            self.db_seconds[key] += db_seconds
+            self.responses[(route, method, status)] += 1
+            if repeated:
+                self.n_plus_one[key] += 1
+
+    def render(self, gauges):
+        """Renders all metrics in Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            histograms = (
+                ('farmsync_request_duration_seconds', 'Request latency by route.', self.latency),
+                ('farmsync_request_sql_statements', 'SQL statements issued per request by route.', self.sql_count),
+            )
+            for name, help_text, series in histograms:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (route, method), histogram in sorted(series.items()):
+                    labels = f'route="{route}",method="{method}"'
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.total}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+            lines += ['# HELP farmsync_request_db_seconds_total Time spent executing SQL by route.',
+                      '# TYPE farmsync_request_db_seconds_total counter']
+            for (route, method), seconds in sorted(self.db_seconds.items()):
+                lines.append(f'farmsync_request_db_seconds_total{{route="{route}",method="{method}"}} {seconds}')
+
+            lines += ['# HELP farmsync_n_plus_one_requests_total Requests that repeated one SQL statement '
+                      f'at least {N_PLUS_ONE_THRESHOLD} times.',
+                      '# TYPE farmsync_n_plus_one_requests_total counter']
+            for (route, method), count in sorted(self.n_plus_one.items()):
+                lines.append(f'farmsync_n_plus_one_requests_total{{route="{route}",method="{method}"}} {count}')
+
+            lines += ['# HELP farmsync_responses_total Responses by route and status code.',
+                      '# TYPE farmsync_responses_total counter']
+            for (route, method, status), count in sorted(self.responses.items()):
+                lines.append(f'farmsync_responses_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+
+        for name, (help_text, value) in sorted(gauges.items()):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+request_metrics = RequestMetrics()
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_statements' in g:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_statements' in g:
+        started = conn.info['query_started'].pop()
+        g.db_seconds += time.perf_counter() - started
+        g.sql_statements[statement] += 1
+
+def prune_profiles(profile_dir, keep):
+    """Deletes all but the newest keep profile dumps."""
+    paths = [os.path.join(profile_dir, name) for name in os.listdir(profile_dir) if name.endswith('.prof')]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def init_instrumentation(app, gauges=None):
+    """
+    Installs the request hooks, SQL event listeners and /metrics route on app.
+    gauges is an optional callable returning {name: (help, value)} for extra
+    gauges to publish, such as cache and pool statistics.
+    """
+    profile_dir = os.getenv('PROFILE_DIR', 'profiles')
+    sample_rate = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+    profile_token = os.getenv('PROFILE_TOKEN', '')
+    profile_keep = int(os.getenv('PROFILE_KEEP', 50))
+    profiling = threading.Lock()
+
+    def wants_profile():
+        if profile_token and hmac.compare_digest(request.headers.get('X-Profile', ''), profile_token):
+            return True
+        return bool(sample_rate) and random.random() < sample_rate
+
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.sql_statements = defaultdict(int)
+        g.db_seconds = 0.0
+        g.profiler = None
+        if wants_profile() and profiling.acquire(blocking=False):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def record_request(response):
+        if 'request_started' not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        statements = sum(g.sql_statements.values())
+        repeated = any(count >= N_PLUS_ONE_THRESHOLD for count in g.sql_statements.values())
+        request_metrics.record(route, request.method, response.status_code, elapsed,
+                               statements, g.db_seconds, repeated)
+        response.headers['Server-Timing'] = f'db;dur={g.db_seconds * 1000:.2f}, total;dur={elapsed * 1000:.2f}'
+        response.headers['X-SQL-Count'] = str(statements)
+
+        if g.profiler:
+            profiler, g.profiler = g.profiler, None
+            profiler.disable()
+            try:
+                os.makedirs(profile_dir, exist_ok=True)
+                safe_route = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+                path = os.path.join(profile_dir, f'{safe_route}-{request.method}-{int(time.time() * 1000)}.prof')
+                profiler.dump_stats(path)
+                prune_profiles(profile_dir, profile_keep)
+                response.headers['X-Profile-File'] = path
+            finally:
+                profiling.release()
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        # A request that failed before after_request still frees the profiler
+        if g.get('profiler'):
+            g.profiler.disable()
+            g.profiler = None
+            profiling.release()
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(request_metrics.render(gauges() if gauges else {}),
+                        mimetype='text/plain; version=0.0.4')
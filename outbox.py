@@ -0,0 +1,146 @@
+# outbox.py
+# Optional write-behind queue for secondary effects of a write, enabled with
+# OUTBOX_ENABLED=true. Handlers call outbox.submit(task_type, payload) before
+# they commit: the task is stored as an outbox_tasks row in the same
+# transaction, so it is never lost even if the process crashes, and a
+# background thread applies it after the commit. When the outbox is disabled,
+# or its backlog exceeds OUTBOX_MAX_BACKLOG (backpressure), the task runs
+# inline in the caller's transaction instead.
+#
+# The only task type is 'rollup' (rollups.py). Read cache invalidation is not
+# queued: cached reads are keyed on the user's latest change feed id, and the
+# rollup handler records a change when it applies, so every process's cached
+# reports go stale as soon as the queued rollup lands.
+#
+# Failed tasks are retried with exponential backoff up to OUTBOX_MAX_ATTEMPTS
+# and then kept with status 'failed'. On shutdown the worker drains every
+# ready task before the process exits, and tasks left by a crashed process
+# are picked up by the next poll.
+import atexit
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from db_setup import db, OutboxTask
+
+HANDLERS = {}
+
+def task_handler(task_type):
+    """Registers a function taking a JSON-compatible payload as the handler for task_type."""
+    def register(func):
+        HANDLERS[task_type] = func
+        return func
+    return register
+
+def json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+class Outbox:
+    """Transactional outbox plus the background thread that drains it."""
+
+    def __init__(self):
+        self.enabled = False
+        self.backlog = 0
+        self.processed = 0
+        self.failed = 0
+        self.app = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = os.getenv('OUTBOX_ENABLED', 'false').lower() in ('1', 'true', 'yes', 'on')
+        self.max_backlog = int(os.getenv('OUTBOX_MAX_BACKLOG', 10000))
+        self.batch_size = int(os.getenv('OUTBOX_BATCH_SIZE', 100))
+        self.max_attempts = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 5))
+        self.poll_seconds = float(os.getenv('OUTBOX_POLL_SECONDS', 5))
+        self.drain_seconds = float(os.getenv('OUTBOX_DRAIN_SECONDS', 30))
+        if not self.enabled or self._thread is not None:
+            return
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+        self._thread = threading.Thread(target=self._run, name='outbox-worker', daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def submit(self, task_type, payload):
+        """Queues task_type for after the current transaction commits, or runs it now."""
+        if not self.enabled or self.backlog >= self.max_backlog:
+            HANDLERS[task_type](payload)
+            return
+        db.session.add(OutboxTask(task_type=task_type, payload=json.dumps(payload, default=json_default)))
+        db.session.info['outbox_submitted'] = db.session.info.get('outbox_submitted', 0) + 1
+
+    def _after_commit(self, session):
+        submitted = session.info.pop('outbox_submitted', 0)
+        if submitted:
+            self.backlog += submitted
+            self._wake.set()
+
+    def _after_rollback(self, session):
+        session.info.pop('outbox_submitted', None)
+
+    def process_batch(self):
+        """Applies one batch of ready tasks; returns False when none were ready."""
+        now = datetime.utcnow()
+        tasks = OutboxTask.query.filter(
+            OutboxTask.status == 'pending', OutboxTask.available_at <= now
+        ).order_by(OutboxTask.id).limit(self.batch_size).with_for_update(skip_locked=True).all()
+        if not tasks:
+            db.session.commit()
+            self.backlog = 0
+            return False
+        for task in tasks:
+            try:
+                with db.session.begin_nested():
+                    HANDLERS[task.task_type](json.loads(task.payload))
+                db.session.delete(task)
+                self.processed += 1
+            except Exception as e:
+                task.attempts += 1
+                task.last_error = str(e)[:1000]
+                if task.attempts >= self.max_attempts:
+                    task.status = 'failed'
+                    self.failed += 1
+                else:
+                    task.available_at = now + timedelta(seconds=2 ** task.attempts)
+        db.session.commit()
+        self.backlog = max(0, self.backlog - len(tasks))
+        return True
+
+    def drain(self):
+        """Processes ready tasks until none are left. Requires an app context."""
+        while self.process_batch():
+            pass
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.drain()
+                    db.session.remove()
+            except Exception as e:
+                self.app.logger.exception(f'Outbox worker error: {e}')
+            if self._stop.is_set():
+                return
+
+    def shutdown(self):
+        """Stops the worker after it drains the ready tasks, waiting up to drain_seconds."""
+        if self._thread and self._thread.is_alive():
+            self._stop.set()
+            self._wake.set()
+            self._thread.join(self.drain_seconds)
+
+    def stats(self):
+        return {'enabled': self.enabled, 'backlog': self.backlog,
+                'processed': self.processed, 'failed': self.failed}
+
+outbox = Outbox()
@@ -0,0 +1,111 @@
+# partitions.py
+# Optional yearly range partitioning of the attendance and financials tables
+# (PostgreSQL only). Queries that filter on the partition date (the worker
+# detail window, payroll periods, ?from=/?to= and cursors on list endpoints)
+# only touch the partitions covering that range.
+#
+# convert_table() rebuilds an existing table as a partitioned one in a single
+# transaction, holding an exclusive lock while rows are copied, so run it in a
+# maintenance window. ensure_partitions() adds upcoming years and is safe to
+# run repeatedly (e.g. from cron).
+from datetime import date
+
+from sqlalchemy import ForeignKeyConstraint, UniqueConstraint, text
+from sqlalchemy.schema import AddConstraint
+
+from db_setup import db, Attendance, Financial
+
+# table -> (model, partition column)
+PARTITIONED_TABLES = {
+    'attendance': (Attendance, 'attendance_date'),
+    'financials': (Financial, 'transaction_date'),
+}
+
+def partition_name(table, year):
+    return f'{table}_y{year}'
+
+def is_partitioned(conn, table):
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"
+    ), {'table': table}).scalar()
+
+def add_year_partition(conn, table, column, year):
+    """Creates the partition for one year, moving matching rows out of the default partition."""
+    name = partition_name(table, year)
+    if conn.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar():
+        return False
+    start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    default = f'{table}_default'
+    # A new range cannot be attached while the default partition holds rows in it
+    conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ('{start}') TO ('{end}')"
+    ))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {default} WHERE {column} >= :start AND {column} < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), {'start': start, 'end': end})
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+    return True
+
+def ensure_partitions(conn, table, through_year):
+    """Makes sure yearly partitions exist up to through_year. Returns the partitions created."""
+    _, column = PARTITIONED_TABLES[table]
+    first_year = conn.execute(text(f"SELECT EXTRACT(YEAR FROM MIN({column}))::int FROM {table}")).scalar()
+    created = []
+    for year in range(min(first_year or through_year, through_year), through_year + 1):
+        if add_year_partition(conn, table, column, year):
+            created.append(partition_name(table, year))
+    return created
+
+def convert_table(conn, table, through_year):
+    """
+    Replaces a plain table with a partitioned copy holding the same rows, ids,
+    sequence, constraints and indexes. The primary key becomes (id, date)
+    because PostgreSQL requires the partition key in every unique constraint.
+    """
+    model, column = PARTITIONED_TABLES[table]
+    old = f'{table}_unpartitioned'
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': old}).scalar()
+    conn.execute(text(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE ({column})"))
+    conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+    years = conn.execute(text(
+        f"SELECT EXTRACT(YEAR FROM MIN({column}))::int, EXTRACT(YEAR FROM MAX({column}))::int FROM {old}"
+    )).one()
+    for year in range(years[0] or through_year, max(years[1] or through_year, through_year) + 1):
+        conn.execute(text(
+            f"CREATE TABLE {partition_name(table, year)} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{date(year, 1, 1)}') TO ('{date(year + 1, 1, 1)}')"
+        ))
+    conn.execute(text(f"INSERT INTO {table} SELECT * FROM {old}"))
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id"))
+    conn.execute(text(f"DROP TABLE {old}"))
+
+    conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, {column})"))
+    for constraint in model.__table__.constraints:
+        if isinstance(constraint, ForeignKeyConstraint) or (
+                isinstance(constraint, UniqueConstraint) and column in constraint.columns):
+            conn.execute(AddConstraint(constraint))
+    for index in model.__table__.indexes:
+        index.create(bind=conn)
+
+def partition_tables(years_ahead=1):
+    """
+    Partitions attendance and financials by year, or adds the upcoming yearly
+    partitions if they are partitioned already. Returns a list of actions taken,
+    or None when the database is not PostgreSQL.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return None
+    through_year = date.today().year + years_ahead
+    actions = []
+    with db.engine.begin() as conn:
+        for table in PARTITIONED_TABLES:
+            if is_partitioned(conn, table):
+                actions.extend(f"created {name}" for name in ensure_partitions(conn, table, through_year))
+            else:
+                convert_table(conn, table, through_year)
+                actions.append(f"partitioned {table} by year through {through_year}")
+    return actions
@@ -0,0 +1,132 @@
+# passwords.py
+# Password hashing off the request thread, plus per-email login throttling.
+#
+# Hashes are computed in a bounded process pool so a burst of logins cannot
+# pin every request thread on CPU. Settings:
+#   PASSWORD_HASH_METHOD   werkzeug method string, e.g. 'scrypt:32768:8:1' or
+#                          'pbkdf2:sha256:600000' (default: werkzeug's default)
+#   PASSWORD_HASH_WORKERS  pool processes per server worker (default min(4, CPUs);
+#                          0 hashes inline). Under gunicorn the host runs up to
+#                          WEB_CONCURRENCY x PASSWORD_HASH_WORKERS hashing processes.
+#   PASSWORD_HASH_PENDING  maximum hashes queued or running at once (default 4 x workers)
+#   PASSWORD_HASH_WAIT     seconds to wait for a slot before giving up (default 5)
+# Stored hashes made with other parameters are upgraded on the next login.
+#
+# LoginThrottle locks an email out after repeated failures, before any hash
+# is computed:
+#   LOGIN_MAX_FAILURES (5) failures within LOGIN_FAILURE_WINDOW (900 seconds)
+#   lock the email for LOGIN_LOCKOUT_SECONDS (900).
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+def pool_context():
+    """
+    Start method for hashing processes. Forking a multi-threaded server worker
+    can copy locks held by other threads, so processes come from a fork
+    server, or are spawned where there is none (Windows).
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool is saturated for longer than PASSWORD_HASH_WAIT."""
+
+class PasswordHasher:
+    """Runs werkzeug password hashing in a lazily created, bounded process pool."""
+
+    def __init__(self):
+        self.method = os.getenv('PASSWORD_HASH_METHOD') or None
+        self.workers = int(os.getenv('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+        self.wait_seconds = float(os.getenv('PASSWORD_HASH_WAIT', 5))
+        self._slots = threading.BoundedSemaphore(int(os.getenv('PASSWORD_HASH_PENDING', max(1, self.workers) * 4)))
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._dummy_hash = None
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            raise HashingBusy('Too many sign-ins in progress, please retry shortly')
+        try:
+            with self._pool_lock:
+                # Created on first use so each server worker process owns its pool
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context())
+            return self._pool.submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        if self.method:
+            return self._run(generate_password_hash, password, self.method)
+        return self._run(generate_password_hash, password)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def dummy_hash(self):
+        """A hash of a random password, made with the current method."""
+        if self._dummy_hash is None:
+            self._dummy_hash = self.hash(secrets.token_hex(16))
+        return self._dummy_hash
+
+    def verify_unknown(self, password):
+        """Costs the same as verify(), for emails with no account, so timing does not reveal them."""
+        self.verify(self.dummy_hash(), password)
+        return False
+
+    def current_method(self):
+        """The full method prefix (with parameters) that new hashes are written with."""
+        return self.dummy_hash().split('$', 1)[0]
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.current_method()
+
+class LoginThrottle:
+    """In-memory per-email failure counter with lockout, bounded by LRU eviction."""
+
+    def __init__(self, max_entries=100000):
+        self.max_failures = int(os.getenv('LOGIN_MAX_FAILURES', 5))
+        self.window = float(os.getenv('LOGIN_FAILURE_WINDOW', 900))
+        self.lockout = float(os.getenv('LOGIN_LOCKOUT_SECONDS', 900))
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # email -> [failures, window_started, locked_until]
+        self._lock = threading.Lock()
+
+    def retry_after(self, email):
+        """Seconds until email may try again, or 0 if it is not locked out."""
+        with self._lock:
+            entry = self._entries.get(email)
+            if not entry:
+                return 0
+            return max(0, entry[2] - time.monotonic())
+
+    def failure(self, email):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None or now - entry[1] > self.window:
+                entry = [0, now, 0]
+            entry[0] += 1
+            if entry[0] >= self.max_failures:
+                entry = [0, now, now + self.lockout]
+            self._entries[email] = entry
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def success(self, email):
+        with self._lock:
+            self._entries.pop(email, None)
+
+password_hasher = PasswordHasher()
+login_throttle = LoginThrottle()
@@ -0,0 +1,80 @@
+# pooling.py
+# SQLAlchemy connection pool settings read from the environment, plus a
+# QueuePool that records checkout counts and how long requests waited for a
+# connection. Settings:
+#   DB_POOL_SIZE (10), DB_MAX_OVERFLOW (20), DB_POOL_TIMEOUT (30 seconds),
+#   DB_POOL_RECYCLE (1800 seconds), DB_POOL_PRE_PING (true)
+import os
+import threading
+import time
+
+from sqlalchemy.pool import QueuePool
+
+class PoolStats:
+    """Counters shared by every TimedQueuePool in the process."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, waited, timed_out=False):
+        with self._lock:
+            self.checkouts += 0 if timed_out else 1
+            self.timeouts += 1 if timed_out else 0
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'waitSecondsTotal': round(self.wait_seconds_total, 6),
+                'waitSecondsMax': round(self.wait_seconds_max, 6)
+            }
+
+pool_stats = PoolStats()
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited in pool_stats."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            pool_stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_stats.record(time.perf_counter() - started)
+        return connection
+
+def env_flag(name, default):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes', 'on')
+
+def engine_options(database_url):
+    """Returns SQLALCHEMY_ENGINE_OPTIONS for the given database URL."""
+    options = {
+        'pool_pre_ping': env_flag('DB_POOL_PRE_PING', 'true'),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800))
+    }
+    # SQLite keeps SQLAlchemy's default pool; sizing only applies to server databases
+    if database_url and not database_url.startswith('sqlite'):
+        options.update(
+            poolclass=TimedQueuePool,
+            pool_size=int(os.getenv('DB_POOL_SIZE', 10)),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 20)),
+            pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', 30))
+        )
+    return options
+
+def pool_status(engine):
+    """Current pool occupancy together with the process-wide checkout counters."""
+    pool = engine.pool
+    status = {'pool': pool.__class__.__name__, **pool_stats.snapshot()}
+    if isinstance(pool, QueuePool):
+        status.update(size=pool.size(), checkedOut=pool.checkedout(), overflow=pool.overflow(),
+                      checkedIn=pool.checkedin())
+    return status
@@ -0,0 +1,116 @@
+# replicas.py
+# Optional read-replica routing. When REPLICA_DATABASE_URL is set, GET and HEAD
+# requests read through the 'replica' bind (see RoutingSession in db_setup),
+# except:
+#   - for REPLICA_STICKY_SECONDS (5) after the same client's successful write,
+#     so a client always reads its own writes. The deadline travels with the
+#     client rather than living in one worker: write responses carry it in
+#     X-Read-Primary-Until and a cookie, and the client sends either back;
+#   - while the replica is more than REPLICA_MAX_LAG (2) seconds behind the
+#     primary, or unreachable. Lag is probed at most every
+#     REPLICA_LAG_CHECK_SECONDS (1) per process.
+# Responses carry X-Read-Source: replica|primary.
+import os
+import threading
+import time
+
+from flask import g, request
+from sqlalchemy import text
+
+READ_METHODS = ('GET', 'HEAD')
+STICKY_HEADER = 'X-Read-Primary-Until'
+STICKY_COOKIE = 'read_primary_until'
+
+# Replication lag on a PostgreSQL standby; 0 when it has replayed everything it
+# received, or when the server is not a standby at all
+POSTGRES_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+def bind_config(database_url, options):
+    """SQLALCHEMY_BINDS entry for the replica, or {} when none is configured."""
+    if not database_url:
+        return {}
+    return {'replica': {'url': database_url, **options}}
+
+class ReplicaRouter:
+    """Decides per request whether reads may be served by the replica."""
+
+    def __init__(self):
+        self.db = None
+        self.enabled = False
+        self.max_lag = 2.0
+        self.check_interval = 1.0
+        self.sticky_seconds = 5.0
+        self._lag = 0.0
+        self._lag_checked = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db):
+        self.db = db
+        self.enabled = 'replica' in app.config.get('SQLALCHEMY_BINDS', {})
+        if not self.enabled:
+            return
+        self.max_lag = float(os.getenv('REPLICA_MAX_LAG', 2))
+        self.check_interval = float(os.getenv('REPLICA_LAG_CHECK_SECONDS', 1))
+        self.sticky_seconds = float(os.getenv('REPLICA_STICKY_SECONDS', 5))
+        app.before_request(self.route_request)
+        app.after_request(self.record_write)
+
+    def sticky_until(self):
+        """The primary-read deadline the client sent back, or 0."""
+        value = request.headers.get(STICKY_HEADER) or request.cookies.get(STICKY_COOKIE)
+        # A client can only keep its own reads on the primary, so the value
+        # needs no signature
+        try:
+            return float(value or 0)
+        except ValueError:
+            return 0.0
+
+    def route_request(self):
+        g.read_replica = (request.method in READ_METHODS
+                          and self.sticky_until() <= time.time()
+                          and self.lag() <= self.max_lag)
+
+    def record_write(self, response):
+        if request.method not in READ_METHODS and response.status_code < 400:
+            until = f'{time.time() + self.sticky_seconds:.3f}'
+            response.headers[STICKY_HEADER] = until
+            response.set_cookie(STICKY_COOKIE, until, max_age=int(self.sticky_seconds) + 1,
+                                httponly=True, samesite='Lax')
+        response.headers['X-Read-Source'] = 'replica' if g.get('read_replica') else 'primary'
+        return response
+
+    def probe_lag(self):
+        engine = self.db.engines['replica']
+        if engine.dialect.name != 'postgresql':
+            return 0.0
+        with engine.connect() as connection:
+            return float(connection.execute(POSTGRES_LAG_SQL).scalar() or 0)
+
+    def lag(self):
+        """Replica lag in seconds, refreshed at most every check_interval; inf if unreachable."""
+        now = time.monotonic()
+        if now - self._lag_checked < self.check_interval:
+            return self._lag
+        with self._lock:
+            if now - self._lag_checked >= self.check_interval:
+                try:
+                    self._lag = self.probe_lag()
+                except Exception:
+                    self._lag = float('inf')
+                self._lag_checked = time.monotonic()
+        return self._lag
+
+    def status(self):
+        if not self.enabled:
+            return {'enabled': False}
+        lag = self.lag()
+        return {'enabled': True, 'lagSeconds': None if lag == float('inf') else lag, 'maxLagSeconds': self.max_lag,
+                'stickySeconds': self.sticky_seconds}
+
+replica_router = ReplicaRouter()
@@ -0,0 +1,152 @@
+# rollups.py
+# Maintains the monthly financial_rollups table that backs the dashboard.
+# Every handler that writes a Financial row calls rollup_entries() before it
+# commits. The rollup is updated in the same transaction as the entry, or,
+# with the outbox enabled, queued in that transaction and applied right after.
+from collections import defaultdict
+from datetime import date
+
+from db_setup import db, Financial, FinancialRollup, FinancialArchiveSummary, upsert_insert
+from changes import record_changes
+from outbox import outbox, task_handler
+
+def rollup_key(user_id, entry_type, transaction_date, crop_name):
+    """Returns the (user_id, period_start, type, crop_name) key an entry rolls up into."""
+    return (user_id, transaction_date.replace(day=1), entry_type, crop_name or '')
+
+def upsert_rollup(key, amount, entry_count):
+    """Atomically adds amount and entry_count to the rollup row for key, creating it if needed."""
+    user_id, period_start, entry_type, crop_name = key
+    values = dict(user_id=user_id, period_start=period_start, type=entry_type,
+                  crop_name=crop_name, amount=amount, entry_count=entry_count)
+    stmt = upsert_insert(FinancialRollup)
+    if stmt is None:
+        rollup = FinancialRollup.query.filter_by(
+            user_id=user_id, period_start=period_start, type=entry_type, crop_name=crop_name
+        ).with_for_update().first()
+        if rollup:
+            rollup.amount += amount
+            rollup.entry_count += entry_count
+        else:
+            db.session.add(FinancialRollup(**values))
+        return
+
+    stmt = stmt.values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'period_start', 'type', 'crop_name'],
+        set_={
+            'amount': FinancialRollup.amount + stmt.excluded.amount,
+            'entry_count': FinancialRollup.entry_count + stmt.excluded.entry_count
+        }
+    )
+    db.session.execute(stmt)
+
+def rollup_rows(rows):
+    """
+    Adds new financial rows (dicts of Financial column values) to the rollup
+    table. Rows sharing a rollup row are combined first, so a batch costs one
+    upsert per rollup row touched.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for row in rows:
+        total = totals[rollup_key(row['user_id'], row['type'], row['transaction_date'], row.get('crop_name'))]
+        total[0] += row['amount']
+        total[1] += 1
+    for key, (amount, entry_count) in totals.items():
+        upsert_rollup(key, amount, entry_count)
+
+@task_handler('rollup')
+def apply_rollup_task(rows):
+    """Outbox handler: rows arrive as JSON, with dates as ISO strings."""
+    for row in rows:
+        if isinstance(row['transaction_date'], str):
+            row['transaction_date'] = date.fromisoformat(row['transaction_date'])
+    rollup_rows(rows)
+    # Applied after the entries' own changes were recorded, so record one more:
+    # it moves the read version that keys cached reports, and tells clients
+    # to refresh the dashboard totals
+    for user_id in {row['user_id'] for row in rows}:
+        record_changes(user_id, 'rollups', [0], op='refresh')
+
+def queue_rollup_rows(rows):
+    """Maintains the rollups for new financial rows, through the outbox when it is enabled."""
+    outbox.submit('rollup', [{
+        'user_id': row['user_id'],
+        'type': row['type'],
+        'transaction_date': row['transaction_date'],
+        'crop_name': row.get('crop_name'),
+        'amount': row['amount']
+    } for row in rows])
+
+def rollup_entries(entries):
+    """Adds new Financial entries to the rollup table."""
+    queue_rollup_rows([{
+        'user_id': entry.user_id,
+        'type': entry.type,
+        'transaction_date': entry.transaction_date,
+        'crop_name': entry.crop_name,
+        'amount': entry.amount
+    } for entry in entries])
+
+def raw_totals(user_id=None):
+    """
+    Computes monthly totals straight from the financials table, plus the
+    totals of rows moved to the archive by a season close. Grouping by day in
+    SQL keeps this dialect independent; days are folded into months here.
+    """
+    query = db.session.query(
+        Financial.user_id, Financial.type, Financial.transaction_date, Financial.crop_name,
+        db.func.sum(Financial.amount), db.func.count(Financial.id)
+    ).group_by(Financial.user_id, Financial.type, Financial.transaction_date, Financial.crop_name)
+    if user_id is not None:
+        query = query.filter(Financial.user_id == user_id)
+
+    totals = defaultdict(lambda: [0, 0])
+    for row_user_id, entry_type, transaction_date, crop_name, amount, entry_count in query:
+        total = totals[rollup_key(row_user_id, entry_type, transaction_date, crop_name)]
+        total[0] += amount or 0
+        total[1] += entry_count
+
+    archived = FinancialArchiveSummary.query
+    if user_id is not None:
+        archived = archived.filter_by(user_id=user_id)
+    for summary in archived:
+        total = totals[(summary.user_id, summary.period_start, summary.type, summary.crop_name)]
+        total[0] += summary.amount
+        total[1] += summary.entry_count
+    return totals
+
+def rebuild_rollups(user_id=None):
+    """Recomputes the rollup table from raw financials, for one user or everyone. Does not commit."""
+    query = FinancialRollup.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    query.delete(synchronize_session=False)
+
+    totals = raw_totals(user_id)
+    db.session.add_all([
+        FinancialRollup(user_id=key[0], period_start=key[1], type=key[2], crop_name=key[3],
+                        amount=amount, entry_count=entry_count)
+        for key, (amount, entry_count) in totals.items()
+    ])
+    return len(totals)
+
+def check_rollups(user_id=None):
+    """Compares the rollup table to raw sums and returns a list of mismatch descriptions."""
+    expected = raw_totals(user_id)
+    query = FinancialRollup.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    actual = {
+        (r.user_id, r.period_start, r.type, r.crop_name): [r.amount, r.entry_count]
+        for r in query
+    }
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual), key=str):
+        want = expected.get(key, [0, 0])
+        got = actual.get(key, [0, 0])
+        if want != got:
+            mismatches.append(f"{key}: expected amount={want[0]} count={want[1]}, "
+                              f"found amount={got[0]} count={got[1]}")
+    return mismatches
@@ -0,0 +1,182 @@
+# stock.py
+# Stock movement ledger for inventory items and yields. Each item's quantity
+# column is its current balance, so current stock is read directly. Every
+# change appends a StockMovement row in the same transaction as a
+# conditional UPDATE of that balance, which keeps the balance non-negative
+# under concurrent writers without rewriting history.
+#
+# Point-in-time stock is answered from the latest stock_snapshots run at or
+# before the requested time plus a replay of the movements after it, so the
+# work is bounded by the snapshot interval rather than the ledger's length.
+# Take snapshots periodically with `flask --app app snapshot-stock`.
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from db_setup import db, Inventory, Yield, StockMovement, StockSnapshot
+from changes import ENTITY_NAMES, record_changes
+
+STOCK_KINDS = {'inventory': Inventory, 'yield': Yield}
+MOVEMENT_REASONS = ('opening', 'harvest', 'restock', 'consume', 'sale', 'spoilage', 'adjust')
+# Movements newer than this are left for the next snapshot, so transactions
+# still in flight when a snapshot is taken are not skipped
+SNAPSHOT_SETTLE_SECONDS = 60
+
+class StockRejected(Exception):
+    """A movement that cannot be applied; status is the HTTP status to return."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def log_movement(user_id, kind, item_id, change, reason, note=None):
+    """Appends a ledger row for a balance change the caller has already made."""
+    db.session.add(StockMovement(user_id=user_id, item_kind=kind, item_id=item_id,
+                                 change=change, reason=reason, note=note))
+
+def apply_movement(user_id, kind, item_id, change, reason, note=None):
+    """
+    Atomically adds change to one of the user's items and records it in the
+    ledger. Returns the new balance; raises StockRejected if the item does not
+    exist or the balance would go negative. Does not commit.
+    """
+    model = STOCK_KINDS[kind]
+    stmt = db.update(model).where(
+        model.id == item_id, model.user_id == user_id, model.quantity + change >= 0
+    ).values(quantity=model.quantity + change)
+    if db.session.get_bind().dialect.update_returning:
+        balance = db.session.execute(stmt.returning(model.quantity)).scalar()
+    else:
+        balance = None
+        if db.session.execute(stmt).rowcount == 1:
+            balance = db.session.query(model.quantity).filter_by(id=item_id).scalar()
+    if balance is None:
+        available = db.session.query(model.quantity).filter_by(id=item_id, user_id=user_id).scalar()
+        if available is None:
+            raise StockRejected(f'Unknown {kind} item {item_id}', 404)
+        raise StockRejected(f'Insufficient stock for {kind} item {item_id}: {available} available, '
+                            f'{-change} requested', 409)
+    log_movement(user_id, kind, item_id, change, reason, note)
+    record_changes(user_id, ENTITY_NAMES[model], [item_id])
+    return balance
+
+def apply_movements(user_id, movements):
+    """
+    Applies many movements (dicts of kind, item_id, change, reason, note) in
+    the current transaction. Movements are grouped per item and each item's
+    balance is updated once with its net change, in a fixed item order so
+    concurrent batches cannot deadlock. An item whose net change is rejected
+    keeps none of its movements. Returns {(kind, item_id): balance or StockRejected}.
+    Does not commit.
+    """
+    by_item = defaultdict(list)
+    for movement in movements:
+        by_item[(movement['kind'], movement['item_id'])].append(movement)
+
+    results = {}
+    ledger = []
+    for kind, item_id in sorted(by_item):
+        items = by_item[(kind, item_id)]
+        model = STOCK_KINDS[kind]
+        net = sum(m['change'] for m in items)
+        stmt = db.update(model).where(
+            model.id == item_id, model.user_id == user_id, model.quantity + net >= 0
+        ).values(quantity=model.quantity + net)
+        if db.session.execute(stmt).rowcount != 1:
+            available = db.session.query(model.quantity).filter_by(id=item_id, user_id=user_id).scalar()
+            results[(kind, item_id)] = StockRejected(
+                f'Unknown {kind} item {item_id}' if available is None
+                else f'Insufficient stock: {available} available, net change {net}')
+            continue
+        results[(kind, item_id)] = None
+        ledger.extend({'user_id': user_id, 'item_kind': kind, 'item_id': item_id, 'change': m['change'],
+                       'reason': m['reason'], 'note': m.get('note'), 'occurred_at': datetime.utcnow()}
+                      for m in items)
+    if ledger:
+        db.session.execute(db.insert(StockMovement), ledger)
+
+    accepted = [key for key, result in results.items() if result is None]
+    for kind in {kind for kind, _ in accepted}:
+        model = STOCK_KINDS[kind]
+        ids = [item_id for k, item_id in accepted if k == kind]
+        record_changes(user_id, ENTITY_NAMES[model], ids)
+        results.update({(kind, item_id): quantity for item_id, quantity in
+                        db.session.query(model.id, model.quantity).filter(model.id.in_(ids))})
+    return results
+
+def log_opening_movements(model, user_id, after_id):
+    """Records 'opening' movements for the user's items of model with id > after_id that have none."""
+    kind = next(k for k, m in STOCK_KINDS.items() if m is model)
+    has_movement = db.select(StockMovement.id).where(
+        StockMovement.item_kind == kind, StockMovement.item_id == model.id).exists()
+    db.session.execute(db.insert(StockMovement).from_select(
+        ['user_id', 'item_kind', 'item_id', 'change', 'reason', 'occurred_at'],
+        db.select(model.user_id, db.literal(kind), model.id, model.quantity,
+                  db.literal('opening'), db.literal(datetime.utcnow()))
+        .where(model.user_id == user_id, model.id > after_id, ~has_movement)
+    ))
+
+def take_snapshots(settle_seconds=SNAPSHOT_SETTLE_SECONDS):
+    """
+    Records every item's balance as of the newest settled movement, derived
+    from the previous snapshot run plus the movements since. Returns the
+    number of snapshot rows written. Does not commit.
+    """
+    cutoff = db.session.query(StockMovement.id, StockMovement.occurred_at).filter(
+        StockMovement.occurred_at <= datetime.utcnow() - timedelta(seconds=settle_seconds)
+    ).order_by(StockMovement.id.desc()).first()
+    previous = db.session.query(db.func.max(StockSnapshot.movement_id)).scalar() or 0
+    if cutoff is None or cutoff.id <= previous:
+        return 0
+
+    balances = {
+        (s.user_id, s.item_kind, s.item_id): s.balance
+        for s in StockSnapshot.query.filter_by(movement_id=previous)
+    }
+    deltas = db.session.query(
+        StockMovement.user_id, StockMovement.item_kind, StockMovement.item_id, db.func.sum(StockMovement.change)
+    ).filter(StockMovement.id > previous, StockMovement.id <= cutoff.id) \
+     .group_by(StockMovement.user_id, StockMovement.item_kind, StockMovement.item_id)
+    for user_id, kind, item_id, change in deltas:
+        key = (user_id, kind, item_id)
+        balances[key] = balances.get(key, 0) + change
+
+    db.session.execute(db.insert(StockSnapshot), [
+        {'user_id': user_id, 'item_kind': kind, 'item_id': item_id, 'balance': balance,
+         'movement_id': cutoff.id, 'taken_at': cutoff.occurred_at}
+        for (user_id, kind, item_id), balance in balances.items()
+    ])
+    return len(balances)
+
+def stock_at(user_id, at):
+    """Returns {(kind, item_id): balance} for the user's items as of the datetime at."""
+    run = db.session.query(db.func.max(StockSnapshot.movement_id)).filter(
+        StockSnapshot.user_id == user_id, StockSnapshot.taken_at <= at).scalar() or 0
+    balances = {
+        (kind, item_id): balance for kind, item_id, balance in db.session.query(
+            StockSnapshot.item_kind, StockSnapshot.item_id, StockSnapshot.balance
+        ).filter_by(user_id=user_id, movement_id=run)
+    }
+    replay = db.session.query(
+        StockMovement.item_kind, StockMovement.item_id, db.func.sum(StockMovement.change)
+    ).filter(StockMovement.user_id == user_id, StockMovement.id > run, StockMovement.occurred_at <= at) \
+     .group_by(StockMovement.item_kind, StockMovement.item_id)
+    for kind, item_id, change in replay:
+        balances[(kind, item_id)] = balances.get((kind, item_id), 0) + change
+    return balances
+
+def check_stock(user_id=None):
+    """Compares each item's balance column with the sum of its ledger and returns mismatch descriptions."""
+    mismatches = []
+    for kind, model in STOCK_KINDS.items():
+        ledger = db.session.query(StockMovement.item_id, db.func.sum(StockMovement.change)) \
+            .filter(StockMovement.item_kind == kind).group_by(StockMovement.item_id)
+        items = db.session.query(model.id, model.quantity)
+        if user_id is not None:
+            ledger = ledger.filter(StockMovement.user_id == user_id)
+            items = items.filter(model.user_id == user_id)
+        totals = dict(ledger.all())
+        for item_id, quantity in items:
+            if totals.get(item_id, 0) != quantity:
+                mismatches.append(f"{kind} {item_id}: balance {quantity}, ledger total {totals.get(item_id, 0)}")
+    return mismatches
@@ -0,0 +1,42 @@
+# conftest.py
+# Shared fixtures. app.py imports the models as the top-level module db_setup,
+# so the repository root and db_setup/ go on sys.path as under gunicorn.
+# Each test gets an application bound to its own SQLite database, or to
+# TEST_DATABASE_URL when set (e.g. a scratch PostgreSQL database).
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'db_setup'), os.path.join(ROOT, 'benchmarks')]
+
+from app import create_app, read_cache, user_cache
+from db_setup import db
+
+def make_app(database_url, **config):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'TESTING': True, **config})
+    with app.app_context():
+        db.create_all(bind_key=None)
+    user_cache.clear()
+    read_cache.clear()
+    return app
+
+def drop_all(app):
+    with app.app_context():
+        db.session.remove()
+        db.drop_all(bind_key=None)
+
+@pytest.fixture
+def database_url(tmp_path):
+    return os.getenv('TEST_DATABASE_URL') or f"sqlite:///{tmp_path / 'test.db'}"
+
+@pytest.fixture
+def app(database_url):
+    app = make_app(database_url)
+    yield app
+    drop_all(app)
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,18 @@
+# test_attendance.py
+
+def test_repeated_worker_dates_count_once(app, client):
+    client.post('/api/workers', json={'name': 'Asha', 'role': 'Picker', 'payRate': 500, 'payType': 'Daily'})
+    worker_id = client.get('/api/workers').json[0]['id']
+    response = client.post('/api/attendance/bulk', json=[
+        {'workerId': worker_id, 'date': '2024-03-01', 'status': 'Present', 'hours': 8},
+        {'workerId': worker_id, 'date': '2024-03-01', 'status': 'Absent', 'hours': 0},
+        {'workerId': worker_id, 'date': '2024-03-02', 'status': 'Present', 'hours': 6},
+    ])
+    assert response.status_code == 200
+    body = response.json
+    assert (body['applied'], body['superseded'], body['failed']) == (2, 1, 0)
+    assert body['results'][0] == {'row': 0, 'status': 'superseded', 'supersededBy': 1,
+                                  'workerId': worker_id, 'date': '2024-03-01'}
+
+    attendance = client.get(f'/api/workers/{worker_id}?from=2024-03-01&to=2024-03-31').json['attendance']
+    assert attendance == {'2024-03-01': {'status': 'Absent', 'hours': 0}, '2024-03-02': {'status': 'Present', 'hours': 6}}
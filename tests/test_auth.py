@@ -0,0 +1,23 @@
+# test_auth.py
+from app import DEMO_USER_ID
+
+def login(client, email='grower@example.com'):
+    client.post('/api/auth/register', json={'email': email, 'password': 'pw', 'name': 'Grower'})
+    return client.post('/api/auth/login', json={'email': email, 'password': 'pw'}).json
+
+def test_anonymous_requests_are_the_demo_user(client):
+    assert client.get('/api/auth/user-id').json['userId'] == DEMO_USER_ID
+    assert client.get('/api/bootstrap').json['sections']['user']['userId'] == DEMO_USER_ID
+
+def test_token_requests_report_their_own_user(client):
+    session = login(client)
+    headers = {'Authorization': f"Bearer {session['token']}"}
+    assert session['userId'] != DEMO_USER_ID
+    assert client.get('/api/auth/user-id', headers=headers).json['userId'] == session['userId']
+    assert client.get('/api/bootstrap', headers=headers).json['sections']['user']['userId'] == session['userId']
+
+def test_invalid_token_is_rejected_except_on_public_endpoints(client):
+    headers = {'Authorization': 'Bearer 1.1.forged'}
+    assert client.get('/api/yields', headers=headers).status_code == 401
+    assert client.get('/api/auth/user-id', headers=headers).json['userId'] == DEMO_USER_ID
+    assert client.post('/api/auth/login', headers=headers, json={'email': 'x@y.z', 'password': 'pw'}).status_code == 401
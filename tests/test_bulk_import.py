@@ -0,0 +1,30 @@
+# test_bulk_import.py
+import bulk
+
+CSV = 'type,description,amount,transaction_date\n' + ''.join(
+    f'Expense,Item {i},{i * 10},2024-01-{i:02d}\n' for i in range(1, 6))
+
+def test_import_commits_in_chunks(app, client, monkeypatch):
+    monkeypatch.setattr(bulk, 'IMPORT_CHUNK_SIZE', 2)
+    response = client.post('/api/import/financials', data=CSV, content_type='text/csv')
+    assert response.status_code == 201
+    assert response.json['imported'] == 5
+
+def test_failed_chunk_reports_what_was_committed(app, client, monkeypatch):
+    monkeypatch.setattr(bulk, 'IMPORT_CHUNK_SIZE', 2)
+    insert_chunk = bulk.insert_chunk
+    calls = []
+
+    def failing_second_chunk(model, rows):
+        calls.append(rows)
+        if len(calls) == 2:
+            raise RuntimeError('disk full')
+        insert_chunk(model, rows)
+
+    monkeypatch.setattr(bulk, 'insert_chunk', failing_second_chunk)
+    response = client.post('/api/import/financials', data=CSV, content_type='text/csv')
+    assert response.status_code == 400
+    assert response.json['error'] == 'disk full'
+    assert response.json['imported'] == 2
+    assert response.json['committedThroughRow'] == 2
+    assert [f['description'] for f in client.get('/api/financials').json] == ['Item 2', 'Item 1']
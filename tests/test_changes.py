@@ -0,0 +1,36 @@
+# test_changes.py
+import threading
+import time
+
+import pytest
+
+import app as app_module
+
+@pytest.fixture
+def cursor(client):
+    return client.get('/api/changes').json['cursor']
+
+@pytest.fixture
+def one_waiter(monkeypatch):
+    waiters = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(app_module, 'change_waiters', waiters)
+    return waiters
+
+def test_long_poll_past_the_cap_answers_at_once(client, cursor, one_waiter):
+    one_waiter.acquire()
+    started = time.monotonic()
+    response = client.get(f'/api/changes?since={cursor}&wait=10')
+    assert response.status_code == 200 and response.json['changes'] == []
+    assert time.monotonic() - started < 2
+
+def test_streams_past_the_cap_are_refused(client, cursor, one_waiter):
+    stream = client.get(f'/api/changes?since={cursor}', headers={'Accept': 'text/event-stream'}, buffered=False)
+    assert stream.status_code == 200
+    assert next(stream.response).startswith(b'retry:')
+
+    refused = client.get(f'/api/changes?since={cursor}', headers={'Accept': 'text/event-stream'})
+    assert refused.status_code == 503 and refused.headers['Retry-After']
+
+    # Closing the stream frees its slot
+    stream.close()
+    assert one_waiter.acquire(blocking=False)
@@ -0,0 +1,34 @@
+# test_instrumentation.py
+import pytest
+
+from conftest import drop_all, make_app
+
+@pytest.fixture
+def metrics_app(database_url, tmp_path, monkeypatch):
+    monkeypatch.setenv('METRICS_ENABLED', 'true')
+    monkeypatch.setenv('PROFILE_DIR', str(tmp_path / 'profiles'))
+    monkeypatch.setenv('PROFILE_KEEP', '2')
+    def build(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        app = make_app(database_url)
+        apps.append(app)
+        return app
+    apps = []
+    yield build
+    for app in apps:
+        drop_all(app)
+
+def test_on_demand_profiling_is_off_without_a_token(metrics_app, tmp_path):
+    client = metrics_app().test_client()
+    response = client.get('/api/dashboard', headers={'X-Profile': '1'})
+    assert response.status_code == 200
+    assert 'X-Profile-File' not in response.headers
+    assert not (tmp_path / 'profiles').exists()
+
+def test_on_demand_profiling_requires_the_token(metrics_app, tmp_path):
+    client = metrics_app(PROFILE_TOKEN='s3cret').test_client()
+    assert 'X-Profile-File' not in client.get('/api/dashboard', headers={'X-Profile': '1'}).headers
+    for _ in range(3):
+        assert 'X-Profile-File' in client.get('/api/dashboard', headers={'X-Profile': 's3cret'}).headers
+    assert len(list((tmp_path / 'profiles').glob('*.prof'))) == 2
@@ -0,0 +1,79 @@
+# test_outbox.py
+from datetime import datetime, timedelta
+
+import pytest
+
+import outbox as outbox_module
+from db_setup import db, OutboxTask
+from outbox import Outbox
+
+@pytest.fixture
+def applied(monkeypatch):
+    """Registers a 'record' task type that collects its payloads, and a 'fail' type that always raises."""
+    payloads = []
+
+    def fail(payload):
+        raise RuntimeError('handler failed')
+
+    monkeypatch.setitem(outbox_module.HANDLERS, 'record', payloads.append)
+    monkeypatch.setitem(outbox_module.HANDLERS, 'fail', fail)
+    return payloads
+
+@pytest.fixture
+def box(app, monkeypatch):
+    """An enabled outbox without its background thread; tests drive it directly."""
+    monkeypatch.setenv('OUTBOX_MAX_ATTEMPTS', '2')
+    box = Outbox()
+    box.init_app(app)
+    box.enabled = True
+    return box
+
+def submit(app, box, *tasks):
+    with app.app_context():
+        for task_type, payload in tasks:
+            box.submit(task_type, payload)
+        db.session.commit()
+
+def test_failed_tasks_back_off_then_stop(app, box, applied):
+    submit(app, box, ('fail', {}))
+    with app.app_context():
+        started = datetime.utcnow()
+        box.drain()
+        task = OutboxTask.query.one()
+        assert (task.status, task.attempts, task.last_error) == ('pending', 1, 'handler failed')
+        assert task.available_at >= started + timedelta(seconds=2)
+
+        # Not ready again until the backoff passes
+        assert not box.process_batch()
+        task.available_at = datetime.utcnow()
+        db.session.commit()
+        box.drain()
+        task = OutboxTask.query.one()
+        assert (task.status, task.attempts) == ('failed', 2)
+        assert box.stats()['failed'] == 1
+
+def test_drain_applies_every_ready_task(app, box, applied):
+    submit(app, box, *[('record', {'n': n}) for n in range(3)])
+    with app.app_context():
+        box.drain()
+        assert OutboxTask.query.count() == 0
+    assert applied == [{'n': 0}, {'n': 1}, {'n': 2}]
+
+def test_shutdown_drains_ready_tasks(app, applied, monkeypatch):
+    monkeypatch.setenv('OUTBOX_ENABLED', 'true')
+    monkeypatch.setenv('OUTBOX_POLL_SECONDS', '60')
+    box = Outbox()
+    box.init_app(app)
+    with app.app_context():
+        db.session.add_all([OutboxTask(task_type='record', payload='{"n": %d}' % n) for n in range(3)])
+        db.session.commit()
+    box.shutdown()
+    assert not box._thread.is_alive()
+    assert applied == [{'n': 0}, {'n': 1}, {'n': 2}]
+
+def test_tasks_run_inline_when_the_backlog_is_full(app, box, applied):
+    box.backlog = box.max_backlog
+    submit(app, box, ('record', {'n': 1}))
+    assert applied == [{'n': 1}]
+    with app.app_context():
+        assert OutboxTask.query.count() == 0
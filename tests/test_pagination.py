@@ -0,0 +1,54 @@
+# test_pagination.py
+from datetime import date, timedelta
+
+from app import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, get_user_id
+from db_setup import db, Worker, Yield
+
+def add_yields(app, count):
+    with app.test_request_context():
+        user_id = get_user_id()
+        db.session.execute(db.insert(Yield), [
+            {'user_id': user_id, 'crop_name': f'Crop {i}', 'quantity': i, 'unit': 'kg',
+             'date_recorded': date(2024, 1, 1) + timedelta(days=i % 90)}
+            for i in range(count)
+        ])
+        db.session.commit()
+
+def test_lists_are_paged_without_limit(app, client):
+    add_yields(app, DEFAULT_PAGE_SIZE + 50)
+    first = client.get('/api/yields')
+    assert len(first.json) == DEFAULT_PAGE_SIZE
+    cursor = first.headers['X-Next-Cursor']
+
+    rest = client.get(f'/api/yields?cursor={cursor}')
+    assert len(rest.json) == 50
+    assert 'X-Next-Cursor' not in rest.headers
+    assert not {row['id'] for row in first.json} & {row['id'] for row in rest.json}
+
+def test_limit_is_capped(app, client):
+    add_yields(app, MAX_PAGE_SIZE + 1)
+    assert len(client.get(f'/api/yields?limit={MAX_PAGE_SIZE * 2}').json) == MAX_PAGE_SIZE
+
+def test_bootstrap_returns_first_page_and_cursor(app, client):
+    add_yields(app, DEFAULT_PAGE_SIZE + 1)
+    body = client.get('/api/bootstrap').json
+    assert len(body['sections']['yields']) == DEFAULT_PAGE_SIZE
+    assert set(body['nextCursors']) == {'yields'}
+
+def test_bootstrap_cursors_reach_every_row(app, client):
+    """The frontend follows nextCursors, so names late in the alphabet still load."""
+    with app.test_request_context():
+        user_id = get_user_id()
+        db.session.execute(db.insert(Worker), [
+            {'user_id': user_id, 'name': f'Worker {i:03}', 'role': 'Picker', 'pay_rate': 500, 'pay_type': 'Daily'}
+            for i in range(DEFAULT_PAGE_SIZE + 20)
+        ])
+        db.session.commit()
+    body = client.get('/api/bootstrap').json
+    names = [w['name'] for w in body['sections']['workers']]
+    cursor = body['nextCursors']['workers']
+    while cursor:
+        page = client.get(f'/api/workers?limit={MAX_PAGE_SIZE}&cursor={cursor}')
+        names += [w['name'] for w in page.json]
+        cursor = page.headers.get('X-Next-Cursor')
+    assert names == sorted(f'Worker {i:03}' for i in range(DEFAULT_PAGE_SIZE + 20))
@@ -0,0 +1,25 @@
+# test_passwords.py
+import multiprocessing
+
+from passwords import PasswordHasher, password_hasher, pool_context
+
+def test_pool_hashes_and_verifies(monkeypatch):
+    monkeypatch.setenv('PASSWORD_HASH_WORKERS', '1')
+    monkeypatch.setenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    hasher = PasswordHasher()
+    password_hash = hasher.hash('secret')
+    assert hasher.verify(password_hash, 'secret')
+    assert not hasher.verify(password_hash, 'wrong')
+    assert not hasher.needs_rehash(password_hash)
+    hasher._pool.shutdown()
+
+def test_pool_spawns_where_there_is_no_fork_server(monkeypatch):
+    monkeypatch.setattr(multiprocessing, 'get_all_start_methods', lambda: ['spawn'])
+    assert pool_context().get_start_method() == 'spawn'
+
+def test_unknown_emails_cost_a_hash(client, monkeypatch):
+    verified = []
+    monkeypatch.setattr(password_hasher, 'verify', lambda password_hash, password: verified.append(password_hash))
+    response = client.post('/api/auth/login', json={'email': 'nobody@example.com', 'password': 'secret'})
+    assert response.status_code == 401
+    assert verified == [password_hasher.dummy_hash()]
@@ -0,0 +1,45 @@
+# test_payroll.py
+from datetime import date, timedelta
+
+import pytest
+
+def add_worker(client, name='Asha'):
+    client.post('/api/workers', json={'name': name, 'role': 'Picker', 'payRate': 500, 'payType': 'Daily'})
+    return next(w['id'] for w in client.get('/api/workers').json if w['name'] == name)
+
+@pytest.fixture
+def worker_id(client):
+    worker_id = add_worker(client)
+    for day in ('2024-10-01', '2024-10-02', '2024-10-08'):
+        client.post(f'/api/workers/{worker_id}/attendance', json={'date': day, 'status': 'Present', 'hours': 8})
+    return worker_id
+
+def test_repeated_run_returns_the_original(client, worker_id):
+    first = client.post('/api/payroll/runs', json={'from': '2024-10-01', 'to': '2024-10-07'})
+    assert first.status_code == 201 and first.json['totalPay'] == 1000
+    again = client.post('/api/payroll/runs', json={'from': '2024-10-01', 'to': '2024-10-07'})
+    assert again.status_code == 200 and again.json['alreadyProcessed']
+    assert again.json['runId'] == first.json['runId']
+
+def test_overlapping_run_is_refused(client, worker_id):
+    assert client.post('/api/payroll/runs', json={'from': '2024-10-01', 'to': '2024-10-07'}).status_code == 201
+    overlapping = client.post('/api/payroll/runs', json={'from': '2024-10-01', 'to': '2024-10-08'})
+    assert overlapping.status_code == 409
+    assert client.post('/api/payroll/runs', json={'from': '2024-10-08', 'to': '2024-10-14'}).status_code == 201
+
+def test_worker_payroll_and_runs_do_not_pay_the_same_days(client):
+    worker_id = add_worker(client)
+    today = date.today()
+    client.post(f'/api/workers/{worker_id}/attendance', json={'date': today.isoformat(), 'status': 'Present', 'hours': 8})
+    assert client.post(f'/api/workers/{worker_id}/payroll', json={}).status_code == 200
+    # The same worker again, and a farm-wide run covering those days
+    assert client.post(f'/api/workers/{worker_id}/payroll', json={}).status_code == 409
+    week = {'from': (today - timedelta(days=3)).isoformat(), 'to': today.isoformat()}
+    assert client.post('/api/payroll/runs', json=week).status_code == 409
+
+def test_worker_payroll_after_a_run_is_refused(client):
+    worker_id = add_worker(client)
+    today = date.today()
+    run = {'from': (today - timedelta(days=2)).isoformat(), 'to': today.isoformat()}
+    assert client.post('/api/payroll/runs', json=run).status_code == 201
+    assert client.post(f'/api/workers/{worker_id}/payroll', json={}).status_code == 409
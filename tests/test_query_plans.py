@@ -0,0 +1,85 @@
+# test_query_plans.py
+# Query-plan regression test: seeds a synthetic farm, records the SELECTs each
+# read endpoint issues (lists, dashboard, analytics, worker details, stock and
+# the change feed), and fails if any of them
+# reads a table with a full scan instead of an index (SQLite "SCAN <table>"
+# without an index, PostgreSQL "Seq Scan").
+import re
+from datetime import date
+
+import pytest
+from sqlalchemy import event, text
+
+from changes import encode_change_cursor
+from db_setup import db, Worker
+from stock import take_snapshots
+from synthetic import seed
+
+ENDPOINTS = [
+    '/api/yields', '/api/yields?limit=20', '/api/sales', '/api/sales?from=2024-08-01&to=2024-09-30',
+    '/api/workers', '/api/financials', '/api/financials?limit=20', '/api/inventory', '/api/dashboard',
+    '/api/analytics', '/api/stock', '/api/stock?at=2024-09-30', '/api/stock/movements',
+    '/api/stock/movements?kind=yield', f'/api/changes?since={encode_change_cursor(0, 0)}',
+]
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+@pytest.fixture
+def seeded(app):
+    with app.app_context():
+        seed(db, users=2, workers=10, years=0.5, end_date=date(2024, 12, 31))
+        take_snapshots(settle_seconds=0)
+        db.session.commit()
+        worker_id = db.session.query(Worker.id).order_by(Worker.id).first()[0]
+    return app, worker_id
+
+def capture_selects(app, paths):
+    """Requests each path and returns the (path, statement, parameters) of every SELECT it ran."""
+    client = app.test_client()
+    captured = []
+    with app.app_context():
+        engine = db.engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((current[0], statement, parameters))
+
+    current = [None]
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        for path in paths:
+            current[0] = path
+            response = client.get(path)
+            assert response.status_code == 200, (path, response.get_data(as_text=True))
+            # Follow one cursor so keyset continuation queries are checked too
+            next_cursor = response.headers.get('X-Next-Cursor')
+            if next_cursor:
+                separator = '&' if '?' in path else '?'
+                assert client.get(f"{path}{separator}cursor={next_cursor}").status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return captured
+
+def full_scans(connection, statement, parameters):
+    """Tables the statement's plan reads with a full scan."""
+    if connection.dialect.name == 'postgresql':
+        plan = connection.exec_driver_sql('EXPLAIN ' + statement, parameters).scalars().all()
+        return [line.strip() for line in plan if 'Seq Scan' in line]
+    plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    tables = set(db.metadata.tables)
+    return [row[-1] for row in plan
+            if (match := SQLITE_FULL_SCAN.match(row[-1])) and match.group(1) in tables]
+
+def test_endpoint_queries_use_indexes(seeded):
+    app, worker_id = seeded
+    captured = capture_selects(app, ENDPOINTS + [f'/api/workers/{worker_id}'])
+    assert captured
+
+    failures = []
+    with app.app_context():
+        connection = db.session.connection()
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text('ANALYZE'))
+        for path, statement, parameters in captured:
+            for scan in full_scans(connection, statement, parameters):
+                failures.append(f"{path}: {scan}\n    {' '.join(statement.split())}")
+    assert not failures, 'Full table scans:\n' + '\n'.join(failures)
@@ -0,0 +1,33 @@
+# test_read_cache.py
+from app import read_cache
+
+def test_write_from_another_process_invalidates_cached_lists(app, client):
+    client.post('/api/workers', json={'name': 'Asha', 'role': 'Picker', 'payRate': 500, 'payType': 'Daily'})
+    assert [w['name'] for w in client.get('/api/workers').json] == ['Asha']
+
+    # A second worker process handles this write, so this process's cache is not invalidated
+    original_clear = read_cache.invalidate_prefix
+    read_cache.invalidate_prefix = lambda prefix: None
+    try:
+        client.post('/api/workers', json={'name': 'Bala', 'role': 'Picker', 'payRate': 500, 'payType': 'Daily'})
+    finally:
+        read_cache.invalidate_prefix = original_clear
+    assert [w['name'] for w in client.get('/api/workers').json] == ['Asha', 'Bala']
+
+def test_unchanged_lists_are_served_from_cache(app, client):
+    client.post('/api/workers', json={'name': 'Asha', 'role': 'Picker', 'payRate': 500, 'payType': 'Daily'})
+    client.get('/api/workers')
+    hits = read_cache.stats()['hits']
+    client.get('/api/workers')
+    assert read_cache.stats()['hits'] == hits + 1
+
+def test_analytics_see_rollups_applied_by_the_outbox(app, client, monkeypatch):
+    from outbox import outbox
+    monkeypatch.setattr(outbox, 'enabled', True)
+    client.post('/api/yields', json={'name': 'Maize', 'quantity': 10, 'unit': 'kg'})
+    client.post('/api/financials/revenue', json={'description': 'Maize', 'amount': 100, 'cropName': 'Maize'})
+    # Cached after the commit, before the queued rollup runs
+    assert client.get('/api/analytics').json['crops'][0]['revenue'] == 0
+    with app.app_context():
+        outbox.drain()
+    assert client.get('/api/analytics').json['crops'][0]['revenue'] == 100
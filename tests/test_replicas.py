@@ -0,0 +1,49 @@
+# test_replicas.py
+import shutil
+
+import pytest
+
+from conftest import drop_all, make_app
+
+@pytest.fixture
+def replica_app(tmp_path):
+    """An app whose replica is a copy of the primary taken before the demo user existed."""
+    primary = tmp_path / 'primary.db'
+    replica = tmp_path / 'replica.db'
+    make_app(f'sqlite:///{primary}')
+    shutil.copy(primary, replica)
+    app = make_app(f'sqlite:///{primary}', SQLALCHEMY_BINDS={'replica': {'url': f'sqlite:///{replica}'}})
+    yield app
+    drop_all(app)
+
+def test_demo_user_is_created_on_the_primary(replica_app):
+    client = replica_app.test_client()
+    response = client.get('/api/yields')
+    assert response.status_code == 200
+    assert response.headers['X-Read-Source'] == 'primary'
+
+    response = client.get('/api/yields')
+    assert response.status_code == 200
+    assert response.headers['X-Read-Source'] == 'replica'
+
+def test_reads_after_a_write_stay_on_the_primary(replica_app):
+    writer = replica_app.test_client()
+    response = writer.post('/api/yields', json={'name': 'Maize', 'quantity': 10, 'unit': 'kg'})
+    assert response.status_code == 201
+    until = response.headers['X-Read-Primary-Until']
+
+    # The cookie keeps the writing client on the primary...
+    assert writer.get('/api/yields').headers['X-Read-Source'] == 'primary'
+    # ...and so does echoing the header, from any client
+    other = replica_app.test_client()
+    assert other.get('/api/yields', headers={'X-Read-Primary-Until': until}).headers['X-Read-Source'] == 'primary'
+    assert other.get('/api/yields').headers['X-Read-Source'] == 'replica'
+
+    expired = f'{float(until) - 3600:.3f}'
+    assert other.get('/api/yields', headers={'X-Read-Primary-Until': expired}).headers['X-Read-Source'] == 'replica'
+
+def test_init_db_after_a_replica_app(replica_app, app):
+    """Flask-SQLAlchemy keeps the 'replica' metadata for later apps, which have no such engine."""
+    from db_setup import setup_database
+    with app.app_context():
+        setup_database()
@@ -0,0 +1,44 @@
+# test_rollups.py
+from datetime import date
+
+from db_setup import db, Financial, FinancialRollup, User, setup_database
+from rollups import check_rollups
+
+def test_financial_writes_keep_rollups_in_step(app, client):
+    client.post('/api/yields', json={'name': 'Maize', 'quantity': 100, 'unit': 'kg'})
+    crop_id = client.get('/api/yields').json[0]['id']
+    client.post('/api/workers', json={'name': 'Asha', 'role': 'Picker', 'payRate': 500, 'payType': 'Daily'})
+    worker_id = client.get('/api/workers').json[0]['id']
+    for day in (date.today().isoformat(), '2024-01-02'):
+        client.post(f'/api/workers/{worker_id}/attendance', json={'date': day, 'status': 'Present', 'hours': 8})
+
+    responses = [
+        client.post('/api/sales', json={'cropId': crop_id, 'quantity': 10, 'price': 900, 'seller': 'Ravi'}),
+        client.post('/api/financials/revenue', json={'description': 'Subsidy', 'amount': 300}),
+        client.post('/api/financials/expense', json={'description': 'Seed', 'amount': 200, 'cropName': 'Maize'}),
+        client.post(f'/api/workers/{worker_id}/loan', json={'amount': 150, 'description': 'Advance'}),
+        client.post(f'/api/workers/{worker_id}/payroll', json={}),
+        client.post('/api/payroll/runs', json={'from': '2024-01-01', 'to': '2024-01-07'}),
+        client.post('/api/import/financials', data='type,description,amount,transaction_date\n'
+                    'Expense,Diesel,70,2024-01-03\nRevenue,Straw,40,2024-02-10\n', content_type='text/csv'),
+    ]
+    assert all(r.status_code < 400 for r in responses), [r.json for r in responses]
+    with app.app_context():
+        assert Financial.query.count() == 8
+        assert FinancialRollup.query.count() > 0
+        assert check_rollups() == []
+
+def test_init_db_builds_missing_rollups(app, capsys):
+    with app.app_context():
+        user = User(unique_user_id='user_legacy', email='legacy@farmsync.com', password_hash='x', name='Legacy')
+        db.session.add(user)
+        db.session.flush()
+        # Written without rollup maintenance, as before the rollup table existed
+        db.session.execute(db.insert(Financial), [
+            {'user_id': user.id, 'type': 'Revenue', 'description': 'Rice', 'amount': 500,
+             'transaction_date': date(2024, 1, 5), 'crop_name': 'Rice'}])
+        db.session.commit()
+        assert check_rollups() != []
+
+        setup_database()
+        assert check_rollups() == []
@@ -0,0 +1,49 @@
+# test_seasons.py
+import gzip
+
+import pytest
+
+import archive
+from db_setup import Attendance, User
+
+@pytest.fixture
+def user_id(app, client):
+    client.post('/api/workers', json={'name': 'Asha', 'role': 'Picker', 'payRate': 500, 'payType': 'Daily'})
+    worker_id = client.get('/api/workers').json[0]['id']
+    for day in ('2024-01-10', '2024-01-11', '2024-03-01'):
+        client.post(f'/api/workers/{worker_id}/attendance', json={'date': day, 'status': 'Present', 'hours': 8})
+    with app.app_context():
+        return User.query.one().id
+
+def close(app, user_id, tmp_path):
+    return app.test_cli_runner().invoke(args=['close-season', '--user-id', str(user_id), '--before', '2024-02-15'],
+                                        env={'ARCHIVE_DIR': str(tmp_path / 'archive')})
+
+def attendance_count(app):
+    with app.app_context():
+        return Attendance.query.count()
+
+def test_seasons_are_closed_from_the_command_line_only(app, client, user_id, tmp_path):
+    assert client.post('/api/seasons/close', json={'before': '2024-02-15'}).status_code in (404, 405)
+
+    result = close(app, user_id, tmp_path)
+    assert result.exit_code == 0, result.output
+    assert attendance_count(app) == 1
+    archived = next((tmp_path / 'archive' / str(user_id)).glob('*.ndjson.gz'))
+    with gzip.open(archived, 'rt') as f:
+        assert len(f.readlines()) == 2
+    assert client.get('/api/seasons').json[0]['attendanceRows'] == 2
+
+def test_nothing_is_deleted_unless_the_archive_reads_back(app, user_id, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, 'count_archived', lambda path: {'attendance': 0, 'financials': 0})
+    result = close(app, user_id, tmp_path)
+    assert result.exit_code != 0
+    assert attendance_count(app) == 3
+
+def test_worker_details_report_archived_months(app, client, user_id, tmp_path):
+    assert close(app, user_id, tmp_path).exit_code == 0
+    worker_id = client.get('/api/workers').json[0]['id']
+    details = client.get(f'/api/workers/{worker_id}?from=2024-01-01&to=2024-03-31').json
+    assert list(details['attendance']) == ['2024-03-01']
+    assert details['archivedBefore'] == '2024-02-01'
+    assert details['archivedAttendance'] == [{'month': '2024-01', 'daysPresent': 2, 'daysAbsent': 0, 'hours': 16}]
@@ -0,0 +1,74 @@
+# test_stock.py
+from datetime import datetime, timedelta
+
+import pytest
+
+import synthetic
+from app import get_user_id
+from db_setup import db, Inventory, Yield
+from stock import StockRejected, apply_movement, apply_movements, check_stock, stock_at, take_snapshots
+
+@pytest.fixture
+def items(app, client):
+    """A user with 10 kg of Urea in inventory and a 50 kg yield; returns (user_id, urea_id, yield_id)."""
+    urea_id = client.post('/api/inventory', json={'name': 'Urea', 'type': 'Fertilizer', 'quantity': 10, 'unit': 'kg'}).json['id']
+    yield_id = client.post('/api/yields', json={'name': 'Maize', 'quantity': 50, 'unit': 'kg'}).json['id']
+    with app.test_request_context():
+        return get_user_id(), urea_id, yield_id
+
+def test_apply_movement_rejects_unknown_items_and_overdraws(app, items):
+    user_id, urea_id, _ = items
+    with app.app_context():
+        with pytest.raises(StockRejected) as unknown:
+            apply_movement(user_id, 'inventory', urea_id + 100, -1, 'consume')
+        assert unknown.value.status == 404
+        with pytest.raises(StockRejected) as overdrawn:
+            apply_movement(user_id, 'inventory', urea_id, -11, 'consume')
+        assert overdrawn.value.status == 409
+        assert apply_movement(user_id, 'inventory', urea_id, -4, 'consume') == 6
+        db.session.commit()
+        assert check_stock(user_id) == []
+
+def test_apply_movements_rejects_one_item_and_keeps_the_rest(app, items):
+    user_id, urea_id, yield_id = items
+    with app.app_context():
+        results = apply_movements(user_id, [
+            {'kind': 'inventory', 'item_id': urea_id, 'change': -4, 'reason': 'consume'},
+            {'kind': 'yield', 'item_id': yield_id, 'change': -60, 'reason': 'sale'},
+            {'kind': 'inventory', 'item_id': urea_id, 'change': 5, 'reason': 'restock'},
+        ])
+        db.session.commit()
+        assert results[('inventory', urea_id)] == 11
+        assert isinstance(results[('yield', yield_id)], StockRejected)
+        assert db.session.get(Yield, yield_id).quantity == 50
+        assert check_stock(user_id) == []
+
+def test_stock_at_replays_movements_after_the_snapshot(app, items):
+    user_id, urea_id, yield_id = items
+    with app.app_context():
+        apply_movement(user_id, 'inventory', urea_id, -3, 'consume')
+        db.session.commit()
+        assert take_snapshots(settle_seconds=0) == 2
+        db.session.commit()
+        apply_movement(user_id, 'yield', yield_id, -20, 'sale')
+        db.session.commit()
+
+        now = datetime.utcnow()
+        assert stock_at(user_id, now) == {('inventory', urea_id): 7, ('yield', yield_id): 30}
+        assert stock_at(user_id, now - timedelta(days=1)) == {}
+
+def test_check_stock_reports_balances_that_disagree_with_the_ledger(app, items):
+    user_id, urea_id, _ = items
+    with app.app_context():
+        db.session.execute(db.update(Inventory).where(Inventory.id == urea_id).values(quantity=99))
+        db.session.commit()
+        assert check_stock(user_id) == [f'inventory {urea_id}: balance 99, ledger total 10']
+
+def test_seeded_farms_have_a_stock_ledger(app):
+    with app.app_context():
+        synthetic.seed(db, users=1, workers=2, years=0.25)
+        assert check_stock() == []
+        user_id = db.session.query(Yield.user_id).limit(1).scalar()
+        balances = stock_at(user_id, datetime.utcnow() + timedelta(days=1))
+        assert sum(balances.values()) == (
+            db.session.query(db.func.sum(Yield.quantity)).scalar() + db.session.query(db.func.sum(Inventory.quantity)).scalar())
@@ -0,0 +1,52 @@
+# tokens.py
+# Stateless, HMAC-signed session tokens. A token carries the internal user id
+# and an expiry time, so a request can be authenticated without a database
+# lookup:
+#
+#     <user id>.<expires, unix seconds>.<urlsafe base64 HMAC-SHA256>
+#
+# Signing keys come from SECRET_KEY. Several comma-separated keys may be given
+# to rotate them: the first signs new tokens and all of them are accepted.
+import base64
+import hashlib
+import hmac
+import os
+import time
+
+class InvalidToken(Exception):
+    """Raised for tokens that are malformed, wrongly signed or expired."""
+
+class TokenSigner:
+    """Issues and verifies signed user tokens that expire after ttl seconds."""
+
+    def __init__(self, secret_keys=None, ttl=43200):
+        keys = [key.strip() for key in (secret_keys or '').split(',') if key.strip()]
+        # Without a configured key tokens only survive as long as this process,
+        # and are not shared between server workers
+        self.ephemeral = not keys
+        self.keys = [key.encode() for key in keys] or [os.urandom(32)]
+        self.ttl = ttl
+
+    def _signature(self, key, payload):
+        digest = hmac.new(key, payload.encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+    def issue(self, user_id):
+        """Returns (token, expires_at) for the given internal user id."""
+        expires_at = int(time.time()) + self.ttl
+        payload = f'{int(user_id)}.{expires_at}'
+        return f'{payload}.{self._signature(self.keys[0], payload)}', expires_at
+
+    def verify(self, token):
+        """Returns the user id carried by a valid token, raising InvalidToken otherwise."""
+        payload, _, signature = token.rpartition('.')
+        if not payload or not any(hmac.compare_digest(signature, self._signature(key, payload)) for key in self.keys):
+            raise InvalidToken('Invalid token')
+        user_id, _, expires_at = payload.partition('.')
+        try:
+            user_id, expires_at = int(user_id), int(expires_at)
+        except ValueError:
+            raise InvalidToken('Invalid token')
+        if expires_at < time.time():
+            raise InvalidToken('Token expired')
+        return user_id